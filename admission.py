@@ -0,0 +1,194 @@
+"""
+Admission control and load shedding in front of MySQL
+Every API request needs a slot from a global DB-concurrency limiter before
+it may touch the database; some routes additionally have their own limit.
+Requests wait in a priority queue up to a per-class deadline (checkout goes
+first, dashboards and reports last) and are shed with a 503 and Retry-After
+instead of piling up connection attempts.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Lower number = served first
+PRIORITIES = {
+    'checkout': 0,
+    'write': 1,
+    'read': 2,
+    'report': 3,
+    'background': 4,
+}
+
+# How long each class may wait for a slot before it is shed (seconds)
+DEADLINES = {
+    'checkout': 5.0,
+    'write': 3.0,
+    'read': 2.0,
+    'report': 1.0,
+    'background': 30.0,
+}
+
+
+class Overloaded(Exception):
+    """No slot became free before the request's deadline"""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class PriorityLimiter:
+    """Counting semaphore whose waiters are woken in priority order"""
+
+    def __init__(self, limit, max_queue=100):
+        self.limit = limit
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._heap = []
+        self._queued = Counter()
+        self._seq = itertools.count()
+
+    def acquire(self, priority=0, timeout=None):
+        """Take a slot, waiting up to `timeout` seconds; False if none came free"""
+        with self._lock:
+            if self._in_use < self.limit and not self._heap:
+                self._in_use += 1
+                return True
+            if sum(self._queued.values()) >= self.max_queue or timeout == 0:
+                return False
+            # [priority, seq, event, granted, abandoned]
+            waiter = [priority, next(self._seq), threading.Event(), False, False]
+            heapq.heappush(self._heap, waiter)
+            self._queued[priority] += 1
+
+        waiter[2].wait(timeout)
+
+        with self._lock:
+            if waiter[3]:
+                return True
+            # Timed out: leave the entry in the heap, release() skips it
+            waiter[4] = True
+            self._queued[priority] -= 1
+            return False
+
+    def release(self):
+        """Give the slot to the most urgent waiter, or free it"""
+        with self._lock:
+            while self._heap:
+                waiter = heapq.heappop(self._heap)
+                if waiter[4]:
+                    continue
+                waiter[3] = True
+                self._queued[waiter[0]] -= 1
+                waiter[2].set()
+                return
+            self._in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_use': self._in_use,
+                'queued': sum(self._queued.values()),
+                'queued_by_priority': {p: n for p, n in self._queued.items() if n},
+            }
+
+
+class Ticket:
+    """Slots held by one admitted request"""
+
+    def __init__(self, route, route_limiter, started):
+        self.route = route
+        self.route_limiter = route_limiter
+        self.started = started
+
+
+class AdmissionController:
+    """Global DB-concurrency limit plus optional per-route limits"""
+
+    def __init__(self, db_limit=8, route_limits=None, max_queue=64):
+        self.db = PriorityLimiter(db_limit, max_queue)
+        self.routes = {route: PriorityLimiter(limit, max_queue)
+                       for route, limit in (route_limits or {}).items()}
+        self._lock = threading.Lock()
+        self._admitted = Counter()
+        self._shed = Counter()
+        self._avg_hold = 0.05
+        self._local = threading.local()
+
+    def admit(self, route, priority_class='read'):
+        """Reserve a route slot (if limited) and a DB slot, or raise Overloaded"""
+        priority = PRIORITIES[priority_class]
+        deadline = time.monotonic() + DEADLINES[priority_class]
+
+        route_limiter = self.routes.get(route)
+        if route_limiter and not route_limiter.acquire(priority, DEADLINES[priority_class]):
+            self._record_shed(route, priority_class)
+            raise Overloaded(f"Too many concurrent requests for {route}", self.retry_after(route_limiter))
+
+        if not self.db.acquire(priority, max(0.0, deadline - time.monotonic())):
+            if route_limiter:
+                route_limiter.release()
+            self._record_shed(route, priority_class)
+            raise Overloaded("Database is busy", self.retry_after(self.db))
+
+        with self._lock:
+            self._admitted[priority_class] += 1
+        return Ticket(route, route_limiter, time.monotonic())
+
+    def release(self, ticket):
+        """Return the slots held by an admitted request"""
+        held = time.monotonic() - ticket.started
+        with self._lock:
+            # Smoothed slot hold time, used to size Retry-After
+            self._avg_hold += 0.1 * (held - self._avg_hold)
+        self.db.release()
+        if ticket.route_limiter:
+            ticket.route_limiter.release()
+
+    @contextmanager
+    def db_slot(self, priority_class='background'):
+        """Hold a DB slot for work that runs outside an admitted request
+
+        Re-entrant per thread: nested use inside a held slot takes no new one.
+        """
+        depth = getattr(self._local, 'depth', 0)
+        ticket = self.admit(None, priority_class) if depth == 0 else None
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if ticket:
+                self.release(ticket)
+
+    def retry_after(self, limiter):
+        """Seconds until the current queue has likely drained (at least 1)"""
+        stats = limiter.stats()
+        return max(1, math.ceil((stats['queued'] + 1) * self._avg_hold / stats['limit']))
+
+    def _record_shed(self, route, priority_class):
+        with self._lock:
+            self._shed[(route, priority_class)] += 1
+
+    def stats(self):
+        with self._lock:
+            admitted = dict(self._admitted)
+            shed = [{'route': route, 'class': cls, 'count': count}
+                    for (route, cls), count in self._shed.items()]
+            avg_hold = self._avg_hold
+        return {
+            'db': self.db.stats(),
+            'routes': {route: limiter.stats() for route, limiter in self.routes.items()},
+            'admitted': admitted,
+            'shed': shed,
+            'shed_total': sum(item['count'] for item in shed),
+            'avg_hold_seconds': round(avg_hold, 4),
+        }
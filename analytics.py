@@ -0,0 +1,203 @@
+"""
+Sales analytics computed with NumPy
+order_details joined with orders is streamed from MySQL in chunks; each chunk
+is bucketed by period and grouped by product and UOM with array operations,
+and the small per-chunk partial sums are merged at the end.
+"""
+
+from datetime import date
+
+import numpy as np
+
+GRANULARITIES = ('day', 'week', 'month')
+CHUNK_SIZE = 50000
+
+# The order date comes back as days since 1970-01-01 so every column is numeric
+# and a chunk converts to a single float array without datetime parsing
+SALES_LINES_QUERY = """
+    SELECT DATEDIFF(o.datetime, '1970-01-01'), od.product_id, p.uom_id,
+           od.quantity, od.total_price
+    FROM {details_table} od
+    JOIN {orders_table} o ON od.order_id = o.order_id
+    JOIN products p ON od.product_id = p.product_id
+    WHERE o.datetime >= %s AND o.datetime < %s
+"""
+
+# 1970-01-01 was a Thursday; shifting by 3 days lines weeks up on Mondays
+_WEEK_OFFSET = 3
+
+
+def bucket_starts(days, granularity):
+    """Map datetime64[D] values to the first day of their period"""
+    if granularity == 'day':
+        return days
+    if granularity == 'week':
+        ordinal = days.astype('int64')
+        return (ordinal - (ordinal + _WEEK_OFFSET) % 7).astype('datetime64[D]')
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def period_range(start, end, granularity):
+    """All period start days overlapping [start, end), oldest first"""
+    first = bucket_starts(np.array([start], dtype='datetime64[D]'), granularity)[0]
+    last = np.datetime64(end, 'D') - np.timedelta64(1, 'D')
+    if granularity == 'month':
+        months = np.arange(first.astype('datetime64[M]'), last.astype('datetime64[M]') + 1)
+        return months.astype('datetime64[D]')
+    step = 7 if granularity == 'week' else 1
+    return np.arange(first, last + 1, step)
+
+
+def _group_sum(codes, *values):
+    """Sum each value array per distinct code"""
+    unique, inverse = np.unique(codes, return_inverse=True)
+    return (unique,) + tuple(np.bincount(inverse, weights=v, minlength=len(unique)) for v in values)
+
+
+class SalesAccumulator:
+    """Collects revenue and units per (period, key) across streamed chunks"""
+
+    def __init__(self, start, end, granularity):
+        self.granularity = granularity
+        self.periods = period_range(start, end, granularity)
+        self._partials = {'total': [], 'product': [], 'uom': []}
+
+    def add_chunk(self, days, product_ids, uom_ids, quantities, revenues):
+        """Reduce one chunk of order lines to per-group partial sums"""
+        if len(days) == 0:
+            return
+        period_idx = np.searchsorted(self.periods, bucket_starts(days, self.granularity))
+        period_idx = period_idx.astype('int64')
+        keys = {
+            'total': np.zeros_like(period_idx),
+            'product': product_ids.astype('int64'),
+            'uom': uom_ids.astype('int64'),
+        }
+        for name, key in keys.items():
+            # Pack (key, period) into one int64 so a single unique() groups both
+            codes = (key << 32) | period_idx
+            self._partials[name].append(_group_sum(codes, revenues, quantities))
+
+    def _matrix(self, name):
+        """Dense (keys x periods) revenue and units matrices for one breakdown"""
+        partials = self._partials[name]
+        n_periods = len(self.periods)
+        if not partials:
+            return np.empty(0, dtype='int64'), np.zeros((0, n_periods)), np.zeros((0, n_periods))
+        codes, revenue, units = _group_sum(
+            np.concatenate([p[0] for p in partials]),
+            np.concatenate([p[1] for p in partials]),
+            np.concatenate([p[2] for p in partials]),
+        )
+        keys = codes >> 32
+        periods = codes & 0xFFFFFFFF
+        key_values, rows = np.unique(keys, return_inverse=True)
+        revenue_matrix = np.zeros((len(key_values), n_periods))
+        units_matrix = np.zeros((len(key_values), n_periods))
+        revenue_matrix[rows, periods] = revenue
+        units_matrix[rows, periods] = units
+        return key_values, revenue_matrix, units_matrix
+
+    def result(self, top=20):
+        """Period labels plus total, top-N product and per-UOM series"""
+        _, total_revenue, total_units = self._matrix('total')
+        product_ids, product_revenue, product_units = self._matrix('product')
+        uom_ids, uom_revenue, uom_units = self._matrix('uom')
+
+        # Keep only the best-selling products by revenue over the whole range
+        order = np.argsort(-product_revenue.sum(axis=1), kind='stable')[:top]
+
+        n_periods = len(self.periods)
+        return {
+            'periods': [str(p) for p in self.periods],
+            'total': {
+                'revenue': _series(total_revenue[0] if len(total_revenue) else np.zeros(n_periods)),
+                'units': _series(total_units[0] if len(total_units) else np.zeros(n_periods)),
+            },
+            'by_product': [
+                {'product_id': int(product_ids[i]),
+                 'revenue': _series(product_revenue[i]),
+                 'units': _series(product_units[i])}
+                for i in order
+            ],
+            'by_uom': [
+                {'uom_id': int(uom_ids[i]),
+                 'revenue': _series(uom_revenue[i]),
+                 'units': _series(uom_units[i])}
+                for i in range(len(uom_ids))
+            ],
+        }
+
+
+def _series(values):
+    """Round a float array into a JSON-friendly list"""
+    return np.round(values, 2).tolist()
+
+
+def rows_to_arrays(rows):
+    """Turn (epoch_day, product_id, uom_id, quantity, total_price) rows into arrays"""
+    data = np.array(rows, dtype='float64')
+    return (
+        data[:, 0].astype('int64').astype('datetime64[D]'),
+        data[:, 1].astype('int64'),
+        data[:, 2].astype('int64'),
+        data[:, 3],
+        data[:, 4],
+    )
+
+
+def sales_timeseries(cursor, start, end, granularity='day', top=20, chunk_size=CHUNK_SIZE,
+                     sources=(('orders', 'order_details'),)):
+    """Revenue and units per period for orders placed in [start, end)
+
+    `cursor` must be a tuple (non-dictionary) cursor. `sources` lists the
+    (orders, order_details) table pairs to read, e.g. hot and archive.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    accumulator = SalesAccumulator(start, end, granularity)
+    for orders_table, details_table in sources:
+        cursor.execute(SALES_LINES_QUERY.format(orders_table=orders_table, details_table=details_table),
+                       (start, end))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            accumulator.add_chunk(*rows_to_arrays(rows))
+
+    result = accumulator.result(top=top)
+    _attach_names(cursor, result)
+    result.update({
+        'granularity': granularity,
+        'start': start.isoformat() if isinstance(start, date) else str(start),
+        'end': end.isoformat() if isinstance(end, date) else str(end),
+    })
+    return result
+
+
+def _attach_names(cursor, result):
+    """Add product and UOM names to the breakdown entries"""
+    product_names = {}
+    product_ids = [p['product_id'] for p in result['by_product']]
+    if product_ids:
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        cursor.execute(f"SELECT product_id, name FROM products WHERE product_id IN ({placeholders})",
+                       tuple(product_ids))
+        product_names = dict(cursor.fetchall())
+
+    uom_names = {}
+    if result['by_uom']:
+        cursor.execute("SELECT uom_id, uom_name FROM uom")
+        uom_names = dict(cursor.fetchall())
+    label_breakdowns(result, product_names, uom_names)
+
+
+def label_breakdowns(result, product_names, uom_names):
+    """Set names on the breakdown entries from {product_id: name} and {uom_id: uom_name}"""
+    for product in result['by_product']:
+        product['name'] = product_names.get(product['product_id'])
+    for uom in result['by_uom']:
+        uom['uom_name'] = uom_names.get(uom['uom_id'])
@@ -1,11 +1,47 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import (Flask, render_template, request, redirect, url_for, jsonify, g,
+                   has_request_context, Response, stream_with_context, send_from_directory)
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
+import csv
+import functools
+import io
 import json
 import os
-from datetime import datetime, date
-from contextlib import contextmanager
+import tempfile
+from datetime import datetime, date, timedelta
+from contextlib import contextmanager, nullcontext
 import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import admission
+import analytics
+import archive_orders
+import barcodes
+import bulk_load
+import catalog_sync
+import customer_dedup
+import customer_import
+import events
+import forecast
+import health
+import jobs
+import order_snapshots
+import order_sync
+import pricing
+import profiling
+import promotions
+import reconcile_orders
+import resilience
+import sales_snapshots
+import singleflight
+import statements
+import stock_alerts
+import stores
+from cache import PartitionedCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +57,7 @@ else:
     from config import db_config
 
 app = Flask(__name__)
+app.wsgi_app = stores.StorePathMiddleware(app.wsgi_app)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this-in-production')
 
 # Template context processor to make current_date available in all templates
@@ -28,43 +65,362 @@ app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this-in-product
 def inject_date():
     return {'current_date': datetime.now()}
 
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
+
 # Database connection function with better error handling
-def get_db_connection():
+def get_db_connection(store_id=None, **extra):
     """Get database connection with proper error handling and timeout"""
+    return profiling.timed_connection(open_db_connection(store_id, **extra))
+
+def open_db_connection(store_id=None, **extra):
+    """New connection to a store's database (the current one by default)"""
     try:
         # Add connection timeout and retry logic
-        config = db_config.copy()
+        config = store_registry.config(store_id or current_store_id()).copy()
         config.update({
-            'connection_timeout': 10,
+            'connection_timeout': DB_CONNECT_TIMEOUT,
             'autocommit': True,
             'use_unicode': True,
             'charset': 'utf8mb4'
         })
+        config.update(extra)
         connection = mysql.connector.connect(**config)
         return connection
     except Error as e:
         logger.error(f"Database connection error: {e}")
-        raise Exception(f"Unable to connect to database: {e}")
+        # Chained so resilience.is_transient() can see the connector error
+        raise Exception(f"Unable to connect to database: {e}") from e
+
+# Admission control: every database user needs one of DB_CONCURRENCY slots.
+# API requests take theirs in admit_request(); anything else (background
+# jobs) takes one in get_db_cursor().
+ROUTE_LIMITS = {
+    'get_sales_analytics': 2,
+    'get_dashboard_stats': 4,
+    'get_inventory_summary': 4,
+}
+ROUTE_PRIORITIES = {
+    'create_order': 'checkout',
+    'quote_cart': 'checkout',
+    'lookup_barcode': 'checkout',
+    'lookup_barcodes': 'checkout',
+    'sync_orders': 'checkout',
+    'get_dashboard_stats': 'report',
+    'get_sales_analytics': 'report',
+    'get_inventory_summary': 'report',
+    'get_todays_orders': 'report',
+    'get_recent_orders': 'report',
+    'get_popular_products': 'report',
+}
+# Endpoints that never touch the database themselves (the event stream
+# would otherwise hold a DB slot for as long as the dashboard stays open, and
+# the store report's fan-out threads take their own slots)
+ADMISSION_EXEMPT = {'get_admission_stats', 'get_db_stats', 'get_db_breakers', 'get_coalescing_stats',
+                    'stream_events', 'get_event_stats', 'get_store_report'}
+admission_control = admission.AdmissionController(
+    db_limit=int(os.getenv('DB_CONCURRENCY', '8')),
+    route_limits=ROUTE_LIMITS,
+    max_queue=int(os.getenv('DB_MAX_QUEUE', '64'))
+)
+
+def request_priority():
+    """Admission class of the current request"""
+    if request.endpoint in ROUTE_PRIORITIES:
+        return ROUTE_PRIORITIES[request.endpoint]
+    return 'read' if request.method in ('GET', 'HEAD') else 'write'
+
+@app.before_request
+def select_store():
+    try:
+        g.store_id = stores.resolve_store(request, store_registry)
+    except stores.UnknownStore as e:
+        return jsonify({"error": str(e)}), 404
+    return None
+
+@app.before_request
+def fail_fast_when_db_down():
+    # While the store's circuit breaker is open, API requests get a 503 at
+    # once; read endpoints with a stale copy answer from it instead
+    if (not request.path.startswith('/api/') or request.endpoint in ADMISSION_EXEMPT
+            or request.endpoint in STALE_ENDPOINTS):
+        return None
+    breaker = db_breakers.get(current_store_id())
+    if breaker.is_open():
+        return db_unavailable(breaker)
+    return None
+
+def db_unavailable(breaker):
+    response = jsonify({"error": "Database temporarily unavailable, please retry"})
+    response.headers['Retry-After'] = str(max(1, math.ceil(breaker.stats()['retry_after_seconds'])))
+    return response, 503
+
+# Identical concurrent reads of these endpoints share one execution: the
+# first request runs, the others wait for its response without taking a DB
+# slot of their own
+COALESCED_ENDPOINTS = {'get_products', 'get_uom', 'get_customers', 'get_dashboard_stats',
+                       'get_inventory_summary'}
+# Per-request headers that must not be copied to the followers
+UNSHARED_HEADERS = {'Set-Cookie', 'X-Profile-Id', 'Content-Length'}
+request_flights = singleflight.SingleFlight()
+
+@app.before_request
+def join_request_flight():
+    if (request.method != 'GET' or request.endpoint not in COALESCED_ENDPOINTS
+            or profiling.HEADER in request.headers or profiling.QUERY_FLAG in request.args):
+        return None
+    key = (current_store_id(), request.endpoint, request.full_path)
+    flight, leader = request_flights.begin(request.endpoint, key)
+    if leader:
+        g.request_flight = (key, flight)
+        return None
+    shared = flight.wait()
+    if shared is None:
+        # The leader failed; run the request normally
+        return None
+    body, status, headers = shared
+    response = Response(body, status=status, headers=headers)
+    response.headers['X-Coalesced'] = 'true'
+    return response
+
+@app.after_request
+def share_request_flight(response):
+    leader = g.pop('request_flight', None)
+    if leader:
+        key, flight = leader
+        shared = None
+        if not response.is_streamed and response.status_code < 500:
+            headers = [(name, value) for name, value in response.headers if name not in UNSHARED_HEADERS]
+            shared = (response.get_data(), response.status_code, headers)
+        request_flights.finish(key, flight, shared)
+    return response
+
+@app.teardown_request
+def end_request_flight(exc):
+    # Leaders that raised never reach after_request; release their followers
+    leader = g.pop('request_flight', None)
+    if leader:
+        request_flights.finish(*leader)
+
+@app.before_request
+def admit_request():
+    # Pages and static files never touch the database
+    if not request.path.startswith('/api/') or request.endpoint in ADMISSION_EXEMPT:
+        return None
+    try:
+        g.admission_ticket = admission_control.admit(request.endpoint, request_priority())
+    except admission.Overloaded as e:
+        response = jsonify({"error": "Server is busy, please retry", "reason": e.reason})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    return None
+
+@app.teardown_request
+def release_admission(exc):
+    ticket = g.pop('admission_ticket', None)
+    if ticket:
+        admission_control.release(ticket)
+
+# Opt-in profiling of single requests (signed X-Profile token or sampling);
+# profiles are kept in the default store's request_profiles table
+profiler = profiling.Profiler.from_env()
+PROFILE_EXEMPT = {'static', 'livez', 'readyz', 'health_check', 'stream_events', 'list_profiles',
+                  'get_profile', 'download_profile_collapsed', 'download_profile_pstats'}
+
+@app.before_request
+def start_profile():
+    if not profiler.enabled or request.endpoint in PROFILE_EXEMPT:
+        return None
+    wanted = profiler.wanted(request)
+    if wanted:
+        mode, g.profile_trigger = wanted
+        g.profile = profiling.RequestProfile(mode).start()
+    return None
+
+@app.after_request
+def save_profile(response):
+    profile = g.pop('profile', None)
+    if profile:
+        profile.stop()
+        try:
+            with get_db_cursor(dictionary=False, store_id=stores.DEFAULT_STORE) as (conn, cursor):
+                profile_id = profiling.save_profile(
+                    conn, cursor, profile, request.endpoint or '', request.method, request.full_path,
+                    response.status_code, g.get('profile_trigger'))
+            response.headers['X-Profile-Id'] = str(profile_id)
+        except Exception as e:
+            # A profile that can't be stored must not fail the request
+            logger.error(f"Error saving request profile: {e}")
+    return response
+
+@app.teardown_request
+def stop_profile(exc):
+    # Requests that raised never reach after_request
+    profile = g.pop('profile', None)
+    if profile:
+        profile.stop()
+
+# Stores served by this deployment; db_config is the default store's database.
+# Each store gets its own pool of long-lived connections for get_db_cursor(),
+# each keeping its prepared statements; unread results are consumed when a
+# cursor closes so a connection always goes back to the pool clean
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', os.getenv('DB_CONCURRENCY', '8')))
+store_registry = stores.StoreRegistry(
+    stores.load_stores(db_config),
+    lambda store_id, config: statements.ConnectionPool(
+        lambda: open_db_connection(store_id, consume_results=True), size=DB_POOL_SIZE)
+)
+
+# Transient connection failures trip a per-store breaker so requests fail
+# fast during an outage instead of each waiting out the connect timeout
+db_breakers = stores.StoreLocal(resilience.CircuitBreaker.from_env)
+DB_CONNECT_RETRIES = int(os.getenv('DB_CONNECT_RETRIES', str(resilience.RETRY_ATTEMPTS)))
+
+def current_store_id():
+    """Store of the current request, or of the job or thread running outside one"""
+    if has_request_context() and 'store_id' in g:
+        return g.store_id
+    return store_registry.current()
 
 @contextmanager
-def get_db_cursor(dictionary=True):
+def get_db_cursor(dictionary=True, store_id=None):
     """Context manager for database operations with better error handling"""
+    store_id = store_id or current_store_id()
+    pool = store_registry.pool(store_id)
+    breaker = db_breakers.get(store_id)
     conn = None
     cursor = None
+    broken = False
+    failure = None
+    admitted = has_request_context() and g.get('admission_ticket') is not None
+    slot = nullcontext() if admitted else admission_control.db_slot('background')
+    # The slot comes first: a call shed while waiting for one must not keep
+    # a half-open breaker's trial claimed with no outcome ever recorded
+    slot.__enter__()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=dictionary)
+        breaker.before_call()
+    except resilience.CircuitOpen:
+        slot.__exit__(None, None, None)
+        raise
+    try:
+        conn = resilience.retry(pool.acquire, attempts=DB_CONNECT_RETRIES)
+        cursor = profiling.timed_cursor(conn.cursor(dictionary=dictionary))
         yield conn, cursor
     except Error as e:
-        if conn:
-            conn.rollback()
+        # Lost or unusable connections must not go back to the pool
+        broken = isinstance(e, (mysql.connector.OperationalError, mysql.connector.InterfaceError))
+        failure = e
         logger.error(f"Database error: {e}")
         raise
+    except Exception as e:
+        failure = e
+        raise
     finally:
-        if cursor:
-            cursor.close()
-        if conn and conn.is_connected():
-            conn.close()
+        if failure is not None and resilience.is_transient(failure):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        try:
+            if cursor:
+                cursor.close()
+        except Error:
+            broken = True
+        if conn:
+            if broken:
+                pool.discard(conn)
+            else:
+                pool.release(conn)
+        slot.__exit__(None, None, None)
+
+def fetch_statement(conn, name, params=(), one=False):
+    """Rows (dicts) of a named statement, prepared once per pooled connection"""
+    cache = store_registry.pool(current_store_id()).statements(conn)
+    with profiling.sql_timer(name):
+        return cache.fetchone(name, params) if one else cache.fetchall(name, params)
+
+# Barcode scans are answered from memory, one index per store
+barcode_indexes = stores.StoreLocal(barcodes.BarcodeIndex)
+
+def get_barcode_index():
+    """The current store's barcode index, loaded or refreshed when due"""
+    index = barcode_indexes.get(current_store_id())
+    if index.needs_refresh():
+        with get_db_cursor() as (conn, cursor):
+            index.refresh(cursor)
+    return index
+
+def update_barcode_index(cursor, product_id):
+    """Apply a product write to this worker's barcode index right away"""
+    index = barcode_indexes.get(current_store_id())
+    if index.loaded:
+        cursor.execute(barcodes.PRODUCT_QUERY, (product_id,))
+        row = cursor.fetchone()
+        if row:
+            index.update(row)
+        else:
+            index.remove(product_id)
+
+# Basket promotions are compiled into an in-memory index, one per store
+promotion_indexes = stores.StoreLocal(promotions.PromotionIndex)
+
+def get_promotion_index():
+    """The current store's promotion index, rebuilt when promotions changed"""
+    index = promotion_indexes.get(current_store_id())
+    if index.needs_refresh():
+        with get_db_cursor() as (conn, cursor):
+            index.refresh(cursor)
+    return index
+
+# Quotes are kept for a while so the order placed from one is charged as quoted
+QUOTE_TTL = int(os.getenv('QUOTE_TTL', '300'))
+cart_quotes = PartitionedCache(maxsize=1024, ttl=QUOTE_TTL)
+
+# Background jobs for work that must not hold a web worker; job state for
+# every store is kept in the default store's jobs table
+job_runner = jobs.JobRunner(lambda: get_db_cursor(store_id=stores.DEFAULT_STORE),
+                            max_workers=int(os.getenv('JOB_WORKERS', '4')))
+
+def store_job(func):
+    """Run a job function against the store that submitted it"""
+    @functools.wraps(func)
+    def run(job, store_id=stores.DEFAULT_STORE, **params):
+        with store_registry.use(store_id):
+            return func(job, **params)
+    return run
+
+# Live updates for open dashboards, one bus per store; mutations publish
+# after they commit. An open stream holds one of gunicorn's threads for as
+# long as the page stays open, so streams of all stores share a cap kept
+# well below GUNICORN_THREADS (a quarter by default) to leave the rest for
+# checkout and the other routes
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', '256'))
+SSE_MAX_SUBSCRIBERS = int(os.getenv('SSE_MAX_SUBSCRIBERS',
+                                    str(max(1, int(os.getenv('GUNICORN_THREADS', '8')) // 4))))
+SSE_HEARTBEAT_SECONDS = 15
+sse_slots = threading.BoundedSemaphore(SSE_MAX_SUBSCRIBERS)
+event_buses = stores.StoreLocal(
+    lambda: events.EventBus(queue_size=SSE_QUEUE_SIZE, max_subscribers=SSE_MAX_SUBSCRIBERS, slots=sse_slots))
+
+def store_event_bus(store_id=None):
+    """Event bus of a store (the current one by default)"""
+    return event_buses.get(store_id or current_store_id())
+
+def publish_event(event_type, data):
+    """Publish to the current store's open dashboards"""
+    return store_event_bus().publish(event_type, data)
+
+def publish_stock_changes(levels, alerts):
+    """Publish committed stock levels and the low-stock crossings among them"""
+    for product_id, stock_quantity in levels.items():
+        publish_event('stock_changed', {"product_id": product_id, "stock_quantity": stock_quantity})
+    for alert in alerts:
+        publish_event('low_stock', alert)
+
+def job_accepted(job):
+    """202 response pointing at the status endpoint of a submitted job"""
+    status_url = url_for('get_job', job_id=job.job_id)
+    response = jsonify({"job_id": job.job_id, "status": job.status, "status_url": status_url})
+    response.headers['Location'] = status_url
+    return response, 202
 
 # Home page - Products list
 @app.route('/')
@@ -76,19 +432,51 @@ def home():
 def inventory():
     return render_template('inventory.html')
 
+# Last good responses of the main read endpoints, served marked stale while
+# the store's database is unreachable
+STALE_TTL = int(os.getenv('STALE_TTL', str(24 * 3600)))
+stale_responses = PartitionedCache(maxsize=64, ttl=STALE_TTL)
+STALE_ENDPOINTS = set()
+
+def serve_stale(view):
+    """Keep a read endpoint's last 200 response per URL and fall back to it
+
+    The copy is served while the circuit breaker is open, or when the view
+    itself fails with a 5xx; the next successful call replaces it.
+    """
+    STALE_ENDPOINTS.add(view.__name__)
+    
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        store_id = current_store_id()
+        breaker = db_breakers.get(store_id)
+        cache = stale_responses.partition(store_id)
+        key = request.full_path
+        if not breaker.is_open():
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache.set(key, (response.get_data(), response.mimetype, time.time()))
+            if response.status_code < 500:
+                return response
+        cached = cache.get(key)
+        if cached is None:
+            return db_unavailable(breaker)
+        body, mimetype, stored_at = cached
+        stale = Response(body, mimetype=mimetype)
+        stale.headers['X-Stale'] = 'true'
+        stale.headers['Age'] = str(int(time.time() - stored_at))
+        stale.headers['Warning'] = '110 - "Response is Stale"'
+        return stale
+    return wrapper
+
 # Products API endpoints
 @app.route('/api/products', methods=['GET'])
+@serve_stale
 def get_products():
     """Get all products with UOM information"""
     try:
         with get_db_cursor() as (conn, cursor):
-            cursor.execute("""
-                SELECT p.product_id, p.name, p.uom_id, p.price_per_unit, u.uom_name 
-                FROM products p
-                JOIN uom u ON p.uom_id = u.uom_id
-                ORDER BY p.name
-            """)
-            products = cursor.fetchall()
+            products = fetch_statement(conn, 'products.list')
             return jsonify(products)
     except Error as e:
         logger.error(f"Error fetching products: {e}")
@@ -102,13 +490,7 @@ def get_product(product_id):
     """Get a specific product by ID"""
     try:
         with get_db_cursor() as (conn, cursor):
-            cursor.execute("""
-                SELECT p.product_id, p.name, p.uom_id, p.price_per_unit, u.uom_name 
-                FROM products p
-                JOIN uom u ON p.uom_id = u.uom_id
-                WHERE p.product_id = %s
-            """, (product_id,))
-            product = cursor.fetchone()
+            product = fetch_statement(conn, 'products.get', (product_id,), one=True)
             
             if product:
                 return jsonify(product)
@@ -147,18 +529,37 @@ def add_product():
         if len(data['name'].strip()) < 1 or len(data['name'].strip()) > 45:
             return jsonify({"error": "Product name must be between 1 and 45 characters"}), 400
         
+        try:
+            barcode = barcodes.normalize_barcode(data.get('barcode'))
+            category = normalize_category(data.get('category'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         with get_db_cursor() as (conn, cursor):
+            conn.start_transaction()
             cursor.execute("""
-                INSERT INTO products (name, uom_id, price_per_unit)
-                VALUES (%s, %s, %s)
-            """, (data['name'].strip(), uom_id, price_per_unit))
-            conn.commit()
+                INSERT INTO products (name, uom_id, price_per_unit, barcode, category)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (data['name'].strip(), uom_id, price_per_unit, barcode, category))
             product_id = cursor.lastrowid
+            if category:
+                promotions.mark_categories_changed(cursor)
+            conn.commit()
+            update_barcode_index(cursor, product_id)
+            if category:
+                promotion_indexes.get(current_store_id()).invalidate()
+            publish_event('product_created', {
+                "product_id": product_id, "name": data['name'].strip(),
+                "uom_id": uom_id, "price_per_unit": price_per_unit, "barcode": barcode,
+                "category": category
+            })
             
             return jsonify({"product_id": product_id, "message": "Product added successfully"}), 201
             
     except mysql.connector.IntegrityError as e:
         logger.error(f"Integrity error adding product: {e}")
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            return jsonify({"error": "Barcode is already assigned to another product"}), 400
         return jsonify({"error": "Invalid UOM ID or duplicate product"}), 400
     except Error as e:
         logger.error(f"Database error adding product: {e}")
@@ -167,6 +568,13 @@ def add_product():
         logger.error(f"Unexpected error adding product: {e}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+def normalize_category(value):
+    """Category as stored, None for empty input; raises ValueError if too long"""
+    category = str(value).strip() if value is not None else ''
+    if len(category) > 45:
+        raise ValueError("Category must be at most 45 characters")
+    return category or None
+
 @app.route('/api/products/<int:product_id>', methods=['PUT'])
 def update_product(product_id):
     """Update an existing product with validation"""
@@ -194,20 +602,51 @@ def update_product(product_id):
         if len(data['name'].strip()) < 1 or len(data['name'].strip()) > 45:
             return jsonify({"error": "Product name must be between 1 and 45 characters"}), 400
         
+        # Barcode and category are only changed when the request includes them
+        optional = {}
+        try:
+            if 'barcode' in data:
+                optional['barcode'] = barcodes.normalize_barcode(data['barcode'])
+            if 'category' in data:
+                optional['category'] = normalize_category(data['category'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        assignments = ", ".join(["name = %s", "uom_id = %s"] + [f"{field} = %s" for field in optional])
+        params = [data['name'].strip(), uom_id] + list(optional.values())
+        
         with get_db_cursor() as (conn, cursor):
-            cursor.execute("""
+            # Price changes go through price_history so past prices stay known;
+            # the history and the product row commit or roll back together
+            conn.start_transaction()
+            if not pricing.set_price(cursor, product_id, price_per_unit):
+                conn.rollback()
+                return jsonify({"error": "Product not found"}), 404
+            category_changed = False
+            if 'category' in optional:
+                cursor.execute("SELECT category FROM products WHERE product_id = %s", (product_id,))
+                category_changed = cursor.fetchone()['category'] != optional['category']
+            cursor.execute(f"""
                 UPDATE products
-                SET name = %s, uom_id = %s, price_per_unit = %s
+                SET {assignments}
                 WHERE product_id = %s
-            """, (data['name'].strip(), uom_id, price_per_unit, product_id))
+            """, tuple(params) + (product_id,))
+            if category_changed:
+                promotions.mark_categories_changed(cursor)
             conn.commit()
+            update_barcode_index(cursor, product_id)
+            if category_changed:
+                promotion_indexes.get(current_store_id()).invalidate()
             
-            if cursor.rowcount > 0:
-                return jsonify({"message": "Product updated successfully"})
-            return jsonify({"error": "Product not found"}), 404
+            publish_event('product_updated', {
+                "product_id": product_id, "name": data['name'].strip(),
+                "uom_id": uom_id, "price_per_unit": price_per_unit, **optional
+            })
+            return jsonify({"message": "Product updated successfully"})
             
     except mysql.connector.IntegrityError as e:
         logger.error(f"Integrity error updating product: {e}")
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            return jsonify({"error": "Barcode is already assigned to another product"}), 400
         return jsonify({"error": "Invalid UOM ID"}), 400
     except Error as e:
         logger.error(f"Database error updating product: {e}")
@@ -228,10 +667,12 @@ def delete_product(product_id):
             if not product:
                 return jsonify({"error": "Product not found"}), 404
             
-            # Check if product exists in orders (referential integrity)
+            # Check if product exists in orders (referential integrity);
+            # archived lines have no foreign key so they are counted too
             cursor.execute("""
-                SELECT COUNT(*) as count FROM order_details WHERE product_id = %s
-            """, (product_id,))
+                SELECT (SELECT COUNT(*) FROM order_details WHERE product_id = %s)
+                     + (SELECT COUNT(*) FROM order_details_archive WHERE product_id = %s) as count
+            """, (product_id, product_id))
             result = cursor.fetchone()
             
             if result['count'] > 0:
@@ -245,6 +686,8 @@ def delete_product(product_id):
             conn.commit()
             
             if cursor.rowcount > 0:
+                barcode_indexes.get(current_store_id()).remove(product_id)
+                publish_event('product_deleted', {"product_id": product_id})
                 return jsonify({"message": f"Product '{product['name']}' deleted successfully"})
             else:
                 return jsonify({"error": "Failed to delete product"}), 500
@@ -256,14 +699,238 @@ def delete_product(product_id):
         logger.error(f"Unexpected error deleting product {product_id}: {e}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+# Stored request profiles
+@app.route('/api/profiles')
+def list_profiles():
+    """Recent request profiles, newest first (?route= filters by endpoint)"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), profiling.KEEP_PROFILES)
+        where = "WHERE route = %s" if request.args.get('route') else ""
+        params = (request.args['route'],) if where else ()
+        with get_db_cursor(store_id=stores.DEFAULT_STORE) as (conn, cursor):
+            cursor.execute(f"""
+                SELECT profile_id, route, method, path, status, mode, triggered_by,
+                       duration_ms, sql_count, sql_ms, created_at
+                FROM request_profiles
+                {where}
+                ORDER BY profile_id DESC
+                LIMIT %s
+            """, params + (limit,))
+            profiles = cursor.fetchall()
+        for profile in profiles:
+            profile['created_at'] = profile['created_at'].isoformat()
+        return jsonify(profiles)
+    except Error as e:
+        logger.error(f"Database error listing profiles: {e}")
+        return jsonify({"error": "Failed to fetch profiles"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error listing profiles: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+def fetch_profile(profile_id, columns):
+    with get_db_cursor(store_id=stores.DEFAULT_STORE) as (conn, cursor):
+        cursor.execute(f"SELECT {columns} FROM request_profiles WHERE profile_id = %s", (profile_id,))
+        return cursor.fetchone()
+
+@app.route('/api/profiles/<int:profile_id>')
+def get_profile(profile_id):
+    """One profile: hottest functions and the SQL it ran"""
+    try:
+        profile = fetch_profile(profile_id, """
+            profile_id, route, method, path, status, mode, triggered_by, duration_ms,
+            sql_count, sql_ms, top_functions, sql_statements, created_at
+        """)
+        if not profile:
+            return jsonify({"error": "Profile not found"}), 404
+        profile['created_at'] = profile['created_at'].isoformat()
+        profile['top_functions'] = json.loads(profile['top_functions'] or '[]')
+        profile['sql_statements'] = json.loads(profile['sql_statements'] or '[]')
+        return jsonify(profile)
+    except Error as e:
+        logger.error(f"Database error getting profile: {e}")
+        return jsonify({"error": "Failed to fetch profile"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error getting profile: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/profiles/<int:profile_id>/collapsed')
+def download_profile_collapsed(profile_id):
+    """Collapsed stacks for flamegraph.pl / speedscope"""
+    try:
+        profile = fetch_profile(profile_id, "collapsed")
+        if not profile:
+            return jsonify({"error": "Profile not found"}), 404
+        return Response(profile['collapsed'] or '', mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.folded'})
+    except Error as e:
+        logger.error(f"Database error downloading profile: {e}")
+        return jsonify({"error": "Failed to fetch profile"}), 500
+
+@app.route('/api/profiles/<int:profile_id>/pstats')
+def download_profile_pstats(profile_id):
+    """cProfile stats as a .prof file, or a text report with ?format=text"""
+    try:
+        profile = fetch_profile(profile_id, "pstats")
+        if not profile:
+            return jsonify({"error": "Profile not found"}), 404
+        if not profile['pstats']:
+            return jsonify({"error": "Profile was sampled; download it as collapsed stacks"}), 404
+        if request.args.get('format') == 'text':
+            return Response(profiling.format_pstats(bytes(profile['pstats'])), mimetype='text/plain')
+        return Response(bytes(profile['pstats']), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.prof'})
+    except Error as e:
+        logger.error(f"Database error downloading profile: {e}")
+        return jsonify({"error": "Failed to fetch profile"}), 500
+
+# Effective-dated prices
+def parse_datetime_param(value, name):
+    """Naive datetime from an ISO 8601 value; raises ValueError naming the field"""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime")
+    if parsed.tzinfo:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+@app.route('/api/products/<int:product_id>/prices')
+def get_price_history(product_id):
+    """Past, current and scheduled prices of a product"""
+    try:
+        with get_db_cursor() as (conn, cursor):
+            product = fetch_statement(conn, 'products.get', (product_id,), one=True)
+            if not product:
+                return jsonify({"error": "Product not found"}), 404
+            history = pricing.price_history(cursor, product_id)
+            for row in history:
+                row['price_per_unit'] = float(row['price_per_unit'])
+            return jsonify({
+                "product_id": product_id,
+                "current_price": float(product['price_per_unit']),
+                "history": history
+            })
+    except Error as e:
+        logger.error(f"Database error getting price history: {e}")
+        return jsonify({"error": "Failed to fetch price history"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error getting price history: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/products/<int:product_id>/prices', methods=['POST'])
+def schedule_price(product_id):
+    """Set a product's price now, or schedule it with effective_from"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            price_per_unit = float(data['price_per_unit'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "price_per_unit is required and must be a number"}), 400
+        if price_per_unit <= 0:
+            return jsonify({"error": "Price must be greater than 0"}), 400
+        effective_from = None
+        if data.get('effective_from'):
+            try:
+                effective_from = parse_datetime_param(data['effective_from'], 'effective_from')
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            # History is an audit trail, so it can't be rewritten backwards
+            if effective_from < datetime.now() - timedelta(minutes=1):
+                return jsonify({"error": "effective_from can't be in the past"}), 400
+        
+        with get_db_cursor() as (conn, cursor):
+            conn.start_transaction()
+            if not pricing.set_price(cursor, product_id, price_per_unit, effective_from):
+                conn.rollback()
+                return jsonify({"error": "Product not found"}), 404
+            conn.commit()
+            update_barcode_index(cursor, product_id)
+        
+        if effective_from is None:
+            publish_event('product_updated', {"product_id": product_id, "price_per_unit": price_per_unit})
+        return jsonify({
+            "message": "Price scheduled" if effective_from else "Price updated",
+            "product_id": product_id,
+            "price_per_unit": price_per_unit,
+            "effective_from": effective_from.isoformat() if effective_from else None
+        }), 201
+    except Error as e:
+        logger.error(f"Database error setting price: {e}")
+        return jsonify({"error": "Failed to set price"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error setting price: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/products/<int:product_id>/price')
+def get_price_as_of(product_id):
+    """Price of a product at ?at=<ISO datetime> (now by default)"""
+    try:
+        at = None
+        if request.args.get('at'):
+            try:
+                at = parse_datetime_param(request.args['at'], 'at')
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        with get_db_cursor(dictionary=False) as (conn, cursor):
+            prices = pricing.prices_as_of(cursor, [product_id], at)
+        if product_id not in prices:
+            return jsonify({"error": "Product not found"}), 404
+        return jsonify({
+            "product_id": product_id,
+            "at": at.isoformat() if at else None,
+            "price_per_unit": prices[product_id]
+        })
+    except Error as e:
+        logger.error(f"Database error getting price: {e}")
+        return jsonify({"error": "Failed to fetch price"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error getting price: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+# Barcode lookup for the till
+@app.route('/api/products/barcode/<barcode>')
+def lookup_barcode(barcode):
+    """Product snapshot (name, price, UOM) for one scanned barcode"""
+    try:
+        product = get_barcode_index().lookup(barcode.strip())
+        if product:
+            return jsonify(product)
+        return jsonify({"error": "Unknown barcode"}), 404
+    except Error as e:
+        logger.error(f"Database error loading barcodes: {e}")
+        return jsonify({"error": "Failed to look up barcode"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error looking up barcode: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/products/barcode/lookup', methods=['POST'])
+def lookup_barcodes():
+    """Resolve a whole basket of barcodes in one call"""
+    try:
+        data = request.get_json(silent=True) or {}
+        codes = data.get('barcodes')
+        if not isinstance(codes, list) or not codes:
+            return jsonify({"error": "barcodes must be a non-empty list"}), 400
+        if len(codes) > barcodes.MAX_BATCH:
+            return jsonify({"error": f"At most {barcodes.MAX_BATCH} barcodes per lookup"}), 413
+        
+        found, missing = get_barcode_index().lookup_many([str(code).strip() for code in codes])
+        return jsonify({"products": found, "missing": missing})
+    except Error as e:
+        logger.error(f"Database error loading barcodes: {e}")
+        return jsonify({"error": "Failed to look up barcodes"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error looking up barcodes: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
 # UOM API endpoints
 @app.route('/api/uom', methods=['GET'])
+@serve_stale
 def get_uom():
     """Get all units of measurement"""
     try:
         with get_db_cursor() as (conn, cursor):
-            cursor.execute("SELECT * FROM uom ORDER BY uom_name")
-            uom_list = cursor.fetchall()
+            uom_list = fetch_statement(conn, 'uom.list')
             return jsonify(uom_list)
     except Error as e:
         logger.error(f"Error fetching UOM: {e}")
@@ -274,12 +941,12 @@ def get_uom():
 
 # Customers API endpoints
 @app.route('/api/customers', methods=['GET'])
+@serve_stale
 def get_customers():
     """Get all customers"""
     try:
         with get_db_cursor() as (conn, cursor):
-            cursor.execute("SELECT * FROM customers ORDER BY name")
-            customers = cursor.fetchall()
+            customers = fetch_statement(conn, 'customers.list')
             return jsonify(customers)
     except Error as e:
         logger.error(f"Error fetching customers: {e}")
@@ -293,8 +960,7 @@ def get_customer(customer_id):
     """Get a specific customer by ID"""
     try:
         with get_db_cursor() as (conn, cursor):
-            cursor.execute("SELECT * FROM customers WHERE customer_id = %s", (customer_id,))
-            customer = cursor.fetchone()
+            customer = fetch_statement(conn, 'customers.get', (customer_id,), one=True)
             
             if customer:
                 return jsonify(customer)
@@ -312,14 +978,14 @@ def add_customer():
     try:
         data = request.get_json()
         
-        # Validate required fields
+        # Validate required fields (rules shared with the bulk import)
         if 'name' not in data or not data['name']:
-            return jsonify({"error": "Customer name is required"}), 400
+            return jsonify({"error": customer_import.NAME_REQUIRED}), 400
         
         # Validate name length
         name = data['name'].strip()
-        if len(name) < 1 or len(name) > 100:
-            return jsonify({"error": "Customer name must be between 1 and 100 characters"}), 400
+        if len(name) < customer_import.NAME_MIN or len(name) > customer_import.NAME_MAX:
+            return jsonify({"error": customer_import.NAME_LENGTH}), 400
         
         # Validate optional fields
         phone = data.get('phone', '').strip()
@@ -327,16 +993,16 @@ def add_customer():
         address = data.get('address', '').strip()
         
         # Validate phone number if provided
-        if phone and (len(phone) < 10 or len(phone) > 15):
-            return jsonify({"error": "Phone number must be between 10 and 15 characters"}), 400
+        if phone and (len(phone) < customer_import.PHONE_MIN or len(phone) > customer_import.PHONE_MAX):
+            return jsonify({"error": customer_import.PHONE_LENGTH}), 400
         
         # Basic email validation if provided
-        if email and ('@' not in email or len(email) > 100):
-            return jsonify({"error": "Invalid email format or email too long"}), 400
+        if email and ('@' not in email or len(email) > customer_import.EMAIL_MAX):
+            return jsonify({"error": customer_import.EMAIL_INVALID}), 400
         
         # Validate address length if provided
-        if address and len(address) > 500:
-            return jsonify({"error": "Address too long (max 500 characters)"}), 400
+        if address and len(address) > customer_import.ADDRESS_MAX:
+            return jsonify({"error": customer_import.ADDRESS_LENGTH}), 400
         
         with get_db_cursor() as (conn, cursor):
             cursor.execute("""
@@ -345,6 +1011,7 @@ def add_customer():
             """, (name, phone, email, address))
             conn.commit()
             customer_id = cursor.lastrowid
+            publish_event('customer_created', {"customer_id": customer_id, "name": name})
             
             return jsonify({"customer_id": customer_id, "message": "Customer added successfully"}), 201
             
@@ -370,6 +1037,7 @@ def update_customer(customer_id):
         cursor.close()
         conn.close()
         if cursor.rowcount > 0:
+            publish_event('customer_updated', {"customer_id": customer_id, "name": data['name']})
             return jsonify({"message": "Customer updated successfully"})
         return jsonify({"error": "Customer not found"}), 404
     except Exception as e:
@@ -383,11 +1051,22 @@ def delete_customer(customer_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
+        conn.start_transaction()
         cursor.execute("DELETE FROM customers WHERE customer_id = %s", (customer_id,))
+        deleted = cursor.rowcount
+        # Archived orders have no foreign key; checked after the DELETE, whose
+        # check of the hot orders holds off the archive job moving them meanwhile
+        cursor.execute("SELECT COUNT(*) FROM orders_archive WHERE customer_id = %s FOR SHARE", (customer_id,))
+        if cursor.fetchone()[0] > 0:
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Cannot delete customer. They have archived orders."}), 400
         conn.commit()
         cursor.close()
         conn.close()
-        if cursor.rowcount > 0:
+        if deleted > 0:
+            publish_event('customer_deleted', {"customer_id": customer_id})
             return jsonify({"message": "Customer deleted successfully"})
         return jsonify({"error": "Customer not found"}), 404
     except Exception as e:
@@ -396,57 +1075,623 @@ def delete_customer(customer_id):
         conn.close()
         return jsonify({"error": str(e)}), 400
 
+# Bulk customer import: small uploads are imported inline, larger ones by a
+# background job reading the spooled file
+IMPORT_INLINE_BYTES = int(os.getenv('IMPORT_INLINE_BYTES', str(1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+def upload_format():
+    """csv or ndjson from ?format= or the Content-Type; None if unsupported"""
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'ndjson' if 'json' in (request.mimetype or '') else 'csv'
+    return fmt if fmt in ('csv', 'ndjson') else None
+
+def spool_request_body(prefix, suffix):
+    """Copy the request body to a temp file in chunks; returns (path, size)
+
+    Large uploads never sit in memory. The caller removes the file.
+    """
+    spool = tempfile.NamedTemporaryFile(prefix=prefix, suffix=suffix, delete=False)
+    size = 0
+    try:
+        with spool:
+            while True:
+                chunk = request.stream.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                spool.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(spool.name)
+        raise
+    return spool.name, size
+
+def run_import_job(job, path, fmt):
+    try:
+        with get_db_cursor(dictionary=False) as (conn, cursor):
+            report = customer_import.import_customers(conn, cursor, path, fmt, progress=job.update,
+                                                      check_cancelled=job.check_cancelled)
+    finally:
+        os.remove(path)
+    if report['imported']:
+        publish_event('customers_imported', {"imported": report['imported']})
+    return report
+
+job_runner.register('customer_import', store_job(run_import_job), limit=1)
+
+@app.route('/api/customers/import', methods=['POST'])
+def import_customers():
+    """Import customers from a CSV or NDJSON request body
+
+    Returns the per-row report directly for small uploads (or ?async=0),
+    otherwise 202 with a job whose result is the report.
+    """
+    fmt = upload_format()
+    if not fmt:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    
+    path = None
+    try:
+        path, size = spool_request_body('customer-import-', '.' + fmt)
+        if size == 0:
+            os.remove(path)
+            return jsonify({"error": "Request body is empty"}), 400
+        
+        run_async = request.args.get('async')
+        if run_async == '1' or (run_async != '0' and size > IMPORT_INLINE_BYTES):
+            job = job_runner.submit('customer_import', store_id=current_store_id(), path=path, fmt=fmt)
+            return job_accepted(job)
+        
+        try:
+            with get_db_cursor(dictionary=False) as (conn, cursor):
+                report = customer_import.import_customers(conn, cursor, path, fmt)
+        finally:
+            os.remove(path)
+        if report['imported']:
+            publish_event('customers_imported', {"imported": report['imported']})
+        return jsonify(report)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Error as e:
+        logger.error(f"Database error importing customers: {e}")
+        return jsonify({"error": "Failed to import customers"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error importing customers: {e}")
+        if path and os.path.exists(path):
+            os.remove(path)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/products/sync', methods=['POST'])
+def sync_products():
+    """Sync products from a supplier price list (CSV or NDJSON body)
+
+    Only new and changed products are written, all in one transaction;
+    ?dry_run=1 returns the diff report without writing anything.
+    """
+    fmt = upload_format()
+    if not fmt:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    dry_run = request.args.get('dry_run') == '1'
+    
+    path = None
+    try:
+        path, size = spool_request_body('catalog-sync-', '.' + fmt)
+        if size == 0:
+            return jsonify({"error": "Request body is empty"}), 400
+        with get_db_cursor(dictionary=False) as (conn, cursor):
+            report = catalog_sync.sync_catalog(conn, cursor, path, fmt, dry_run=dry_run)
+        if not dry_run and (report['added'] or report['changed']):
+            publish_event('catalog_synced', {"added": report['added'], "changed": report['changed']})
+        return jsonify(report)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Error as e:
+        logger.error(f"Database error syncing products: {e}")
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            return jsonify({"error": "Barcode is already assigned to another product"}), 400
+        return jsonify({"error": "Failed to sync products"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error syncing products: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+# Duplicate customers: a background job proposes merges, staff review them
+# and a second job applies the approved ones
+def run_dedup_job(job, min_score, max_block):
+    with get_db_cursor(dictionary=False) as (conn, cursor):
+        return customer_dedup.run_dedup(conn, cursor, min_score, max_block, progress=job.update)
+
+def run_merge_job(job, batch_size):
+    with get_db_cursor(dictionary=False) as (conn, cursor):
+        result = customer_dedup.run_merges(conn, cursor, batch_size, progress=job.update,
+                                           check_cancelled=job.check_cancelled)
+    if result['merged']:
+        publish_event('customers_merged', result)
+    return result
+
+job_runner.register('customer_dedup', store_job(run_dedup_job), limit=1)
+job_runner.register('customer_merge', store_job(run_merge_job), limit=1)
+
+@app.route('/api/customers/dedup', methods=['POST'])
+def start_customer_dedup():
+    """Start searching for duplicate customers"""
+    try:
+        data = request.get_json(silent=True) or {}
+        min_score = float(data.get('min_score', customer_dedup.MIN_SCORE))
+        max_block = int(data.get('max_block', customer_dedup.MAX_BLOCK))
+        
+        if not 0 < min_score <= 1 or max_block < 2:
+            return jsonify({"error": "min_score must be in (0, 1] and max_block at least 2"}), 400
+        
+        job = job_runner.submit('customer_dedup', store_id=current_store_id(), min_score=min_score, max_block=max_block)
+        return job_accepted(job)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid data types"}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error starting dedup job: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/customers/duplicates')
+def get_duplicate_customers():
+    """Proposed merges with both customers side by side, best matches first"""
+    try:
+        status = request.args.get('status', customer_dedup.PROPOSED)
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        
+        with get_db_cursor() as (conn, cursor):
+            cursor.execute("""
+                SELECT mc.candidate_id, mc.score, mc.reasons, mc.status, mc.created_at, mc.reviewed_at,
+                       mc.keep_id, k.name AS keep_name, k.phone AS keep_phone, k.email AS keep_email,
+                       mc.merge_id, m.name AS merge_name, m.phone AS merge_phone, m.email AS merge_email,
+                       (SELECT COUNT(*) FROM orders o WHERE o.customer_id = mc.merge_id) AS merge_orders
+                FROM customer_merge_candidates mc
+                LEFT JOIN customers k ON k.customer_id = mc.keep_id
+                LEFT JOIN customers m ON m.customer_id = mc.merge_id
+                WHERE mc.status = %s
+                ORDER BY mc.score DESC, mc.candidate_id
+                LIMIT %s OFFSET %s
+            """, (status, limit, offset))
+            candidates = cursor.fetchall()
+            cursor.execute("SELECT status, COUNT(*) AS count FROM customer_merge_candidates GROUP BY status")
+            counts = {row['status']: row['count'] for row in cursor.fetchall()}
+        
+        for candidate in candidates:
+            for field in ('created_at', 'reviewed_at'):
+                if candidate[field]:
+                    candidate[field] = candidate[field].isoformat()
+        return jsonify({"candidates": candidates, "counts": counts})
+    except Error as e:
+        logger.error(f"Database error getting duplicate customers: {e}")
+        return jsonify({"error": "Failed to fetch duplicate customers"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error getting duplicate customers: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/customers/duplicates/<int:candidate_id>', methods=['PUT'])
+def review_duplicate_customer(candidate_id):
+    """Approve or reject a proposed merge"""
+    try:
+        data = request.get_json(silent=True) or {}
+        status = data.get('status')
+        if status not in customer_dedup.REVIEW_STATUSES:
+            return jsonify({"error": "status must be 'approved' or 'rejected'"}), 400
+        
+        with get_db_cursor() as (conn, cursor):
+            cursor.execute("""
+                UPDATE customer_merge_candidates
+                SET status = %s, reviewed_at = NOW()
+                WHERE candidate_id = %s AND status IN ('proposed', 'approved', 'rejected')
+            """, (status, candidate_id))
+            conn.commit()
+            if cursor.rowcount == 0:
+                cursor.execute("SELECT status FROM customer_merge_candidates WHERE candidate_id = %s", (candidate_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return jsonify({"error": "Merge candidate not found"}), 404
+                if row['status'] != status:
+                    return jsonify({"error": f"Merge candidate is already {row['status']}"}), 409
+        return jsonify({"candidate_id": candidate_id, "status": status})
+    except Error as e:
+        logger.error(f"Database error reviewing duplicate customer: {e}")
+        return jsonify({"error": "Failed to review merge candidate"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error reviewing duplicate customer: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/customers/duplicates/merge', methods=['POST'])
+def merge_duplicate_customers():
+    """Start applying every approved merge"""
+    try:
+        data = request.get_json(silent=True) or {}
+        batch_size = int(data.get('batch_size', customer_dedup.MERGE_BATCH_SIZE))
+        if batch_size < 1:
+            return jsonify({"error": "batch_size must be positive"}), 400
+        
+        job = job_runner.submit('customer_merge', store_id=current_store_id(), batch_size=batch_size)
+        return job_accepted(job)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid data types"}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error starting merge job: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
 # Orders API endpoints
+# Orders older than the archive boundary live in orders_archive /
+# order_details_archive (see archive_orders.py); reads that reach back that
+# far query both table sets.
+archive_boundary_cache = PartitionedCache(maxsize=1, ttl=60)
+
+def get_archive_boundary():
+    """First day not covered by the archive (None when nothing is archived)"""
+    cache = archive_boundary_cache.partition(current_store_id())
+    boundary = cache.get('boundary', False)
+    if boundary is False:
+        with get_db_cursor(dictionary=False) as (conn, cursor):
+            boundary = archive_orders.archive_boundary(cursor)
+        cache.set('boundary', boundary)
+    return boundary
+
+def parse_date_range():
+    """Optional start/end (YYYY-MM-DD, inclusive) query args as [start, end + 1 day)"""
+    start = request.args.get('start')
+    end = request.args.get('end')
+    start = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+    end = datetime.strptime(end, '%Y-%m-%d').date() + timedelta(days=1) if end else None
+    return start, end
+
+def orders_range_filter(start, end, alias='o'):
+    """WHERE clause and params restricting orders to [start, end)"""
+    conditions = []
+    params = []
+    if start:
+        conditions.append(f"{alias}.datetime >= %s")
+        params.append(start)
+    if end:
+        conditions.append(f"{alias}.datetime < %s")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
 @app.route('/api/orders', methods=['GET'])
 def get_orders():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT o.order_id, o.customer_id, c.name as customer_name, o.total, o.datetime
-        FROM orders o
-        JOIN customers c ON o.customer_id = c.customer_id
-        ORDER BY o.datetime DESC
-    """)
-    orders = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify(orders)
+    """List orders, newest first
+    
+    Without a start date only the hot tables are read; a start date before
+    the archive boundary (or include_archive=true) adds archived orders.
+    """
+    try:
+        start, end = parse_date_range()
+        include_archive = request.args.get('include_archive', 'false').lower() == 'true'
+        
+        sources = [archive_orders.HOT_TABLES]
+        if start or include_archive:
+            sources = archive_orders.order_sources(get_archive_boundary(), start)
+        
+        where, params = orders_range_filter(start, end)
+        queries = []
+        for orders_table, _ in sources:
+            queries.append(f"""
+                SELECT o.order_id, o.customer_id, c.name as customer_name, o.total, o.datetime
+                FROM {orders_table} o
+                LEFT JOIN customers c ON o.customer_id = c.customer_id
+                {where}
+            """)
+        
+        with get_db_cursor() as (conn, cursor):
+            cursor.execute(" UNION ALL ".join(queries) + " ORDER BY datetime DESC",
+                           tuple(params) * len(queries))
+            orders = cursor.fetchall()
+            return jsonify(orders)
+    except ValueError:
+        return jsonify({"error": "Dates must use the YYYY-MM-DD format"}), 400
+    except Error as e:
+        logger.error(f"Error fetching orders: {e}")
+        return jsonify({"error": "Failed to fetch orders"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
 
 @app.route('/api/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Get order details
-    cursor.execute("""
-        SELECT o.order_id, o.customer_id, c.name as customer_name, o.total, o.datetime
-        FROM orders o
-        JOIN customers c ON o.customer_id = c.customer_id
-        WHERE o.order_id = %s
-    """, (order_id,))
-    order = cursor.fetchone()
-    
-    if not order:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "Order not found"}), 404
+    """Get one order with its items, from the archive if it is no longer hot"""
+    try:
+        with get_db_cursor() as (conn, cursor):
+            for orders_table, details_table in (archive_orders.HOT_TABLES, archive_orders.ARCHIVE_TABLES):
+                # Get order details
+                cursor.execute(f"""
+                    SELECT o.order_id, o.customer_id, c.name as customer_name, o.total, o.datetime
+                    FROM {orders_table} o
+                    LEFT JOIN customers c ON o.customer_id = c.customer_id
+                    WHERE o.order_id = %s
+                """, (order_id,))
+                order = cursor.fetchone()
+                if order:
+                    break
+            
+            if not order:
+                return jsonify({"error": "Order not found"}), 404
+            
+            # Get order items
+            # Lines carry the product as it was sold, so no product joins
+            cursor.execute(f"""
+                SELECT product_id, product_name, quantity, uom_name, unit_price, discount, total_price
+                FROM {details_table}
+                WHERE order_id = %s
+            """, (order_id,))
+            order_items = cursor.fetchall()
+        
+        # Combine order and items
+        order['items'] = order_items
+        order['archived'] = orders_table == archive_orders.ARCHIVE_TABLES[0]
+        return jsonify(order)
+    except Error as e:
+        logger.error(f"Error fetching order {order_id}: {e}")
+        return jsonify({"error": "Failed to fetch order"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/orders/export')
+def export_orders():
+    """Stream order lines in [start, end] as CSV, including archived months"""
+    try:
+        start, end = parse_date_range()
+        sources = archive_orders.order_sources(get_archive_boundary(), start)
+    except ValueError:
+        return jsonify({"error": "Dates must use the YYYY-MM-DD format"}), 400
+    except Error as e:
+        logger.error(f"Error preparing order export: {e}")
+        return jsonify({"error": "Failed to export orders"}), 500
     
-    # Get order items
-    cursor.execute("""
-        SELECT od.product_id, p.name as product_name, od.quantity, u.uom_name, od.total_price
-        FROM order_details od
-        JOIN products p ON od.product_id = p.product_id
-        JOIN uom u ON p.uom_id = u.uom_id
-        WHERE od.order_id = %s
-    """, (order_id,))
-    order_items = cursor.fetchall()
+    where, params = orders_range_filter(start, end)
+    columns = ['order_id', 'datetime', 'customer_id', 'customer_name', 'product_id',
+               'product_name', 'uom_name', 'quantity', 'unit_price', 'discount', 'total_price']
     
-    cursor.close()
-    conn.close()
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        with get_db_cursor(dictionary=False) as (conn, cursor):
+            for orders_table, details_table in sources:
+                cursor.execute(f"""
+                    SELECT o.order_id, o.datetime, o.customer_id, c.name, od.product_id,
+                           od.product_name, od.uom_name, od.quantity, od.unit_price, od.discount,
+                           od.total_price
+                    FROM {orders_table} o
+                    JOIN {details_table} od ON od.order_id = o.order_id
+                    LEFT JOIN customers c ON o.customer_id = c.customer_id
+                    {where}
+                    ORDER BY o.order_id
+                """, tuple(params))
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        yield buffer.getvalue()
     
-    # Combine order and items
-    order['items'] = order_items
-    return jsonify(order)
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=orders.csv'})
+
+def run_archive_job(job, keep_months, batch_size):
+    with get_db_cursor(dictionary=False) as (conn, cursor):
+        results = archive_orders.run_archiver(conn, cursor, keep_months, batch_size,
+                                              pause=0.05, progress=job.update)
+    archive_boundary_cache.partition(current_store_id()).clear()
+    return {month: {"orders": orders, "lines": lines} for month, (orders, lines) in results.items()}
+
+job_runner.register('archive_orders', store_job(run_archive_job), limit=1)
+
+@app.route('/api/orders/archive', methods=['POST'])
+def archive_old_orders():
+    """Start moving closed months of orders to the archive tables"""
+    try:
+        data = request.get_json(silent=True) or {}
+        keep_months = int(data.get('keep_months', archive_orders.KEEP_MONTHS))
+        batch_size = int(data.get('batch_size', archive_orders.BATCH_SIZE))
+        
+        if keep_months < 1 or batch_size < 1:
+            return jsonify({"error": "keep_months and batch_size must be positive"}), 400
+        
+        job = job_runner.submit('archive_orders', store_id=current_store_id(), keep_months=keep_months, batch_size=batch_size)
+        return job_accepted(job)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid data types"}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error starting archive job: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+# Order total reconciliation: worker threads open their own connections to
+# the store that started the job
+def run_reconcile_job(job, resume, run_id, chunk_size, workers, fix):
+    store_id = current_store_id()
+    summary = reconcile_orders.reconcile(
+        lambda: open_db_connection(store_id), resume, run_id, chunk_size, workers,
+        progress=job.update, check_cancelled=job.check_cancelled)
+    if fix:
+        with get_db_cursor(dictionary=False) as (conn, cursor):
+            reconcile_orders.fix_discrepancies(conn, cursor, summary['run_id'], progress=job.update,
+                                               check_cancelled=job.check_cancelled)
+            summary = reconcile_orders.run_summary(cursor, summary['run_id'])
+    return summary
+
+job_runner.register('reconcile_orders', store_job(run_reconcile_job), limit=1)
+
+@app.route('/api/orders/reconcile', methods=['POST'])
+def reconcile_order_totals():
+    """Start checking order totals against their lines
+
+    {"resume": true} continues the newest unfinished run (or "run_id" a
+    given one); {"fix": true} corrects mismatched totals afterwards.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        resume = bool(data.get('resume', False))
+        run_id = data.get('run_id')
+        run_id = int(run_id) if run_id is not None else None
+        chunk_size = int(data.get('chunk_size', reconcile_orders.CHUNK_SIZE))
+        workers = int(data.get('workers', reconcile_orders.WORKERS))
+        fix = bool(data.get('fix', False))
+        
+        if chunk_size < 1 or not 1 <= workers <= 16:
+            return jsonify({"error": "chunk_size must be positive and workers between 1 and 16"}), 400
+        
+        job = job_runner.submit('reconcile_orders', store_id=current_store_id(), resume=resume, run_id=run_id,
+                                chunk_size=chunk_size, workers=workers, fix=fix)
+        return job_accepted(job)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid data types"}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error starting reconciliation: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/orders/discrepancies', methods=['GET'])
+def get_order_discrepancies():
+    """Findings of a reconciliation run (the newest by default), by order id
+
+    Pages with ?after=<order_id>&limit=; ?kind=total or price filters.
+    """
+    try:
+        run_id = request.args.get('run_id', type=int)
+        after = request.args.get('after', 0, type=int)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        kind = request.args.get('kind')
+        if kind not in (None, 'total', 'price'):
+            return jsonify({"error": "kind must be total or price"}), 400
+        
+        with get_db_cursor(dictionary=False) as (conn, cursor):
+            if run_id is None:
+                cursor.execute("SELECT MAX(run_id) FROM reconciliation_runs")
+                run_id = cursor.fetchone()[0]
+            summary = reconcile_orders.run_summary(cursor, run_id) if run_id else None
+            if summary is None:
+                return jsonify({"error": "Reconciliation run not found"}), 404
+        
+        with get_db_cursor() as (conn, cursor):
+            condition = {'total': 'AND total_mismatch', 'price': 'AND price_mismatch'}.get(kind, '')
+            cursor.execute(f"""
+                SELECT order_id, recorded_total, lines_total, priced_total, line_count,
+                       total_mismatch, price_mismatch, fixed_at
+                FROM order_discrepancies
+                WHERE run_id = %s AND order_id > %s {condition}
+                ORDER BY order_id
+                LIMIT %s
+            """, (run_id, after, limit))
+            discrepancies = cursor.fetchall()
+        
+        for row in discrepancies:
+            row['total_mismatch'] = bool(row['total_mismatch'])
+            row['price_mismatch'] = bool(row['price_mismatch'])
+            row['fixed_at'] = row['fixed_at'].isoformat() if row['fixed_at'] else None
+        return jsonify({"run": summary, "orders": discrepancies})
+    except Error as e:
+        logger.error(f"Database error fetching discrepancies: {e}")
+        return jsonify({"error": "Failed to fetch discrepancies"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error fetching discrepancies: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+# Cart quotes and promotions
+@app.route('/api/cart/quote', methods=['POST'])
+def quote_cart():
+    """Price a whole basket: current prices plus the best promotion per line
+
+    The quote is kept for QUOTE_TTL seconds; an order placed with its
+    quote_id for the same basket is charged exactly what was quoted.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        basket = promotions.parse_basket(data.get('items'))
+        index = get_promotion_index()
+        with get_db_cursor() as (conn, cursor):
+            quote = promotions.price_basket(cursor, index, basket)
+        quote_id = uuid.uuid4().hex
+        cart_quotes.partition(current_store_id()).set(quote_id, {'basket': basket, 'quote': quote})
+        return jsonify({"quote_id": quote_id, "expires_in": QUOTE_TTL, **quote})
+    except promotions.InvalidBasket as e:
+        return jsonify({"error": str(e)}), 400
+    except Error as e:
+        logger.error(f"Database error quoting cart: {e}")
+        return jsonify({"error": "Failed to quote cart"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error quoting cart: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/promotions', methods=['GET'])
+def get_promotions():
+    """All promotions, active ones first (?active=1 for active only)"""
+    try:
+        condition = "WHERE active" if request.args.get('active') == '1' else ""
+        with get_db_cursor() as (conn, cursor):
+            cursor.execute(f"""
+                SELECT {promotions.RULE_COLUMNS}, active, updated_at
+                FROM promotions
+                {condition}
+                ORDER BY active DESC, promotion_id
+            """)
+            rows = cursor.fetchall()
+        for row in rows:
+            row['active'] = bool(row['active'])
+            for column in ('starts_at', 'ends_at', 'updated_at'):
+                row[column] = row[column].isoformat() if row[column] else None
+        return jsonify(rows)
+    except Error as e:
+        logger.error(f"Database error fetching promotions: {e}")
+        return jsonify({"error": "Failed to fetch promotions"}), 500
+
+@app.route('/api/promotions', methods=['POST'])
+def add_promotion():
+    """Create a quantity break, multi-buy or category promotion"""
+    try:
+        rule = promotions.parse_promotion(request.get_json(silent=True), parse_datetime_param)
+        with get_db_cursor() as (conn, cursor):
+            cursor.execute("""
+                INSERT INTO promotions (name, kind, product_id, category, min_quantity, percent_off,
+                                        unit_price, buy_quantity, pay_quantity, starts_at, ends_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (rule['name'], rule['kind'], rule['product_id'], rule['category'], rule['min_quantity'],
+                  rule['percent_off'], rule['unit_price'], rule['buy_quantity'], rule['pay_quantity'],
+                  rule['starts_at'], rule['ends_at']))
+            conn.commit()
+            promotion_id = cursor.lastrowid
+        promotion_indexes.get(current_store_id()).invalidate()
+        return jsonify({"promotion_id": promotion_id, "message": "Promotion created"}), 201
+    except promotions.InvalidPromotion as e:
+        return jsonify({"error": str(e)}), 400
+    except mysql.connector.IntegrityError as e:
+        logger.error(f"Integrity error adding promotion: {e}")
+        return jsonify({"error": "Product not found"}), 400
+    except Error as e:
+        logger.error(f"Database error adding promotion: {e}")
+        return jsonify({"error": "Failed to add promotion"}), 500
+
+@app.route('/api/promotions/<int:promotion_id>', methods=['DELETE'])
+def end_promotion(promotion_id):
+    """Deactivate a promotion; orders that used it keep their discount"""
+    try:
+        with get_db_cursor() as (conn, cursor):
+            cursor.execute("UPDATE promotions SET active = FALSE WHERE promotion_id = %s AND active",
+                           (promotion_id,))
+            conn.commit()
+            if cursor.rowcount == 0:
+                return jsonify({"error": "Promotion not found"}), 404
+        promotion_indexes.get(current_store_id()).invalidate()
+        return jsonify({"message": "Promotion ended"})
+    except Error as e:
+        logger.error(f"Database error ending promotion {promotion_id}: {e}")
+        return jsonify({"error": "Failed to end promotion"}), 500
+
+@app.route('/api/promotions/stats')
+def get_promotion_stats():
+    """Compiled promotion index of this worker for the current store"""
+    return jsonify(promotion_indexes.get(current_store_id()).stats())
 
 @app.route('/api/orders', methods=['POST'])
 def create_order():
@@ -455,30 +1700,57 @@ def create_order():
     cursor = conn.cursor()
     
     try:
+        # Lines are priced on the server like a cart quote: prices in effect
+        # now plus promotions; client-side totals are not trusted. A fresh
+        # quote for the same basket is reused as quoted.
+        basket = promotions.parse_basket(data['items'])
+        cached = cart_quotes.partition(current_store_id()).get(str(data.get('quote_id')))
+        index = None if cached and cached['basket'] == basket else get_promotion_index()
+        
         # Start transaction
         conn.start_transaction()
+        quote = cached['quote'] if index is None else promotions.price_basket(cursor, index, basket)
         
         # Insert order
         cursor.execute("""
             INSERT INTO orders (customer_id, total)
             VALUES (%s, %s)
-        """, (data['customer_id'], data['total']))
+        """, (data['customer_id'], quote['total']))
         
         order_id = cursor.lastrowid
         
-        # Insert order details
-        for item in data['items']:
-            cursor.execute("""
-                INSERT INTO order_details (order_id, product_id, quantity, total_price)
-                VALUES (%s, %s, %s, %s)
-            """, (order_id, item['product_id'], item['quantity'], item['total_price']))
+        # Insert order details with the names, units and prices as sold
+        cursor.executemany("""
+            INSERT INTO order_details (order_id, product_id, quantity, total_price,
+                                       product_name, uom_name, unit_price, discount, promotion_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, [(order_id, line['product_id'], line['quantity'], line['total_price'], line['product_name'],
+               line['uom_name'], line['unit_price'], line['discount'],
+               line['promotion']['promotion_id'] if line['promotion'] else None)
+              for line in quote['lines']])
+        
+        # Sold quantities leave the shelf; products crossing their reorder
+        # threshold are flagged in the same transaction
+        stock_alerts.decrement_stock(cursor, dict(basket))
+        levels, alerts = stock_alerts.apply_stock_changes(cursor, [product_id for product_id, _ in basket])
         
         # Commit transaction
         conn.commit()
         cursor.close()
         conn.close()
         
-        return jsonify({"order_id": order_id, "message": "Order created successfully"}), 201
+        publish_stock_changes(levels, alerts)
+        
+        publish_event('order_created', {
+            "order_id": order_id,
+            "customer_id": data['customer_id'],
+            "total": quote['total'],
+            "datetime": datetime.now().isoformat(timespec='seconds'),
+            "items": [{"product_id": line['product_id'], "quantity": line['quantity']}
+                      for line in quote['lines']]
+        })
+        return jsonify({"order_id": order_id, "total": quote['total'], "discount": quote['discount'],
+                        "message": "Order created successfully"}), 201
     
     except Exception as e:
         conn.rollback()
@@ -486,6 +1758,93 @@ def create_order():
         conn.close()
         return jsonify({"error": str(e)}), 400
 
+@app.route('/api/orders/sync', methods=['POST'])
+def sync_orders():
+    """Store a batch of orders queued offline by the checkout page
+
+    Orders are deduplicated by client_order_uuid, so a batch can be resent
+    safely. Results come back in the order the orders were sent, each with
+    its index: created, duplicate (already stored, or sent earlier in the
+    same batch, with its order_id) or rejected (never retry).
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        raw_orders = data.get('orders')
+        if not isinstance(raw_orders, list) or not raw_orders:
+            return jsonify({"error": "orders must be a non-empty list"}), 400
+        if len(raw_orders) > order_sync.MAX_BATCH:
+            return jsonify({"error": f"At most {order_sync.MAX_BATCH} orders per sync"}), 413
+        
+        now = datetime.now()
+        # One entry per position: a parsed order, or its rejection
+        parsed = []
+        for raw in raw_orders:
+            try:
+                parsed.append(order_sync.parse_order(raw, now))
+            except order_sync.InvalidOrder as e:
+                client_uuid = str(raw.get('client_order_uuid', '')) if isinstance(raw, dict) else ''
+                parsed.append((client_uuid, str(e)))
+        orders = [order for order in parsed if isinstance(order, dict)]
+        
+        # Orders are priced on the server; a fresh quote for the same basket
+        # is kept as quoted, as in create_order
+        quotes = cart_quotes.partition(current_store_id())
+        for order in orders:
+            cached = quotes.get(order['quote_id']) if order['quote_id'] else None
+            if cached and cached['basket'] == order['basket']:
+                order['quote'] = cached['quote']
+        
+        results = {}
+        if orders:
+            promotion_index = get_promotion_index()
+            with get_db_cursor(dictionary=False) as (conn, cursor):
+                results = order_sync.sync_orders(conn, cursor, orders, promotion_index,
+                                                 on_stock_change=publish_stock_changes)
+        
+        response = []
+        seen = set()
+        for index, order in enumerate(parsed):
+            if not isinstance(order, dict):
+                client_uuid, error = order
+                response.append({"index": index, "client_order_uuid": client_uuid,
+                                 "status": order_sync.REJECTED, "order_id": None, "error": error, "total": None})
+                continue
+            client_uuid = order['client_order_uuid']
+            status, order_id, error = results[client_uuid]
+            if client_uuid in seen:
+                # A repeat within the batch was stored (or rejected) as the first copy
+                status = order_sync.DUPLICATE if order_id else status
+            elif status == order_sync.CREATED:
+                publish_event('order_created', {
+                    "order_id": order_id,
+                    "customer_id": order['customer_id'],
+                    "total": order['quote']['total'],
+                    "datetime": order['created_at'].isoformat(timespec='seconds'),
+                    "items": [{"product_id": pid, "quantity": quantity} for pid, quantity in order['basket']]
+                })
+            seen.add(client_uuid)
+            response.append({"index": index, "client_order_uuid": client_uuid,
+                             "status": status, "order_id": order_id, "error": error,
+                             "total": order['quote']['total'] if status == order_sync.CREATED else None})
+        
+        counts = {status: sum(1 for r in response if r['status'] == status)
+                  for status in (order_sync.CREATED, order_sync.DUPLICATE, order_sync.REJECTED)}
+        return jsonify({"results": response, **counts})
+    except Error as e:
+        logger.error(f"Database error syncing orders: {e}")
+        return jsonify({"error": "Failed to sync orders"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error syncing orders: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+# Offline support: the service worker must be served from the site root to
+# control every page
+@app.route('/sw.js')
+def service_worker():
+    response = send_from_directory(os.path.join(app.root_path, 'static', 'js'), 'sw.js')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # Page routes
 @app.route('/products')
 def products_page():
@@ -555,15 +1914,7 @@ def get_popular_products():
     """Get popular products (all products for now, can be enhanced with sales data)"""
     try:
         with get_db_cursor() as (conn, cursor):
-            cursor.execute("""
-                SELECT p.product_id, p.name, p.price_per_unit, u.uom_name,
-                       COALESCE(p.stock_quantity, 100) as stock_quantity
-                FROM products p
-                JOIN uom u ON p.uom_id = u.uom_id
-                ORDER BY p.name
-                LIMIT 20
-            """)
-            products = cursor.fetchall()
+            products = fetch_statement(conn, 'products.popular')
             
             # Convert Decimal to float for JSON serialization
             for product in products:
@@ -618,13 +1969,13 @@ def get_inventory_summary():
                 WHERE TABLE_NAME = 'products' 
                 AND COLUMN_NAME = 'stock_quantity'
                 AND TABLE_SCHEMA = %s
-            """, (db_config['database'],))
+            """, (store_registry.config(current_store_id())['database'],))
             
             has_stock_column = cursor.fetchone()['COUNT(*)'] > 0
             
             if not has_stock_column:
                 # Add stock column if it doesn't exist
-                cursor.execute("ALTER TABLE products ADD COLUMN stock_quantity INT DEFAULT 100")
+                cursor.execute("ALTER TABLE products ADD COLUMN stock_quantity DOUBLE DEFAULT 100")
                 cursor.execute("UPDATE products SET stock_quantity = FLOOR(RAND() * 150) + 10")
                 conn.commit()
             
@@ -632,7 +1983,7 @@ def get_inventory_summary():
             cursor.execute("""
                 SELECT 
                     COUNT(*) as total_products,
-                    COUNT(CASE WHEN stock_quantity < 10 THEN 1 END) as low_stock_count,
+                    COUNT(low_stock_since) as low_stock_count,
                     COUNT(CASE WHEN stock_quantity = 0 THEN 1 END) as out_of_stock,
                     AVG(stock_quantity) as avg_stock,
                     SUM(price_per_unit * stock_quantity) as total_value
@@ -658,25 +2009,29 @@ def get_inventory_summary():
 
 @app.route('/api/inventory/low-stock')
 def get_low_stock_products():
-    """Get products with low stock levels"""
+    """Get products with low stock levels
+    
+    By default these are the products below their own reorder threshold,
+    read from the flags kept by stock_alerts. ?threshold=N scans the
+    catalog for stock below N instead. With rank=days_of_cover, products
+    are ranked by how many days their stock lasts at the forecast demand.
+    """
     try:
-        low_stock_threshold = request.args.get('threshold', 10, type=int)
+        if request.args.get('rank') == 'days_of_cover':
+            return get_low_stock_by_cover()
         
         with get_db_cursor() as (conn, cursor):
-            cursor.execute("""
-                SELECT p.product_id, p.name, p.price_per_unit, 
-                       COALESCE(p.stock_quantity, 100) as stock_quantity, u.uom_name
-                FROM products p
-                JOIN uom u ON p.uom_id = u.uom_id
-                WHERE COALESCE(p.stock_quantity, 100) < %s
-                ORDER BY COALESCE(p.stock_quantity, 100) ASC
-            """, (low_stock_threshold,))
-            
-            products = cursor.fetchall()
+            if 'threshold' in request.args:
+                low_stock_threshold = request.args.get('threshold', stock_alerts.DEFAULT_THRESHOLD, type=int)
+                products = fetch_statement(conn, 'products.low_stock', (low_stock_threshold,))
+            else:
+                products = fetch_statement(conn, 'products.low_stock_flagged')
             
             # Convert Decimal to float for JSON serialization
             for product in products:
                 product['price_per_unit'] = float(product['price_per_unit'])
+                if product.get('low_stock_since'):
+                    product['low_stock_since'] = product['low_stock_since'].isoformat()
             
             return jsonify(products)
             
@@ -687,6 +2042,51 @@ def get_low_stock_products():
         logger.error(f"Unexpected error getting low stock products: {e}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+def get_low_stock_by_cover():
+    """Products at or below their reorder point or running out within max_days"""
+    max_days = request.args.get('max_days', 14, type=float)
+    limit = request.args.get('limit', 100, type=int)
+    
+    with get_db_cursor() as (conn, cursor):
+        products = fetch_statement(conn, 'products.low_stock_by_cover', (max_days, limit))
+        
+        for product in products:
+            product['price_per_unit'] = float(product['price_per_unit'])
+            product['days_of_cover'] = round(float(product['days_of_cover']), 1)
+            product['reorder_point'] = round(float(product['reorder_point']), 1)
+            product['forecast_daily_demand'] = round(float(product['forecast_daily_demand']), 3)
+            if product['forecast_date']:
+                product['forecast_date'] = product['forecast_date'].isoformat()
+        
+        return jsonify(products)
+
+def run_forecast_job(job, history_days, lead_time):
+    with get_db_cursor(dictionary=False) as (conn, cursor):
+        count = forecast.run_forecast(conn, cursor, history_days, lead_time=lead_time,
+                                      progress=job.update)
+    return {"products": count}
+
+job_runner.register('forecast', store_job(run_forecast_job), limit=1)
+
+@app.route('/api/inventory/forecast', methods=['POST'])
+def refresh_forecasts():
+    """Start recomputing demand forecasts and reorder points for all products"""
+    try:
+        data = request.get_json(silent=True) or {}
+        history_days = int(data.get('history_days', forecast.HISTORY_DAYS))
+        lead_time = int(data.get('lead_time', forecast.LEAD_TIME_DAYS))
+        
+        if history_days < 1 or lead_time < 1:
+            return jsonify({"error": "history_days and lead_time must be positive"}), 400
+        
+        job = job_runner.submit('forecast', store_id=current_store_id(), history_days=history_days, lead_time=lead_time)
+        return job_accepted(job)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid data types"}), 400
+    except Exception as e:
+        logger.error(f"Unexpected error starting forecast job: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
 @app.route('/api/inventory/update-stock', methods=['POST'])
 def update_product_stock():
     """Update stock quantity for a product"""
@@ -697,22 +2097,31 @@ def update_product_stock():
             return jsonify({"error": "Missing product_id or stock_quantity"}), 400
         
         product_id = int(data['product_id'])
-        stock_quantity = int(data['stock_quantity'])
+        stock_quantity = float(data['stock_quantity'])
+        if not math.isfinite(stock_quantity):
+            raise ValueError("stock_quantity must be a number")
         
         if stock_quantity < 0:
             return jsonify({"error": "Stock quantity cannot be negative"}), 400
         
         with get_db_cursor() as (conn, cursor):
+            # The row lock taken by the UPDATE is held until the flag check
+            # commits, so concurrent writers can't both report the crossing
+            conn.start_transaction()
             cursor.execute("""
                 UPDATE products 
                 SET stock_quantity = %s 
                 WHERE product_id = %s
             """, (stock_quantity, product_id))
             
-            if cursor.rowcount > 0:
+            # Unchanged stock reports 0 rows, so existence is decided by the flag check
+            levels, alerts = stock_alerts.apply_stock_changes(cursor, [product_id])
+            if levels:
                 conn.commit()
+                publish_stock_changes(levels, alerts)
                 return jsonify({"message": "Stock updated successfully", "new_stock": stock_quantity})
             else:
+                conn.rollback()
                 return jsonify({"error": "Product not found"}), 404
                 
     except ValueError:
@@ -724,7 +2133,44 @@ def update_product_stock():
         logger.error(f"Unexpected error updating stock: {e}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+@app.route('/api/inventory/reorder-threshold', methods=['POST'])
+def update_reorder_threshold():
+    """Set a product's reorder threshold (null restores the default)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if 'product_id' not in data or 'reorder_threshold' not in data:
+            return jsonify({"error": "Missing product_id or reorder_threshold"}), 400
+        
+        product_id = int(data['product_id'])
+        threshold = data['reorder_threshold']
+        threshold = int(threshold) if threshold is not None else None
+        if threshold is not None and threshold < 0:
+            return jsonify({"error": "Reorder threshold cannot be negative"}), 400
+        
+        with get_db_cursor() as (conn, cursor):
+            conn.start_transaction()
+            cursor.execute("UPDATE products SET reorder_threshold = %s WHERE product_id = %s",
+                           (threshold, product_id))
+            levels, alerts = stock_alerts.apply_stock_changes(cursor, [product_id])
+            if not levels:
+                conn.rollback()
+                return jsonify({"error": "Product not found"}), 404
+            conn.commit()
+        for alert in alerts:
+            publish_event('low_stock', alert)
+        return jsonify({"message": "Reorder threshold updated",
+                        "reorder_threshold": threshold if threshold is not None else stock_alerts.DEFAULT_THRESHOLD})
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid data types"}), 400
+    except Error as e:
+        logger.error(f"Database error updating reorder threshold: {e}")
+        return jsonify({"error": "Failed to update reorder threshold"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error updating reorder threshold: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
 @app.route('/api/dashboard/stats')
+@serve_stale
 def get_dashboard_stats():
     """Get comprehensive dashboard statistics"""
     try:
@@ -739,9 +2185,17 @@ def get_dashboard_stats():
             cursor.execute("SELECT COUNT(*) as count FROM customers")
             stats['total_customers'] = cursor.fetchone()['count']
             
-            # Total orders
-            cursor.execute("SELECT COUNT(*) as count FROM orders")
-            stats['total_orders'] = cursor.fetchone()['count']
+            # Total orders, including archived ones from the per-month archive log
+            cursor.execute("""
+                SELECT COUNT(*) as count, COALESCE(SUM(total), 0) as revenue FROM orders
+            """)
+            hot = cursor.fetchone()
+            cursor.execute("""
+                SELECT COALESCE(SUM(orders), 0) as count, COALESCE(SUM(revenue), 0) as revenue
+                FROM order_archive_log
+            """)
+            archived = cursor.fetchone()
+            stats['total_orders'] = int(hot['count']) + int(archived['count'])
             
             # Today's orders and revenue
             today = date.today()
@@ -764,11 +2218,8 @@ def get_dashboard_stats():
             stats['month_revenue'] = float(cursor.fetchone()['revenue'])
             
             # Average order value
-            cursor.execute("""
-                SELECT COALESCE(AVG(total), 0) as avg_order
-                FROM orders
-            """)
-            stats['avg_order_value'] = float(cursor.fetchone()['avg_order'])
+            total_revenue = float(hot['revenue']) + float(archived['revenue'])
+            stats['avg_order_value'] = total_revenue / stats['total_orders'] if stats['total_orders'] else 0.0
             
             return jsonify(stats)
     except Error as e:
@@ -778,6 +2229,221 @@ def get_dashboard_stats():
         logger.error(f"Unexpected error getting dashboard stats: {e}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+# Analytics API endpoints
+sales_analytics_cache = PartitionedCache(maxsize=64, ttl=300)
+
+# Columnar order history (see sales_snapshots.py). When SNAPSHOT_DIR is set
+# and a store has been exported, reports read the memory-mapped snapshot
+# instead of MySQL; ?source=db asks for live data.
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR')
+REPORT_SOURCES = ('snapshot', 'db')
+
+def snapshot_path(store_id=None):
+    """A store's exported snapshot directory, or None when reports must query MySQL"""
+    if not SNAPSHOT_DIR:
+        return None
+    path = sales_snapshots.store_path(SNAPSHOT_DIR, store_id or current_store_id())
+    return path if sales_snapshots.read_state(path) else None
+
+def run_snapshot_job(job, full):
+    with get_db_cursor(dictionary=False) as (conn, cursor):
+        summary = sales_snapshots.export(conn, cursor, sales_snapshots.store_path(SNAPSHOT_DIR, current_store_id()),
+                                         full=full, progress=job.update)
+    sales_analytics_cache.partition(current_store_id()).clear()
+    return summary
+
+job_runner.register('export_snapshots', store_job(run_snapshot_job), limit=1)
+
+@app.route('/api/analytics/snapshots', methods=['POST'])
+def export_snapshots():
+    """Start bringing the store's columnar snapshot up to date
+
+    Appends new orders; {"full": true} rewrites every month.
+    """
+    try:
+        if not SNAPSHOT_DIR:
+            return jsonify({"error": "Snapshots are not configured (SNAPSHOT_DIR)"}), 400
+        data = request.get_json(silent=True) or {}
+        job = job_runner.submit('export_snapshots', store_id=current_store_id(), full=bool(data.get('full')))
+        return job_accepted(job)
+    except Exception as e:
+        logger.error(f"Unexpected error starting snapshot export: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/api/analytics/snapshots', methods=['GET'])
+def get_snapshot_state():
+    """Newest exported order and export times of the store's snapshot"""
+    path = snapshot_path()
+    if path is None:
+        return jsonify({"error": "No snapshot has been exported"}), 404
+    state = sales_snapshots.read_state(path)
+    state['months'] = sales_snapshots.exported_months(path)
+    return jsonify(state)
+
+@app.route('/api/analytics/sales')
+def get_sales_analytics():
+    """Revenue and units time series, in total and per product and UOM"""
+    try:
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in analytics.GRANULARITIES:
+            return jsonify({"error": f"granularity must be one of: {', '.join(analytics.GRANULARITIES)}"}), 400
+        
+        # Dates are inclusive in the API; the query range is [start, end + 1 day)
+        try:
+            end = request.args.get('end')
+            end = datetime.strptime(end, '%Y-%m-%d').date() if end else date.today()
+            start = request.args.get('start')
+            start = datetime.strptime(start, '%Y-%m-%d').date() if start else end - timedelta(days=29)
+        except ValueError:
+            return jsonify({"error": "Dates must use the YYYY-MM-DD format"}), 400
+        
+        if start > end:
+            return jsonify({"error": "start must not be after end"}), 400
+        
+        top = request.args.get('top', 20, type=int)
+        source = request.args.get('source', 'snapshot')
+        if source not in REPORT_SOURCES:
+            return jsonify({"error": f"source must be one of: {', '.join(REPORT_SOURCES)}"}), 400
+        snapshot = snapshot_path() if source == 'snapshot' else None
+        
+        cache_key = (start, end, granularity, top, snapshot is not None)
+        cache = sales_analytics_cache.partition(current_store_id())
+        result = cache.get(cache_key)
+        if result is None and snapshot:
+            result = sales_snapshots.sales_timeseries(snapshot, start, end + timedelta(days=1), granularity, top)
+            result['end'] = end.isoformat()
+            result['source'] = 'snapshot'
+            cache.set(cache_key, result)
+        elif result is None:
+            with get_db_cursor(dictionary=False) as (conn, cursor):
+                result = analytics.sales_timeseries(
+                    cursor, start, end + timedelta(days=1), granularity, top,
+                    sources=archive_orders.order_sources(archive_orders.archive_boundary(cursor), start)
+                )
+            result['end'] = end.isoformat()
+            result['source'] = 'db'
+            cache.set(cache_key, result)
+        
+        return jsonify(result)
+    except Error as e:
+        logger.error(f"Database error getting sales analytics: {e}")
+        return jsonify({"error": "Failed to fetch sales analytics"}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error getting sales analytics: {e}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+# Cross-store reporting: one query set per store, run concurrently
+STORE_REPORT_TIMEOUT = float(os.getenv('STORE_REPORT_TIMEOUT', '10'))
+store_report_executor = None
+store_report_lock = threading.Lock()
+
+def store_report(store_id, start, end, top, use_snapshot=False):
+    """Order count, revenue and top products of one store for [start, end)"""
+    snapshot = snapshot_path(store_id) if use_snapshot else None
+    if snapshot:
+        return {"store_id": store_id, "source": "snapshot",
+                **sales_snapshots.store_summary(snapshot, start, end, top)}
+    with store_registry.use(store_id), get_db_cursor(dictionary=False) as (conn, cursor):
+        # Archived months count too, and lines are named as they were sold so
+        # deleted or renamed products keep their sales
+        sources = archive_orders.order_sources(archive_orders.archive_boundary(cursor), start)
+        where, params = orders_range_filter(start, end)
+        orders = " UNION ALL ".join(f"SELECT o.total FROM {orders_table} o {where}"
+                                    for orders_table, _ in sources)
+        cursor.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(total), 0) FROM ({orders}) o
+        """, params * len(sources))
+        order_count, revenue = cursor.fetchone()
+        lines = " UNION ALL ".join(f"""
+            SELECT od.product_id, od.product_name, od.quantity, od.total_price
+            FROM {details_table} od
+            JOIN {orders_table} o ON od.order_id = o.order_id
+            {where}
+        """ for orders_table, details_table in sources)
+        cursor.execute(f"""
+            SELECT MAX(product_name), SUM(quantity), SUM(total_price) as revenue
+            FROM ({lines}) od
+            GROUP BY product_id
+            ORDER BY revenue DESC
+            LIMIT %s
+        """, params * len(sources) + [top])
+        products = cursor.fetchall()
+    return {
+        "store_id": store_id,
+        "source": "db",
+        "orders": order_count,
+        "revenue": float(revenue),
+        "top_products": [{"name": name, "quantity": float(quantity), "revenue": float(sales)}
+                         for name, quantity, sales in products]
+    }
+
+def merge_store_reports(reports, top):
+    """Totals over all stores, with top products matched by name"""
+    by_name = {}
+    for report in reports:
+        for product in report['top_products']:
+            merged = by_name.setdefault(product['name'], {"name": product['name'], "quantity": 0.0, "revenue": 0.0})
+            merged['quantity'] += product['quantity']
+            merged['revenue'] += product['revenue']
+    return {
+        "orders": sum(r['orders'] for r in reports),
+        "revenue": round(sum(r['revenue'] for r in reports), 2),
+        "top_products": sorted(by_name.values(), key=lambda p: p['revenue'], reverse=True)[:top]
+    }
+
+@app.route('/api/reports/stores')
+def get_store_report():
+    """Orders, revenue and top products per store and across all stores
+
+    Stores are queried concurrently; a store that fails or does not answer
+    within STORE_REPORT_TIMEOUT is listed under errors and left out of the
+    totals.
+    """
+    global store_report_executor
+    try:
+        start, end = parse_date_range()
+    except ValueError:
+        return jsonify({"error": "Dates must use the YYYY-MM-DD format"}), 400
+    start = start or date.today() - timedelta(days=29)
+    top = min(request.args.get('top', 10, type=int), 100)
+    source = request.args.get('source', 'snapshot')
+    if source not in REPORT_SOURCES:
+        return jsonify({"error": f"source must be one of: {', '.join(REPORT_SOURCES)}"}), 400
+    store_ids = [s for s in request.args.get('stores', '').split(',') if s] or store_registry.ids()
+    unknown = [s for s in store_ids if s not in store_registry]
+    if unknown:
+        return jsonify({"error": f"Unknown stores: {', '.join(unknown)}"}), 400
+    
+    with store_report_lock:
+        if store_report_executor is None:
+            # Created lazily so no threads exist before gunicorn forks
+            store_report_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('STORE_REPORT_WORKERS', '8')), thread_name_prefix='store-report')
+    futures = {store_report_executor.submit(store_report, store_id, start, end, top, source == 'snapshot'): store_id
+               for store_id in store_ids}
+    done, _ = wait(futures, timeout=STORE_REPORT_TIMEOUT)
+    
+    reports = []
+    errors = {}
+    for future, store_id in futures.items():
+        if future not in done:
+            future.cancel()
+            errors[store_id] = "timed out"
+        elif future.exception():
+            logger.error(f"Store report failed for {store_id}: {future.exception()}")
+            errors[store_id] = "query failed"
+        else:
+            reports.append(future.result())
+    reports.sort(key=lambda r: r['store_id'])
+    
+    return jsonify({
+        "start": start.isoformat(),
+        "end": (end - timedelta(days=1)).isoformat() if end else None,
+        "stores": reports,
+        "total": merge_store_reports(reports, top),
+        "errors": errors
+    })
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -791,66 +2457,167 @@ def internal_error(error):
 def forbidden_error(error):
     return render_template('error.html', error_code=403, error_message="Access forbidden"), 403
 
-# Health check endpoint
+# Probes: /livez does no I/O, /readyz and /health read the background
+# checker's latest result instead of opening a connection per probe
+health_checker = health.HealthChecker.from_env(
+    lambda store_id: open_db_connection(store_id, connection_timeout=3),
+    store_registry.ids,
+    saturation=lambda: admission_control.stats()['db'],
+    primary_store=stores.DEFAULT_STORE)
+
+@app.route('/livez')
+def livez():
+    return jsonify({"status": "alive"})
+
+@app.route('/readyz')
+def readyz():
+    health_checker.start()
+    ready, report = health_checker.readiness()
+    return jsonify(report), 200 if ready else 503
+
+# Older health check path, kept for existing monitors
 @app.route('/health')
 def health_check():
-    try:
-        # Basic app health
-        response = {"status": "healthy", "app": "running"}
-        
-        # Test database connection
-        try:
-            with get_db_cursor() as (conn, cursor):
-                cursor.execute("SELECT 1")
-                cursor.fetchone()
-            response["database"] = "connected"
-        except Exception as db_error:
-            logger.warning(f"Database health check failed: {db_error}")
-            response["database"] = "disconnected"
-            response["db_error"] = str(db_error)
-            
-        return jsonify(response), 200
-        
-    except Exception as e:
-        return jsonify({"status": "unhealthy", "error": str(e)}), 500
+    health_checker.start()
+    ready, report = health_checker.readiness()
+    response = {
+        "status": "healthy" if ready else "unhealthy",
+        "app": "running",
+        "database": "connected" if ready else "disconnected",
+    }
+    return jsonify(response), 200 if ready else 503
 
 # Simple root endpoint for testing
 @app.route('/test')
 def test_endpoint():
     return jsonify({"message": "App is working!", "timestamp": datetime.now().isoformat()})
 
+# Admission control stats
+@app.route('/api/admission/stats')
+def get_admission_stats():
+    """DB slot usage, queue depth and shed counts"""
+    return jsonify(admission_control.stats())
+
+# Connection pool and prepared statement stats
+@app.route('/api/db/stats')
+def get_db_stats():
+    """Pooled connections and prepared statement cache hit counts"""
+    return jsonify(store_registry.stats())
+
+@app.route('/api/db/breakers')
+def get_db_breakers():
+    """Circuit breaker state per store"""
+    return jsonify({store_id: breaker.stats() for store_id, breaker in db_breakers.items()})
+
+@app.route('/api/coalescing/stats')
+def get_coalescing_stats():
+    """Read requests executed vs. collapsed into an identical in-flight one"""
+    return jsonify(request_flights.stats())
+
+# Live event stream
+@app.route('/api/events/stream')
+def stream_events():
+    """Server-sent events for order, stock, product and customer changes
+
+    Optional ?types=order_created,stock_changed limits the event types. A
+    reconnecting EventSource sends Last-Event-ID and receives what it missed.
+    """
+    types = [t for t in request.args.get('types', '').split(',') if t] or None
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = store_event_bus().subscribe(types, last_event_id)
+    if subscription is None:
+        response = jsonify({"error": "Too many open event streams"})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    def generate():
+        with subscription:
+            # Tell EventSource how long to wait before reconnecting
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if subscription.closed:
+                    break
+                yield events.format_sse(event) if event else ": keepalive\n\n"
+
+    response = Response(generate(), mimetype='text/event-stream')
+    # Frees the stream's slot even if the client goes away before the
+    # first chunk is sent
+    response.call_on_close(subscription.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/events/stats')
+def get_event_stats():
+    """Open event streams, published events and queue overflows"""
+    return jsonify(store_event_bus().stats())
+
+# Background job API endpoints
+@app.route('/api/jobs')
+def list_jobs():
+    """Recent background jobs, optionally filtered by type and status"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    job_list = job_runner.list(request.args.get('type'), request.args.get('status'), limit)
+    return jsonify({"jobs": job_list, "queues": job_runner.stats()})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Status, progress and result of one background job"""
+    job = job_runner.get(job_id)
+    if job:
+        return jsonify(job)
+    return jsonify({"error": "Job not found"}), 404
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job or ask a running job to stop"""
+    if job_runner.cancel(job_id):
+        return jsonify(job_runner.get(job_id)), 202
+    if job_runner.get(job_id):
+        return jsonify({"error": "Job is not active in this worker"}), 409
+    return jsonify({"error": "Job not found"}), 404
+
 # Database setup endpoint for manual initialization
+def run_setup_db_job(job):
+    """Create the schema and seed the sample data"""
+    conn = bulk_load.connect(store_registry.config(current_store_id()))
+    cursor = conn.cursor()
+    try:
+        job.update(0.1, "Creating tables")
+        bulk_load.create_schema(cursor)
+        conn.commit()
+        job.update(0.5, "Inserting sample data")
+        seeded = bulk_load.seed_sample_data(conn, cursor)
+        # Existing databases: order lines from before snapshots, and stock flags
+        job.update(0.7, "Backfilling order line snapshots")
+        filled = sum(order_snapshots.backfill(conn, cursor).values())
+        job.update(0.9, "Flagging low stock")
+        low_stock = stock_alerts.rebuild(conn, cursor)
+        return {"sample_data": "inserted" if seeded else "skipped (products table is not empty)",
+                "order_lines_backfilled": filled, "low_stock_products": low_stock}
+    finally:
+        cursor.close()
+        conn.close()
+
+job_runner.register('setup_db', store_job(run_setup_db_job), limit=1)
+
 @app.route('/setup-db')
 def setup_database():
-    """Manual database setup endpoint"""
+    """Manual database setup endpoint; runs as a background job"""
     try:
-        # Import the initialization function
-        import subprocess
-        import sys
-        
-        # Run the database initialization script
-        result = subprocess.run([sys.executable, 'init_render_db.py'], 
-                               capture_output=True, text=True, timeout=60)
-        
-        if result.returncode == 0:
-            return jsonify({
-                "status": "success",
-                "message": "Database initialized successfully",
-                "output": result.stdout
-            })
-        else:
-            return jsonify({
-                "status": "error",
-                "message": "Database initialization failed",
-                "error": result.stderr,
-                "output": result.stdout
-            }), 500
-            
+        job = job_runner.submit('setup_db', store_id=current_store_id())
+        return job_accepted(job)
     except Exception as e:
+        logger.error(f"Failed to start database setup: {e}")
         return jsonify({
             "status": "error",
-            "message": "Failed to run database setup",
-            "error": str(e)
+            "message": "Failed to start database setup"
         }), 500
 
 if __name__ == '__main__':
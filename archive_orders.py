@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Archive cold order history
+Closed months of orders and order_details older than the hot retention
+window are moved to orders_archive / order_details_archive in small
+batches, each in its own short transaction, so the hot tables stay small
+without long locks. order_archive_log keeps per-month counts so totals can
+still include archived orders without scanning the archive.
+
+MySQL range partitioning would need the foreign keys on orders and
+order_details dropped, so the archive is a separate table set instead.
+
+Run from cron (e.g. nightly): python archive_orders.py [--keep-months 24]
+"""
+
+import argparse
+import sys
+import time
+from datetime import date
+
+from mysql.connector import Error
+
+KEEP_MONTHS = 24
+BATCH_SIZE = 1000
+
+HOT_TABLES = ('orders', 'order_details')
+ARCHIVE_TABLES = ('orders_archive', 'order_details_archive')
+
+
+def add_months(month, count):
+    """First day of the month `count` months after `month`"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_boundary(cursor):
+    """First day after the newest month that has archived orders, or None
+
+    Functions in this module expect tuple (non-dictionary) cursors.
+    """
+    cursor.execute("SELECT MAX(month) FROM order_archive_log")
+    newest = cursor.fetchone()[0]
+    return add_months(newest, 1) if newest else None
+
+
+def order_sources(boundary, start=None):
+    """(orders, order_details) table pairs to read for data from `start` on
+
+    The archive is only included when the requested range reaches back
+    before the boundary (or no start was given but an archive exists).
+    """
+    sources = [HOT_TABLES]
+    if boundary and (start is None or start < boundary):
+        sources.append(ARCHIVE_TABLES)
+    return sources
+
+
+def closed_months(cursor, keep_months=KEEP_MONTHS, today=None):
+    """Month starts that still have hot orders older than the retention window"""
+    cutoff = add_months((today or date.today()).replace(day=1), -keep_months)
+    cursor.execute("""
+        SELECT DISTINCT DATE_FORMAT(datetime, '%Y-%m-01')
+        FROM orders
+        WHERE datetime < %s
+        ORDER BY 1
+    """, (cutoff,))
+    return [date.fromisoformat(row[0]) for row in cursor.fetchall()]
+
+
+def archive_batch(conn, cursor, month, order_ids):
+    """Move one batch of orders with their lines in a single short transaction"""
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    ids = tuple(order_ids)
+    if not conn.in_transaction:
+        conn.start_transaction()
+    try:
+        cursor.execute(f"""
+            INSERT INTO order_details_archive (order_id, product_id, quantity, total_price,
+                                               product_name, uom_name, unit_price, discount, promotion_id)
+            SELECT order_id, product_id, quantity, total_price, product_name, uom_name, unit_price,
+                   discount, promotion_id
+            FROM order_details WHERE order_id IN ({placeholders})
+        """, ids)
+        lines = cursor.rowcount
+        cursor.execute(f"""
+            INSERT INTO orders_archive (order_id, customer_id, total, datetime)
+            SELECT order_id, customer_id, total, datetime
+            FROM orders WHERE order_id IN ({placeholders})
+        """, ids)
+        cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(total), 0) FROM orders WHERE order_id IN ({placeholders})", ids)
+        count, revenue = cursor.fetchone()
+        cursor.execute(f"DELETE FROM order_details WHERE order_id IN ({placeholders})", ids)
+        cursor.execute(f"DELETE FROM orders WHERE order_id IN ({placeholders})", ids)
+        cursor.execute("""
+            INSERT INTO order_archive_log (month, orders, order_lines, revenue, archived_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                orders = orders + VALUES(orders),
+                order_lines = order_lines + VALUES(order_lines),
+                revenue = revenue + VALUES(revenue),
+                archived_at = VALUES(archived_at)
+        """, (month, count, lines, float(revenue)))
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    return count, lines
+
+
+def archive_month(conn, cursor, month, batch_size=BATCH_SIZE, pause=0.0, on_batch=None):
+    """Move every hot order of `month` to the archive; returns (orders, lines)"""
+    next_month = add_months(month, 1)
+    total_orders = total_lines = 0
+    while True:
+        cursor.execute("""
+            SELECT order_id FROM orders
+            WHERE datetime >= %s AND datetime < %s
+            ORDER BY order_id
+            LIMIT %s
+        """, (month, next_month, batch_size))
+        order_ids = [row[0] for row in cursor.fetchall()]
+        if conn.in_transaction:
+            conn.commit()
+        if not order_ids:
+            return total_orders, total_lines
+        orders, lines = archive_batch(conn, cursor, month, order_ids)
+        total_orders += orders
+        total_lines += lines
+        if on_batch:
+            on_batch(total_orders, total_lines)
+        if pause:
+            # Give OLTP traffic room between batches
+            time.sleep(pause)
+
+
+def run_archiver(conn, cursor, keep_months=KEEP_MONTHS, batch_size=BATCH_SIZE, pause=0.0, progress=None):
+    """Archive all closed months, oldest first; returns {month: (orders, lines)}"""
+    progress = progress or (lambda fraction, message: None)
+    months = closed_months(cursor, keep_months)
+    results = {}
+    for i, month in enumerate(months):
+        label = month.strftime('%Y-%m')
+        progress(i / len(months), f"Archiving {label}")
+        results[label] = archive_month(
+            conn, cursor, month, batch_size, pause,
+            on_batch=lambda orders, lines: progress(i / len(months), f"Archiving {label}: {orders:,} orders")
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move closed months of orders to the archive tables")
+    parser.add_argument('--keep-months', type=int, default=KEEP_MONTHS,
+                        help="Months (before the current one) kept in the hot tables")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.05,
+                        help="Seconds to sleep between batches")
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    conn = None
+    cursor = None
+    try:
+        conn = connect(load_db_config())
+        cursor = conn.cursor()
+        started = time.monotonic()
+        results = run_archiver(conn, cursor, args.keep_months, args.batch_size, args.pause,
+                               progress=lambda fraction, message: print(message))
+        for label, (orders, lines) in results.items():
+            print(f"✅ {label}: {orders:,} orders, {lines:,} lines")
+        print(f"Archived {len(results)} month(s) in {time.monotonic() - started:.1f}s")
+        return True
+    except Error as e:
+        print(f"❌ Archiving failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
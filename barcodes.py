@@ -0,0 +1,170 @@
+"""
+In-memory barcode index for the till
+Scans are answered from a dict of barcode -> product snapshot (name, price,
+UOM) instead of a query per scan. Writes made through this worker update
+the index at once; writes made by other workers are picked up by an
+incremental refresh on products.updated_at every few seconds, which also
+picks up scheduled price changes that took effect since the last one, and a
+periodic full reload drops products deleted elsewhere.
+"""
+
+import re
+import threading
+import time
+from datetime import datetime
+
+from pricing import CURRENT_PRICE, CURRENT_PRICE_JOIN
+
+BARCODE_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,32}$')
+REFRESH_SECONDS = 5.0
+FULL_RELOAD_SECONDS = 300.0
+MAX_BATCH = 500
+
+_SNAPSHOT_SELECT = f"""
+    SELECT p.product_id, p.barcode, p.name, {CURRENT_PRICE} AS price_per_unit, p.uom_id,
+           u.uom_name, p.updated_at
+    FROM products p
+    JOIN uom u ON p.uom_id = u.uom_id
+    {CURRENT_PRICE_JOIN}
+"""
+SNAPSHOT_QUERY = _SNAPSHOT_SELECT + "WHERE p.barcode IS NOT NULL"
+# Includes products whose barcode was cleared, so their entry is dropped;
+# >= keeps rows written later in the same second as the high-water mark.
+# Scheduled prices are found by the window in which they took effect.
+CHANGED_QUERY = _SNAPSHOT_SELECT + """
+    WHERE p.updated_at >= %s
+    OR p.product_id IN (
+        SELECT h.product_id FROM price_history h
+        WHERE h.effective_from > %s AND h.effective_from <= %s
+    )
+"""
+PRODUCT_QUERY = _SNAPSHOT_SELECT + "WHERE p.product_id = %s"
+
+
+def normalize_barcode(value):
+    """Barcode as stored, None for empty input; raises ValueError if invalid"""
+    if value is None:
+        return None
+    code = str(value).strip()
+    if not code:
+        return None
+    if not BARCODE_PATTERN.match(code):
+        raise ValueError("Barcode may only contain letters, digits, '.', '_' and '-' (max 32)")
+    return code
+
+
+class BarcodeIndex:
+    """barcode -> product snapshot for one store's database
+
+    Lookups are single dict reads without locking; writers change entries
+    under a lock and snapshots are never mutated after they are stored.
+    """
+
+    def __init__(self, refresh_seconds=REFRESH_SECONDS, full_reload_seconds=FULL_RELOAD_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self._by_barcode = {}
+        self._barcode_of = {}
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._refreshed_at = 0.0
+        self._high_water = None
+        self._prices_checked_at = None
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def needs_refresh(self):
+        return not self.loaded or time.monotonic() - self._refreshed_at >= self.refresh_seconds
+
+    def refresh(self, cursor):
+        """Full reload when due, else fetch products changed since the last refresh
+
+        `cursor` must be a dictionary cursor. Only one thread refreshes at a
+        time; the others keep answering from the current map.
+        """
+        if not self._lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            now = time.monotonic()
+            if self.loaded and now - self._refreshed_at < self.refresh_seconds:
+                return
+            if not self.loaded or now - self._loaded_at >= self.full_reload_seconds:
+                # Marks are read first so nothing written during the reload is skipped
+                cursor.execute("SELECT MAX(updated_at) AS high_water, NOW() AS db_now FROM products")
+                marks = cursor.fetchone()
+                cursor.execute(SNAPSHOT_QUERY)
+                rows = cursor.fetchall()
+                self._by_barcode = {row['barcode']: _snapshot(row) for row in rows}
+                self._barcode_of = {row['product_id']: row['barcode'] for row in rows}
+                self._high_water = marks['high_water'] or datetime(1970, 1, 1)
+                self._prices_checked_at = marks['db_now']
+                self._loaded_at = now
+            else:
+                cursor.execute("SELECT NOW() AS db_now")
+                db_now = cursor.fetchone()['db_now']
+                cursor.execute(CHANGED_QUERY, (self._high_water, self._prices_checked_at, db_now))
+                rows = cursor.fetchall()
+                self._prices_checked_at = db_now
+                for row in rows:
+                    self._put(row)
+                    if row['updated_at'] and row['updated_at'] > self._high_water:
+                        self._high_water = row['updated_at']
+            self._refreshed_at = now
+        finally:
+            self._lock.release()
+
+    def lookup(self, barcode):
+        return self._by_barcode.get(barcode)
+
+    def lookup_many(self, barcodes):
+        """({barcode: snapshot}, [missing barcodes]) for a whole basket"""
+        by_barcode = self._by_barcode
+        found = {}
+        missing = []
+        for code in barcodes:
+            snapshot = by_barcode.get(code)
+            if snapshot is None:
+                missing.append(code)
+            else:
+                found[code] = snapshot
+        return found, missing
+
+    def update(self, row):
+        """Apply a product row written by this worker (barcode may be None)"""
+        with self._lock:
+            self._put(row)
+
+    def remove(self, product_id):
+        with self._lock:
+            barcode = self._barcode_of.pop(product_id, None)
+            if barcode is not None:
+                self._by_barcode.pop(barcode, None)
+
+    def _put(self, row):
+        """Replace a product's entry (lock held)"""
+        old = self._barcode_of.pop(row['product_id'], None)
+        if old is not None and old != row['barcode']:
+            self._by_barcode.pop(old, None)
+        if row['barcode'] is not None:
+            self._by_barcode[row['barcode']] = _snapshot(row)
+            self._barcode_of[row['product_id']] = row['barcode']
+
+    def stats(self):
+        return {
+            'barcodes': len(self._by_barcode),
+            'loaded': self.loaded,
+            'seconds_since_refresh': round(time.monotonic() - self._refreshed_at, 1) if self.loaded else None,
+        }
+
+
+def _snapshot(row):
+    return {
+        'product_id': row['product_id'],
+        'barcode': row['barcode'],
+        'name': row['name'],
+        'price_per_unit': float(row['price_per_unit']),
+        'uom_id': row['uom_id'],
+        'uom_name': row['uom_name'],
+    }
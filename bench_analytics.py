@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NumPy sales aggregation in analytics.py against the same
+GROUP BYs written as plain Python loops over the fetched rows
+Runs on synthetic order lines, no database needed
+
+Usage: python bench_analytics.py [--lines 1000000] [--granularity week]
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import analytics
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def make_rows(lines, products, days, start):
+    """Synthetic rows shaped like analytics.SALES_LINES_QUERY results"""
+    rng = random.Random(42)
+    base = start.toordinal() - EPOCH_ORDINAL
+    rows = []
+    for _ in range(lines):
+        product_id = rng.randint(1, products)
+        quantity = rng.randint(1, 5)
+        rows.append((
+            base + rng.randrange(days),
+            product_id,
+            product_id % 5 + 1,
+            float(quantity),
+            quantity * 10.0 + product_id % 100,
+        ))
+    return rows
+
+
+def python_bucket(epoch_day, granularity):
+    day = date.fromordinal(epoch_day + EPOCH_ORDINAL)
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def aggregate_python(rows, granularity):
+    """Reference implementation: dictionaries filled row by row"""
+    total = defaultdict(lambda: [0.0, 0.0])
+    by_product = defaultdict(lambda: [0.0, 0.0])
+    by_uom = defaultdict(lambda: [0.0, 0.0])
+    for epoch_day, product_id, uom_id, quantity, revenue in rows:
+        period = python_bucket(epoch_day, granularity)
+        for bucket in (total[period], by_product[(product_id, period)], by_uom[(uom_id, period)]):
+            bucket[0] += revenue
+            bucket[1] += quantity
+    return total, by_product, by_uom
+
+
+def aggregate_numpy(rows, start, end, granularity, chunk_size=analytics.CHUNK_SIZE):
+    """The analytics.py path, fed the same rows in fetchmany()-sized chunks"""
+    accumulator = analytics.SalesAccumulator(start, end, granularity)
+    for offset in range(0, len(rows), chunk_size):
+        accumulator.add_chunk(*analytics.rows_to_arrays(rows[offset:offset + chunk_size]))
+    return accumulator.result(top=20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, default=1000000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--granularity', choices=analytics.GRANULARITIES, default='week')
+    args = parser.parse_args()
+
+    start = date(2023, 1, 1)
+    end = start + timedelta(days=args.days)
+
+    print(f"Generating {args.lines:,} order lines over {args.days} days...")
+    rows = make_rows(args.lines, args.products, args.days, start)
+
+    began = time.perf_counter()
+    total, _, _ = aggregate_python(rows, args.granularity)
+    python_seconds = time.perf_counter() - began
+
+    began = time.perf_counter()
+    result = aggregate_numpy(rows, start, end, args.granularity)
+    numpy_seconds = time.perf_counter() - began
+
+    # Both paths must agree before the timings mean anything
+    expected = sum(v[0] for v in total.values())
+    actual = sum(result['total']['revenue'])
+    if abs(expected - actual) > 0.01 * len(result['periods']):
+        print(f"❌ Results differ: python={expected:.2f} numpy={actual:.2f}")
+        return False
+
+    print(f"Python loops: {python_seconds:.2f}s ({args.lines / python_seconds:,.0f} lines/sec)")
+    print(f"NumPy:        {numpy_seconds:.2f}s ({args.lines / numpy_seconds:,.0f} lines/sec)")
+    print(f"✅ Speedup: {python_seconds / numpy_seconds:.1f}x")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark parse overhead of the hot read queries
+Each named statement in statements.py is run repeatedly two ways on one
+connection: as plain text (a fresh cursor and a full parse per call, like
+the routes used to do) and through a StatementCache (prepared once, then
+only executed). The server's Com_stmt_prepare counter confirms each
+statement was prepared a single time.
+
+Usage: python bench_statements.py [--iterations 2000]
+"""
+
+import argparse
+import sys
+import time
+
+from mysql.connector import Error
+
+import statements
+
+# Parameters for the statements that take them
+HOT_READS = {
+    'products.list': (),
+    'products.get': (1,),
+    'products.popular': (),
+    'products.low_stock': (10,),
+    'uom.list': (),
+    'customers.get': (1,),
+}
+
+
+def session_counter(cursor, name):
+    cursor.execute("SHOW SESSION STATUS LIKE %s", (name,))
+    row = cursor.fetchone()
+    return int(row[1]) if row else 0
+
+
+def time_text(conn, sql, params, iterations):
+    """Seconds per call with a new text-protocol cursor each time"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        cursor.close()
+    return (time.perf_counter() - started) / iterations
+
+
+def time_prepared(cache, name, params, iterations):
+    """Seconds per call through the prepared statement cache"""
+    cache.fetchall(name, params)  # prepare outside the timed loop
+    started = time.perf_counter()
+    for _ in range(iterations):
+        cache.fetchall(name, params)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text vs prepared execution of the hot reads")
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    conn = None
+    cache = None
+    try:
+        conn = connect(load_db_config(), autocommit=True)
+        cache = statements.StatementCache(conn)
+        status = conn.cursor()
+        prepares_before = session_counter(status, 'Com_stmt_prepare')
+
+        print(f"{'statement':<22}{'text µs':>10}{'prepared µs':>14}{'speedup':>10}")
+        for name, params in HOT_READS.items():
+            sql = statements.STATEMENTS[name]
+            text = time_text(conn, sql, params, args.iterations)
+            prepared = time_prepared(cache, name, params, args.iterations)
+            print(f"{name:<22}{text * 1e6:>10.1f}{prepared * 1e6:>14.1f}{text / prepared:>9.2f}x")
+
+        prepares = session_counter(status, 'Com_stmt_prepare') - prepares_before
+        status.close()
+        if prepares != len(HOT_READS):
+            print(f"❌ Expected {len(HOT_READS)} prepares, server counted {prepares}")
+            return False
+        print(f"✅ {len(HOT_READS)} statements prepared once each for "
+              f"{len(HOT_READS) * (args.iterations + 1):,} executions")
+        return True
+    except Error as e:
+        print(f"❌ Benchmark failed: {e}")
+        return False
+    finally:
+        if cache:
+            cache.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
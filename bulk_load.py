@@ -0,0 +1,757 @@
+#!/usr/bin/env python3
+"""
+High-throughput bulk loader for the grocery store database
+Creates the canonical schema (the one app.py queries) and bulk-loads CSV or
+NDJSON files for uom, products, customers, orders and order_details.
+
+CSV files are streamed to the server with LOAD DATA LOCAL INFILE when
+--local-infile is given; everything else goes through large multi-row INSERTs.
+Keys and constraint checks are switched off around each table load and tables
+that don't depend on each other are loaded in parallel.
+
+Examples:
+    python bulk_load.py --schema-only
+    python bulk_load.py --seed
+    python bulk_load.py --products products.csv --customers customers.csv \\
+        --orders orders.ndjson --order-details order_details.ndjson
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+from mysql.connector import Error
+
+from promotions import mark_categories_changed
+
+
+def load_db_config():
+    """Pick the database configuration the same way app.py does"""
+    config_module = os.getenv('CONFIG_MODULE', 'config')
+    if config_module == 'config_docker':
+        from config_docker import db_config
+    elif config_module == 'config_render':
+        from config_render import db_config
+    else:
+        from config import db_config
+    return db_config
+
+
+# Canonical schema - mirrors db.sql and the columns app.py reads and writes
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS uom (
+        uom_id INT AUTO_INCREMENT PRIMARY KEY,
+        uom_name VARCHAR(45) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        product_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(45) NOT NULL,
+        uom_id INT NOT NULL,
+        price_per_unit DOUBLE NOT NULL,
+        stock_quantity DOUBLE DEFAULT 100,
+        barcode VARCHAR(32) NULL,
+        category VARCHAR(45) NULL,
+        reorder_threshold INT NULL,
+        low_stock_since DATETIME NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE INDEX uq_products_barcode (barcode),
+        INDEX idx_products_updated_at (updated_at),
+        INDEX idx_products_category (category),
+        INDEX idx_products_low_stock (low_stock_since),
+        FOREIGN KEY (uom_id) REFERENCES uom(uom_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customers (
+        customer_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        phone VARCHAR(15),
+        email VARCHAR(100),
+        address TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        order_id INT AUTO_INCREMENT PRIMARY KEY,
+        customer_id INT NOT NULL,
+        total DOUBLE NOT NULL,
+        datetime DATETIME DEFAULT CURRENT_TIMESTAMP,
+        client_order_uuid CHAR(36) NULL,
+        INDEX idx_orders_datetime (datetime),
+        UNIQUE INDEX uq_orders_client_order_uuid (client_order_uuid),
+        FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS order_details (
+        order_id INT NOT NULL,
+        product_id INT NOT NULL,
+        quantity DOUBLE NOT NULL,
+        total_price DOUBLE NOT NULL,
+        product_name VARCHAR(45) NULL,
+        uom_name VARCHAR(45) NULL,
+        unit_price DOUBLE NULL,
+        discount DOUBLE NOT NULL DEFAULT 0,
+        promotion_id INT NULL,
+        PRIMARY KEY (order_id, product_id),
+        FOREIGN KEY (order_id) REFERENCES orders(order_id),
+        FOREIGN KEY (product_id) REFERENCES products(product_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_forecasts (
+        product_id INT PRIMARY KEY,
+        avg_daily_demand DOUBLE NOT NULL DEFAULT 0,
+        forecast_daily_demand DOUBLE NOT NULL DEFAULT 0,
+        demand_stddev DOUBLE NOT NULL DEFAULT 0,
+        reorder_point DOUBLE NOT NULL DEFAULT 0,
+        days_of_cover DOUBLE,
+        computed_at DATE NOT NULL,
+        FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id CHAR(32) PRIMARY KEY,
+        job_type VARCHAR(45) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        progress DOUBLE NOT NULL DEFAULT 0,
+        message VARCHAR(255),
+        params TEXT,
+        result MEDIUMTEXT,
+        error TEXT,
+        created_at DATETIME NOT NULL,
+        started_at DATETIME,
+        finished_at DATETIME,
+        INDEX idx_jobs_created (created_at),
+        INDEX idx_jobs_type_status (job_type, status)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders_archive (
+        order_id INT PRIMARY KEY,
+        customer_id INT NOT NULL,
+        total DOUBLE NOT NULL,
+        datetime DATETIME,
+        INDEX idx_orders_archive_datetime (datetime),
+        INDEX idx_orders_archive_customer (customer_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS order_details_archive (
+        order_id INT NOT NULL,
+        product_id INT NOT NULL,
+        quantity DOUBLE NOT NULL,
+        total_price DOUBLE NOT NULL,
+        product_name VARCHAR(45) NULL,
+        uom_name VARCHAR(45) NULL,
+        unit_price DOUBLE NULL,
+        discount DOUBLE NOT NULL DEFAULT 0,
+        promotion_id INT NULL,
+        PRIMARY KEY (order_id, product_id),
+        INDEX idx_order_details_archive_product (product_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS order_archive_log (
+        month DATE PRIMARY KEY,
+        orders INT NOT NULL DEFAULT 0,
+        order_lines INT NOT NULL DEFAULT 0,
+        revenue DOUBLE NOT NULL DEFAULT 0,
+        archived_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS change_markers (
+        name VARCHAR(45) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS price_history (
+        history_id INT AUTO_INCREMENT PRIMARY KEY,
+        product_id INT NOT NULL,
+        price_per_unit DOUBLE NOT NULL,
+        effective_from DATETIME NOT NULL,
+        effective_to DATETIME NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE INDEX uq_price_history_product_from (product_id, effective_from),
+        INDEX idx_price_history_from (effective_from),
+        FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS promotions (
+        promotion_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        product_id INT NULL,
+        category VARCHAR(45) NULL,
+        min_quantity DOUBLE NOT NULL DEFAULT 0,
+        percent_off DOUBLE NULL,
+        unit_price DOUBLE NULL,
+        buy_quantity INT NULL,
+        pay_quantity INT NULL,
+        starts_at DATETIME NULL,
+        ends_at DATETIME NULL,
+        active BOOLEAN NOT NULL DEFAULT TRUE,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_promotions_updated_at (updated_at),
+        FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customer_merge_candidates (
+        candidate_id INT AUTO_INCREMENT PRIMARY KEY,
+        keep_id INT NOT NULL,
+        merge_id INT NOT NULL,
+        score DOUBLE NOT NULL,
+        reasons VARCHAR(255),
+        status VARCHAR(20) NOT NULL DEFAULT 'proposed',
+        created_at DATETIME NOT NULL,
+        reviewed_at DATETIME NULL,
+        UNIQUE INDEX uq_merge_candidates_pair (keep_id, merge_id),
+        INDEX idx_merge_candidates_status (status, score)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS request_profiles (
+        profile_id INT AUTO_INCREMENT PRIMARY KEY,
+        route VARCHAR(100) NOT NULL,
+        method VARCHAR(10) NOT NULL,
+        path VARCHAR(255) NOT NULL,
+        status INT,
+        mode VARCHAR(20) NOT NULL,
+        triggered_by VARCHAR(20),
+        duration_ms DOUBLE NOT NULL,
+        sql_count INT NOT NULL DEFAULT 0,
+        sql_ms DOUBLE NOT NULL DEFAULT 0,
+        top_functions TEXT,
+        sql_statements MEDIUMTEXT,
+        collapsed MEDIUMTEXT,
+        pstats MEDIUMBLOB,
+        created_at DATETIME NOT NULL,
+        INDEX idx_request_profiles_route (route, profile_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reconciliation_runs (
+        run_id INT AUTO_INCREMENT PRIMARY KEY,
+        status VARCHAR(20) NOT NULL,
+        first_order_id INT NOT NULL,
+        last_order_id INT NOT NULL,
+        chunk_size INT NOT NULL,
+        tolerance DOUBLE NOT NULL,
+        started_at DATETIME NOT NULL,
+        finished_at DATETIME NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reconciliation_chunks (
+        run_id INT NOT NULL,
+        chunk_start INT NOT NULL,
+        orders INT NOT NULL,
+        discrepancies INT NOT NULL,
+        checked_at DATETIME NOT NULL,
+        PRIMARY KEY (run_id, chunk_start),
+        FOREIGN KEY (run_id) REFERENCES reconciliation_runs(run_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS order_discrepancies (
+        run_id INT NOT NULL,
+        order_id INT NOT NULL,
+        recorded_total DOUBLE NOT NULL,
+        lines_total DOUBLE NOT NULL,
+        priced_total DOUBLE NOT NULL,
+        line_count INT NOT NULL,
+        total_mismatch BOOLEAN NOT NULL,
+        price_mismatch BOOLEAN NOT NULL,
+        fixed_at DATETIME NULL,
+        PRIMARY KEY (run_id, order_id),
+        INDEX idx_order_discrepancies_order (order_id),
+        FOREIGN KEY (run_id) REFERENCES reconciliation_runs(run_id) ON DELETE CASCADE
+    )
+    """,
+]
+
+# Columns and indexes added after the first release: (table, column, definition)
+# and (table, index, columns, unique)
+SCHEMA_COLUMNS = [
+    ('products', 'stock_quantity', 'DOUBLE DEFAULT 100'),
+    ('products', 'barcode', 'VARCHAR(32) NULL'),
+    ('products', 'updated_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+    ('orders', 'client_order_uuid', 'CHAR(36) NULL'),
+    ('order_details', 'product_name', 'VARCHAR(45) NULL'),
+    ('order_details', 'uom_name', 'VARCHAR(45) NULL'),
+    ('order_details', 'unit_price', 'DOUBLE NULL'),
+    ('order_details_archive', 'product_name', 'VARCHAR(45) NULL'),
+    ('order_details_archive', 'uom_name', 'VARCHAR(45) NULL'),
+    ('order_details_archive', 'unit_price', 'DOUBLE NULL'),
+    ('products', 'category', 'VARCHAR(45) NULL'),
+    ('order_details', 'discount', 'DOUBLE NOT NULL DEFAULT 0'),
+    ('order_details', 'promotion_id', 'INT NULL'),
+    ('order_details_archive', 'discount', 'DOUBLE NOT NULL DEFAULT 0'),
+    ('order_details_archive', 'promotion_id', 'INT NULL'),
+    ('products', 'reorder_threshold', 'INT NULL'),
+    ('products', 'low_stock_since', 'DATETIME NULL'),
+]
+# Columns whose type changed after the first release: (table, column, data type, definition)
+SCHEMA_TYPES = [
+    # Sales of weighed products (kg, ltr) take fractional quantities off stock
+    ('products', 'stock_quantity', 'double', 'DOUBLE DEFAULT 100'),
+]
+SCHEMA_INDEXES = [
+    ('orders', 'idx_orders_datetime', 'datetime', False),
+    ('orders', 'uq_orders_client_order_uuid', 'client_order_uuid', True),
+    ('products', 'uq_products_barcode', 'barcode', True),
+    ('products', 'idx_products_updated_at', 'updated_at', False),
+    ('products', 'idx_products_category', 'category', False),
+    ('products', 'idx_products_low_stock', 'low_stock_since', False),
+]
+
+# Loadable columns per table
+TABLE_COLUMNS = {
+    'uom': ['uom_id', 'uom_name'],
+    'products': ['product_id', 'name', 'uom_id', 'price_per_unit', 'stock_quantity', 'barcode', 'category',
+                 'reorder_threshold'],
+    'customers': ['customer_id', 'name', 'phone', 'email', 'address'],
+    'orders': ['order_id', 'customer_id', 'total', 'datetime'],
+    'order_details': ['order_id', 'product_id', 'quantity', 'total_price',
+                      'product_name', 'uom_name', 'unit_price', 'discount', 'promotion_id'],
+}
+
+# Tables in the same stage don't reference each other and load concurrently
+LOAD_STAGES = [
+    ['uom', 'products', 'customers'],
+    ['orders'],
+    ['order_details'],
+]
+
+DEFAULT_BATCH_SIZE = 5000
+PROGRESS_EVERY = 100000
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    """Thread-safe print for progress output from parallel loaders"""
+    with _print_lock:
+        print(message, flush=True)
+
+
+def connect(db_config, **extra):
+    """Open a dedicated connection for one loader"""
+    config = db_config.copy()
+    config.update({
+        'autocommit': False,
+        'use_unicode': True,
+        'charset': 'utf8mb4',
+    })
+    config.update(extra)
+    return mysql.connector.connect(**config)
+
+
+def create_schema(cursor):
+    """Create all tables of the canonical schema if they don't exist"""
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    # Databases created by older versions of the app may lack newer columns
+    for table, column, definition in SCHEMA_COLUMNS:
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = %s
+            AND COLUMN_NAME = %s
+        """, (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+    for table, column, data_type, definition in SCHEMA_TYPES:
+        cursor.execute("""
+            SELECT DATA_TYPE
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = %s
+            AND COLUMN_NAME = %s
+        """, (table, column))
+        row = cursor.fetchone()
+        if row and row[0].lower() != data_type:
+            cursor.execute(f"ALTER TABLE `{table}` MODIFY COLUMN `{column}` {definition}")
+    for table, index, columns, unique in SCHEMA_INDEXES:
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = %s
+            AND INDEX_NAME = %s
+        """, (table, index))
+        if cursor.fetchone()[0] == 0:
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            cursor.execute(f"CREATE {kind} `{index}` ON `{table}` ({columns})")
+
+
+def split_sql(text):
+    """Split a SQL script into statements, ignoring ';' inside quotes and comments"""
+    statements = []
+    current = []
+    quote = None
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            current.append(char)
+            if char == '\\' and i + 1 < len(text):
+                current.append(text[i + 1])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+            current.append(char)
+        elif text.startswith('--', i):
+            newline = text.find('\n', i)
+            i = len(text) if newline == -1 else newline
+            continue
+        elif char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def seed_sample_data(conn, cursor, sql_path=None):
+    """Insert the sample data from db.sql in a single transaction
+
+    Returns False without touching anything when products already has rows.
+    """
+    cursor.execute("SELECT COUNT(*) FROM products")
+    if cursor.fetchone()[0] > 0:
+        return False
+
+    sql_path = sql_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db.sql')
+    with open(sql_path, 'r', encoding='utf-8') as file:
+        statements = split_sql(file.read())
+
+    # The connection runs with autocommit off, so this is one transaction
+    inserts = [s for s in statements if s.upper().startswith('INSERT')]
+    try:
+        for statement in inserts:
+            cursor.execute(statement)
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    return True
+
+
+def detect_format(path, fmt=None):
+    """Return 'csv' or 'ndjson' from an explicit format or the file extension"""
+    if fmt:
+        return fmt
+    lowered = path.lower()
+    if lowered.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_header(path, fmt):
+    """Return the column names present in a data file"""
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            return next(csv.reader(file), [])
+        for line in file:
+            if line.strip():
+                return list(json.loads(line).keys())
+    return []
+
+
+def iter_rows(path, fmt, columns):
+    """Yield one tuple per record, in `columns` order, with blanks as NULL"""
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield tuple(record[c] if record[c] != '' else None for c in columns)
+        else:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield tuple(record.get(c) for c in columns)
+
+
+def iter_records(path, fmt, columns, required=()):
+    """Yield one tuple of strings per record ('' for blanks), or None if unreadable
+
+    Unlike iter_rows, malformed NDJSON lines don't stop the file, so callers
+    can report them per record. CSV headers must include `required`.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            reader = csv.DictReader(file)
+            missing = [column for column in required if column not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"CSV header is missing column(s): {', '.join(missing)}")
+            for record in reader:
+                yield tuple(record.get(column) or '' for column in columns)
+        else:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    yield None
+                    continue
+                if not isinstance(record, dict):
+                    yield None
+                    continue
+                yield tuple('' if record.get(column) is None else str(record[column]) for column in columns)
+
+
+def batched(rows, size):
+    """Group an iterator of rows into lists of at most `size` rows"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _begin_bulk(cursor, table):
+    """Relax per-row checks on this session while a table is loading"""
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    cursor.execute("SET SESSION unique_checks = 0")
+    # Only has an effect on MyISAM; InnoDB answers with a harmless warning
+    cursor.execute(f"ALTER TABLE `{table}` DISABLE KEYS")
+
+
+def _end_bulk(cursor, table):
+    """Restore the checks relaxed by _begin_bulk"""
+    cursor.execute(f"ALTER TABLE `{table}` ENABLE KEYS")
+    cursor.execute("SET SESSION unique_checks = 1")
+    cursor.execute("SET SESSION foreign_key_checks = 1")
+
+
+def _load_infile(cursor, table, path, columns):
+    """Stream a CSV file to the server with LOAD DATA LOCAL INFILE"""
+    variables = [f"@c{i}" for i in range(len(columns))]
+    assignments = ', '.join(f"`{c}` = NULLIF({v}, '')" for c, v in zip(columns, variables))
+    cursor.execute(f"""
+        LOAD DATA LOCAL INFILE %s
+        INTO TABLE `{table}`
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        IGNORE 1 LINES
+        ({', '.join(variables)})
+        SET {assignments}
+    """, (os.path.abspath(path),))
+    return cursor.rowcount
+
+
+def _load_batches(conn, cursor, table, path, fmt, columns, batch_size):
+    """Insert rows with multi-row INSERTs, committing once per batch"""
+    column_list = ', '.join(f"`{c}`" for c in columns)
+    placeholders = ', '.join(['%s'] * len(columns))
+    # executemany() rewrites this into a single multi-row INSERT per batch
+    statement = f"INSERT INTO `{table}` ({column_list}) VALUES ({placeholders})"
+
+    loaded = 0
+    next_report = PROGRESS_EVERY
+    started = time.monotonic()
+    for batch in batched(iter_rows(path, fmt, columns), batch_size):
+        cursor.executemany(statement, batch)
+        conn.commit()
+        loaded += len(batch)
+        if loaded >= next_report:
+            elapsed = time.monotonic() - started
+            log(f"   {table}: {loaded:,} rows ({loaded / elapsed:,.0f} rows/sec)")
+            next_report += PROGRESS_EVERY
+    return loaded
+
+
+def load_table(db_config, table, path, fmt=None, batch_size=DEFAULT_BATCH_SIZE, local_infile=False):
+    """Load one data file into one table on its own connection
+
+    Returns (row_count, elapsed_seconds).
+    """
+    fmt = detect_format(path, fmt)
+    header = read_header(path, fmt)
+    unknown = [c for c in header if c not in TABLE_COLUMNS[table]]
+    if unknown:
+        raise ValueError(f"{path}: unknown column(s) for {table}: {', '.join(unknown)}")
+    if not header:
+        return 0, 0.0
+
+    use_infile = local_infile and fmt == 'csv'
+    extra = {'allow_local_infile': True} if use_infile else {}
+    conn = connect(db_config, **extra)
+    cursor = conn.cursor()
+    started = time.monotonic()
+    try:
+        _begin_bulk(cursor, table)
+        try:
+            if use_infile:
+                loaded = _load_infile(cursor, table, path, header)
+                conn.commit()
+            else:
+                loaded = _load_batches(conn, cursor, table, path, fmt, header, batch_size)
+        finally:
+            _end_bulk(cursor, table)
+        if table == 'products' and 'category' in header:
+            # Running workers rebuild their promotion indexes for the new categories
+            mark_categories_changed(cursor)
+            conn.commit()
+        return loaded, time.monotonic() - started
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_load(db_config, sources, batch_size=DEFAULT_BATCH_SIZE, local_infile=False, workers=3):
+    """Load every table in `sources` ({table: (path, fmt)}) stage by stage
+
+    Returns {table: (row_count, elapsed_seconds)}.
+    """
+    results = {}
+    for stage in LOAD_STAGES:
+        tables = [t for t in stage if t in sources]
+        if not tables:
+            continue
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tables)))) as pool:
+            futures = {}
+            for table in tables:
+                path, fmt = sources[table]
+                log(f"Loading {table} from {path}...")
+                futures[table] = pool.submit(load_table, db_config, table, path, fmt,
+                                             batch_size, local_infile)
+            for table, future in futures.items():
+                loaded, elapsed = future.result()
+                rate = loaded / elapsed if elapsed else 0
+                log(f"✅ {table}: {loaded:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec)")
+                results[table] = (loaded, elapsed)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create the schema and bulk-load grocery store data")
+    parser.add_argument('--uom', help="CSV/NDJSON file for the uom table")
+    parser.add_argument('--products', help="CSV/NDJSON file for the products table")
+    parser.add_argument('--customers', help="CSV/NDJSON file for the customers table")
+    parser.add_argument('--orders', help="CSV/NDJSON file for the orders table")
+    parser.add_argument('--order-details', dest='order_details',
+                        help="CSV/NDJSON file for the order_details table")
+    parser.add_argument('--format', choices=['csv', 'ndjson'],
+                        help="Input format (default: from file extension)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Rows per multi-row INSERT (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=3,
+                        help="Tables loaded concurrently (default: %(default)s)")
+    parser.add_argument('--local-infile', action='store_true',
+                        help="Use LOAD DATA LOCAL INFILE for CSV files")
+    parser.add_argument('--schema-only', action='store_true',
+                        help="Only create the schema")
+    parser.add_argument('--seed', action='store_true',
+                        help="Insert the db.sql sample data if the database is empty")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db_config = load_db_config()
+
+    print("=== Bulk Loader ===")
+    print(f"Host: {db_config.get('host')}")
+    print(f"Database: {db_config.get('database')}")
+    print()
+
+    try:
+        conn = connect(db_config)
+        cursor = conn.cursor()
+        try:
+            create_schema(cursor)
+            conn.commit()
+            print("✅ Schema ready")
+            if args.seed:
+                if seed_sample_data(conn, cursor):
+                    print("✅ Sample data inserted")
+                else:
+                    print("Skipping sample data (products table is not empty)")
+        finally:
+            cursor.close()
+            conn.close()
+
+        if args.schema_only:
+            return True
+
+        sources = {}
+        for table in TABLE_COLUMNS:
+            path = getattr(args, table)
+            if path:
+                sources[table] = (path, args.format)
+        if not sources:
+            return True
+
+        started = time.monotonic()
+        results = run_load(db_config, sources, args.batch_size, args.local_infile, args.workers)
+        elapsed = time.monotonic() - started
+        total = sum(loaded for loaded, _ in results.values())
+        rate = total / elapsed if elapsed else 0
+        print(f"\n🎉 Loaded {total:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec)")
+
+        if 'order_details' in results:
+            # Files without product snapshot columns leave them NULL
+            from order_snapshots import backfill_table
+            conn = connect(db_config)
+            cursor = conn.cursor()
+            try:
+                filled = backfill_table(conn, cursor, 'order_details', args.batch_size)
+            finally:
+                cursor.close()
+                conn.close()
+            print(f"✅ Product snapshots filled on {filled:,} order lines")
+        if 'products' in results:
+            # Loaded stock levels bypass the incremental low-stock flags
+            from stock_alerts import rebuild
+            conn = connect(db_config)
+            cursor = conn.cursor()
+            try:
+                low = rebuild(conn, cursor)
+            finally:
+                cursor.close()
+                conn.close()
+            print(f"✅ {low:,} products flagged low on stock")
+        return True
+
+    except (Error, OSError, ValueError) as e:
+        print(f"❌ Load failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,77 @@
+"""
+Small in-process caches shared by the API endpoints
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=128, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class PartitionedCache:
+    """One TTLCache per partition (e.g. per store), created on first use
+
+    Partitions never evict each other's entries, and one can be cleared
+    without touching the rest.
+    """
+
+    def __init__(self, maxsize=128, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    def partition(self, name):
+        with self._lock:
+            cache = self._partitions.get(name)
+            if cache is None:
+                cache = self._partitions[name] = TTLCache(self.maxsize, self.ttl)
+            return cache
+
+    def clear(self):
+        with self._lock:
+            partitions = list(self._partitions.values())
+        for cache in partitions:
+            cache.clear()
+
+    def __len__(self):
+        with self._lock:
+            partitions = list(self._partitions.values())
+        return sum(len(cache) for cache in partitions)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Sync the product catalog from a supplier price list
+The whole list (CSV or NDJSON) is diffed in memory against the current
+products. Lines are matched on product_id, then barcode, then name
+(case-insensitive). Only new and changed products are written, with
+INSERT ... ON DUPLICATE KEY UPDATE in large batches inside one transaction,
+so a sync either applies completely or not at all. Price changes are also
+recorded in price_history.
+
+Columns: name and price_per_unit, a unit as uom_id or uom_name, and
+optionally product_id and barcode. A blank barcode keeps the product's
+current one. Products missing from the list are counted but never deleted.
+
+Usage: python catalog_sync.py price_list.csv [--dry-run]
+"""
+
+import argparse
+import sys
+import time
+
+from mysql.connector import Error
+
+import pricing
+from barcodes import normalize_barcode
+from bulk_load import detect_format, iter_records
+
+COLUMNS = ('product_id', 'barcode', 'name', 'uom_id', 'uom_name', 'price_per_unit')
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+NAME_MAX = 45
+PRICE_TOLERANCE = 0.005
+
+UPSERT_PRODUCT = """
+    INSERT INTO products (product_id, name, uom_id, price_per_unit, barcode)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name = VALUES(name),
+        uom_id = VALUES(uom_id),
+        price_per_unit = VALUES(price_per_unit),
+        barcode = VALUES(barcode)
+"""
+
+
+class Catalog:
+    """Current products indexed by id, barcode and lowercased name"""
+
+    def __init__(self, rows):
+        self.by_id = {}
+        self.by_barcode = {}
+        self.by_name = {}
+        ambiguous = set()
+        for product_id, name, uom_id, price, barcode in rows:
+            product = {'product_id': product_id, 'name': name, 'uom_id': uom_id,
+                       'price_per_unit': float(price), 'barcode': barcode}
+            self.by_id[product_id] = product
+            if barcode:
+                self.by_barcode[barcode] = product
+            key = name.strip().lower()
+            if key in self.by_name:
+                ambiguous.add(key)
+            self.by_name[key] = product
+        # A name shared by several products can't identify one of them
+        for key in ambiguous:
+            del self.by_name[key]
+
+    def match(self, product_id, barcode, name):
+        if product_id is not None:
+            return self.by_id.get(product_id)
+        if barcode and barcode in self.by_barcode:
+            return self.by_barcode[barcode]
+        return self.by_name.get(name.lower())
+
+
+def load_catalog(cursor):
+    """Catalog of every product with the price in effect now (tuple cursor)"""
+    cursor.execute(f"""
+        SELECT p.product_id, p.name, p.uom_id, {pricing.CURRENT_PRICE}, p.barcode
+        FROM products p
+        {pricing.CURRENT_PRICE_JOIN}
+    """)
+    return Catalog(cursor.fetchall())
+
+
+def load_uoms(cursor):
+    """({uom_id}, {lowercased uom_name: uom_id})"""
+    cursor.execute("SELECT uom_id, uom_name FROM uom")
+    rows = cursor.fetchall()
+    return {uom_id for uom_id, _ in rows}, {name.strip().lower(): uom_id for uom_id, name in rows}
+
+
+def parse_line(record, uom_ids, uom_names):
+    """(product_id, barcode, name, uom_id, price) of one list line, or raise ValueError"""
+    if record is None:
+        raise ValueError("Malformed record")
+    raw_id, raw_barcode, name, raw_uom_id, uom_name, raw_price = (value.strip() for value in record)
+    errors = []
+    product_id = None
+    if raw_id:
+        try:
+            product_id = int(raw_id)
+        except ValueError:
+            errors.append("product_id must be an integer")
+    if not 1 <= len(name) <= NAME_MAX:
+        errors.append(f"Product name must be between 1 and {NAME_MAX} characters")
+    try:
+        price = float(raw_price)
+        if not price > 0:
+            errors.append("Price must be greater than 0")
+    except ValueError:
+        errors.append("price_per_unit must be a number")
+        price = None
+    uom_id = None
+    if raw_uom_id:
+        try:
+            uom_id = int(raw_uom_id)
+        except ValueError:
+            pass
+        if uom_id not in uom_ids:
+            errors.append(f"Unknown uom_id {raw_uom_id}")
+    elif uom_name:
+        uom_id = uom_names.get(uom_name.lower())
+        if uom_id is None:
+            errors.append(f"Unknown uom_name {uom_name}")
+    else:
+        errors.append("uom_id or uom_name is required")
+    barcode = None
+    try:
+        barcode = normalize_barcode(raw_barcode)
+    except ValueError as e:
+        errors.append(str(e))
+    if errors:
+        raise ValueError(*errors)
+    return product_id, barcode, name, uom_id, price
+
+
+def diff_catalog(records, catalog, uom_ids, uom_names):
+    """(rows to upsert, {product_id: new price}, report) for a parsed price list
+
+    Upsert rows are (product_id or None, name, uom_id, price, barcode).
+    """
+    report = {'rows': 0, 'added': 0, 'changed': 0, 'unchanged': 0, 'rejected': 0,
+              'not_in_list': 0, 'errors': [], 'errors_truncated': False}
+    upserts = []
+    price_changes = {}
+    seen_products = {}
+    seen_barcodes = {}
+
+    def reject(row, *messages):
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row, 'errors': list(messages)})
+        else:
+            report['errors_truncated'] = True
+
+    for row, record in enumerate(records, start=1):
+        report['rows'] += 1
+        try:
+            product_id, barcode, name, uom_id, price = parse_line(record, uom_ids, uom_names)
+        except ValueError as e:
+            reject(row, *e.args)
+            continue
+        current = catalog.match(product_id, barcode, name)
+        if product_id is not None and current is None:
+            reject(row, f"Unknown product_id {product_id}")
+            continue
+        if barcode and barcode in seen_barcodes:
+            reject(row, f"Barcode {barcode} is also on row {seen_barcodes[barcode]}")
+            continue
+        if current:
+            if current['product_id'] in seen_products:
+                reject(row, f"Same product as row {seen_products[current['product_id']]}")
+                continue
+            seen_products[current['product_id']] = row
+            barcode = barcode or current['barcode']
+            owner = catalog.by_barcode.get(barcode) if barcode else None
+            if owner and owner is not current:
+                reject(row, f"Barcode {barcode} belongs to product {owner['product_id']}")
+                continue
+        if barcode:
+            seen_barcodes[barcode] = row
+
+        if current is None:
+            report['added'] += 1
+            upserts.append((None, name, uom_id, price, barcode))
+            continue
+        price_changed = abs(current['price_per_unit'] - price) >= PRICE_TOLERANCE
+        if (name == current['name'] and uom_id == current['uom_id']
+                and barcode == current['barcode'] and not price_changed):
+            report['unchanged'] += 1
+            continue
+        report['changed'] += 1
+        upserts.append((current['product_id'], name, uom_id, price, barcode))
+        if price_changed:
+            price_changes[current['product_id']] = price
+    report['not_in_list'] = len(catalog.by_id) - len(seen_products)
+    return upserts, price_changes, report
+
+
+def apply_changes(conn, cursor, upserts, price_changes, batch_size=BATCH_SIZE):
+    """Write the diff in one transaction: price history first, then products"""
+    if not upserts:
+        return
+    if not conn.in_transaction:
+        conn.start_transaction()
+    try:
+        pricing.set_prices(cursor, price_changes, batch_size)
+        for offset in range(0, len(upserts), batch_size):
+            # executemany turns this into one multi-row INSERT per batch
+            cursor.executemany(UPSERT_PRODUCT, upserts[offset:offset + batch_size])
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+
+
+def sync_catalog(conn, cursor, path, fmt=None, dry_run=False, batch_size=BATCH_SIZE):
+    """Diff a price list file against products and apply it; returns the report
+
+    `cursor` must be a tuple (non-dictionary) cursor.
+    """
+    fmt = detect_format(path, fmt)
+    records = iter_records(path, fmt, COLUMNS, required=('name', 'price_per_unit'))
+    catalog = load_catalog(cursor)
+    uom_ids, uom_names = load_uoms(cursor)
+    upserts, price_changes, report = diff_catalog(records, catalog, uom_ids, uom_names)
+    if not dry_run:
+        apply_changes(conn, cursor, upserts, price_changes, batch_size)
+    elif conn.in_transaction:
+        conn.rollback()
+    report['dry_run'] = dry_run
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync products from a supplier price list")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'ndjson'])
+    parser.add_argument('--dry-run', action='store_true', help="Report the diff without writing")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    conn = None
+    cursor = None
+    try:
+        conn = connect(load_db_config())
+        cursor = conn.cursor()
+        started = time.monotonic()
+        report = sync_catalog(conn, cursor, args.path, args.format, args.dry_run, args.batch_size)
+        verb = "Would apply" if args.dry_run else "Applied"
+        print(f"✅ {verb} {report['added']:,} added, {report['changed']:,} changed "
+              f"({report['unchanged']:,} unchanged, {report['not_in_list']:,} not in the list) "
+              f"in {time.monotonic() - started:.1f}s")
+        for error in report['errors']:
+            print(f"❌ Row {error['row']}: {'; '.join(error['errors'])}")
+        if report['errors_truncated']:
+            print(f"… {report['rejected'] - len(report['errors']):,} more rejected rows not shown")
+        return True
+    except (Error, ValueError) as e:
+        print(f"❌ Catalog sync failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Find and merge duplicate customers
+Phone numbers, emails, names and addresses are normalized, and every
+customer gets up to three blocking keys (phone, email and a coarse name
+key). Only customers sharing a key are compared, so the work grows with the
+size of the blocks instead of n². Blocks are found by sorting the key
+hashes with NumPy, which handles a million customers in seconds.
+
+Pairs are scored from fuzzy name similarity plus exact phone, email and
+address matches. Linked pairs are grouped into clusters, and every cluster
+proposes merging its members into its oldest customer. Proposals wait in
+customer_merge_candidates until they are approved or rejected. Approved
+merges re-point orders in small batches, then delete the duplicate.
+
+Run from cron or by hand: python customer_dedup.py [--min-score 0.65]
+"""
+
+import argparse
+import re
+import sys
+import time
+import unicodedata
+from difflib import SequenceMatcher
+
+import numpy as np
+from mysql.connector import Error
+
+MIN_SCORE = 0.65
+MAX_BLOCK = 100             # larger blocks are shared placeholders, not people
+CHUNK_SIZE = 50000
+MERGE_BATCH_SIZE = 1000
+
+NAME_WEIGHT = 0.5
+PHONE_WEIGHT = 0.3
+EMAIL_WEIGHT = 0.3
+ADDRESS_WEIGHT = 0.2
+
+PROPOSED = 'proposed'
+APPROVED = 'approved'
+REJECTED = 'rejected'
+MERGED = 'merged'
+STALE = 'stale'
+REVIEW_STATUSES = (APPROVED, REJECTED)
+
+HONORIFICS = {'mr', 'mrs', 'ms', 'miss', 'dr', 'shri', 'smt', 'sri', 'kumari'}
+GMAIL_DOMAINS = {'gmail.com', 'googlemail.com'}
+
+UPSERT_CANDIDATE = """
+    INSERT INTO customer_merge_candidates (keep_id, merge_id, score, reasons, status, created_at)
+    VALUES (%s, %s, %s, %s, 'proposed', NOW())
+    ON DUPLICATE KEY UPDATE score = VALUES(score), reasons = VALUES(reasons)
+"""
+
+
+def normalize_phone(phone):
+    """Last 10 digits of a phone number, or None if it can't identify anyone"""
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) > 10:
+        digits = digits[-10:]       # drop +91 / leading 0 trunk prefixes
+    if len(digits) < 7 or len(set(digits)) == 1:
+        return None
+    return digits
+
+
+def normalize_email(email):
+    """Lowercased email without +tags (and without dots for Gmail)"""
+    email = (email or '').strip().lower()
+    local, at, domain = email.partition('@')
+    if not at or not local or '.' not in domain:
+        return None
+    local = local.split('+', 1)[0]
+    if domain in GMAIL_DOMAINS:
+        local = local.replace('.', '')
+        domain = 'gmail.com'
+    return f"{local}@{domain}"
+
+
+def _fold(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', text).split()
+
+
+def normalize_name(name):
+    """Lowercase ASCII name tokens without honorifics, joined by spaces"""
+    return ' '.join(token for token in _fold(name) if token not in HONORIFICS)
+
+
+def normalize_address(address):
+    return ' '.join(_fold(address)) or None
+
+
+def name_key(name):
+    """Coarse blocking key: first three letters of each token, sorted"""
+    tokens = name.split()
+    return ' '.join(sorted(token[:3] for token in tokens)) if tokens else None
+
+
+def name_similarity(a, b):
+    """0..1 similarity of normalized names, tolerant of swapped tokens"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    score = SequenceMatcher(None, a, b, autojunk=False).ratio()
+    sorted_a = ' '.join(sorted(a.split()))
+    sorted_b = ' '.join(sorted(b.split()))
+    if sorted_a != a or sorted_b != b:
+        score = max(score, SequenceMatcher(None, sorted_a, sorted_b, autojunk=False).ratio())
+    return score
+
+
+def _hash(value):
+    # 0 marks a missing value; Python's string hash is stable within a run
+    return (hash(value) or 1) if value else 0
+
+
+class CustomerTable:
+    """Normalized customers in parallel arrays, plus their blocking keys"""
+
+    def __init__(self):
+        self.ids = []
+        self.names = []
+        self.phones = []
+        self.emails = []
+        self.addresses = []
+        self.key_hashes = []
+        self.key_rows = []
+
+    def add(self, customer_id, name, phone, email, address):
+        row = len(self.ids)
+        name = normalize_name(name)
+        phone = normalize_phone(phone)
+        email = normalize_email(email)
+        self.ids.append(customer_id)
+        self.names.append(name)
+        self.phones.append(_hash(phone))
+        self.emails.append(_hash(email))
+        self.addresses.append(_hash(normalize_address(address)))
+        for key in (phone and 'p:' + phone, email and 'e:' + email,
+                    name_key(name) and 'n:' + name_key(name)):
+            if key:
+                self.key_hashes.append(_hash(key))
+                self.key_rows.append(row)
+
+    def finish(self):
+        """Freeze the numeric columns into NumPy arrays"""
+        self.ids = np.array(self.ids, dtype='int64')
+        self.phones = np.array(self.phones, dtype='int64')
+        self.emails = np.array(self.emails, dtype='int64')
+        self.addresses = np.array(self.addresses, dtype='int64')
+        self.key_hashes = np.array(self.key_hashes, dtype='int64')
+        self.key_rows = np.array(self.key_rows, dtype='int64')
+        return self
+
+
+def blocks(table, max_block=MAX_BLOCK):
+    """(row arrays of every block with 2..max_block members, oversized block count)"""
+    if len(table.key_hashes) == 0:
+        return [], 0
+    order = np.argsort(table.key_hashes, kind='stable')
+    keys = table.key_hashes[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.concatenate((starts[1:], [len(keys)]))
+    sizes = ends - starts
+    wanted = (sizes > 1) & (sizes <= max_block)
+    rows = table.key_rows[order]
+    return ([rows[start:end] for start, end in zip(starts[wanted], ends[wanted])],
+            int(np.count_nonzero(sizes > max_block)))
+
+
+def score_pair(table, i, j, min_score=0.0):
+    """(score, reasons) for two rows of a CustomerTable
+
+    Returns (0.0, '') early when even identical names could not reach
+    min_score, which skips the costly fuzzy comparison for most pairs.
+    """
+    reasons = []
+    score = 0.0
+    for column, weight, label in ((table.phones, PHONE_WEIGHT, 'phone'),
+                                  (table.emails, EMAIL_WEIGHT, 'email'),
+                                  (table.addresses, ADDRESS_WEIGHT, 'address')):
+        if column[i] and column[i] == column[j]:
+            score += weight
+            reasons.append(label)
+    if score + NAME_WEIGHT < min_score:
+        return 0.0, ''
+    similarity = name_similarity(table.names[i], table.names[j])
+    score += NAME_WEIGHT * similarity
+    reasons.append(f"name {similarity:.2f}")
+    return min(score, 1.0), ', '.join(reasons)
+
+
+def find_duplicates(table, min_score=MIN_SCORE, max_block=MAX_BLOCK):
+    """[(keep_id, merge_id, score, reasons)] plus stats for a finished CustomerTable
+
+    Rows must have been added in customer_id order. Pairs at or above
+    min_score are linked into clusters, and every member of a cluster is
+    proposed for merging into the cluster's lowest customer_id.
+    """
+    block_list, oversized = blocks(table, max_block)
+    parent = {}
+
+    def find(row):
+        while parent.get(row, row) != row:
+            parent[row] = parent.get(parent[row], parent[row])
+            row = parent[row]
+        return row
+
+    seen = set()
+    best = {}
+    compared = 0
+    for members in block_list:
+        members = members.tolist()
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                i, j = members[a], members[b]
+                pair = (i, j) if i < j else (j, i)
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                compared += 1
+                score, reasons = score_pair(table, i, j, min_score)
+                if score < min_score:
+                    continue
+                for row in pair:
+                    if score > best.get(row, (0.0, ''))[0]:
+                        best[row] = (score, reasons)
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    # Rows are in customer_id order, so the lower root is the oldest
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    proposals = []
+    for row in parent:
+        root = find(row)
+        if row != root:
+            score, reasons = best[row]
+            proposals.append((int(table.ids[root]), int(table.ids[row]), round(score, 4), reasons))
+    proposals.sort()
+    stats = {'customers': len(table.ids), 'blocks': len(block_list), 'oversized_blocks': oversized,
+             'pairs_compared': compared, 'proposals': len(proposals)}
+    return proposals, stats
+
+
+def load_customers(cursor, chunk_size=CHUNK_SIZE):
+    """CustomerTable of every customer, streamed in customer_id order"""
+    table = CustomerTable()
+    cursor.execute("SELECT customer_id, name, phone, email, address FROM customers ORDER BY customer_id")
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            table.add(*row)
+    return table.finish()
+
+
+def store_proposals(conn, cursor, proposals, batch_size=CHUNK_SIZE):
+    """Replace open proposals with this run's; reviewed pairs keep their status"""
+    if not conn.in_transaction:
+        conn.start_transaction()
+    try:
+        cursor.execute("DELETE FROM customer_merge_candidates WHERE status = 'proposed'")
+        rows = [(keep_id, merge_id, score, reasons[:255]) for keep_id, merge_id, score, reasons in proposals]
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(UPSERT_CANDIDATE, rows[offset:offset + batch_size])
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    return len(proposals)
+
+
+def run_dedup(conn, cursor, min_score=MIN_SCORE, max_block=MAX_BLOCK, progress=None):
+    """Find duplicates and store them as proposals; returns stats
+
+    `cursor` must be a tuple (non-dictionary) cursor. `progress(fraction,
+    message)` is called between stages when given.
+    """
+    progress = progress or (lambda fraction, message: None)
+    progress(0.0, "Loading customers")
+    table = load_customers(cursor)
+    progress(0.4, f"Comparing {len(table.ids):,} customers")
+    proposals, stats = find_duplicates(table, min_score, max_block)
+    progress(0.9, f"Storing {len(proposals):,} proposed merges")
+    store_proposals(conn, cursor, proposals)
+    return stats
+
+
+def _repoint(conn, cursor, table, keep_id, merge_id, batch_size):
+    # Small batches, each committed, so till traffic never waits on a long lock
+    while True:
+        cursor.execute(f"UPDATE {table} SET customer_id = %s WHERE customer_id = %s LIMIT %s",
+                       (keep_id, merge_id, batch_size))
+        moved = cursor.rowcount
+        conn.commit()
+        if moved < batch_size:
+            return
+
+
+def merge_customer(conn, cursor, candidate_id, keep_id, merge_id, batch_size=MERGE_BATCH_SIZE):
+    """Move a duplicate's orders to the kept customer and delete it
+
+    Returns False (and marks the candidate stale) if either customer is gone.
+    """
+    _repoint(conn, cursor, 'orders', keep_id, merge_id, batch_size)
+    _repoint(conn, cursor, 'orders_archive', keep_id, merge_id, batch_size)
+    if not conn.in_transaction:
+        conn.start_transaction()
+    try:
+        cursor.execute("SELECT customer_id FROM customers WHERE customer_id IN (%s, %s) FOR UPDATE",
+                       (keep_id, merge_id))
+        if len(cursor.fetchall()) < 2:
+            cursor.execute("UPDATE customer_merge_candidates SET status = %s WHERE candidate_id = %s",
+                           (STALE, candidate_id))
+            conn.commit()
+            return False
+        # Orders taken (or archived) while the batches ran, then contact
+        # details the kept record lacks. The archive tables have no foreign
+        # key, so they are swept too; an archive batch that moves these orders
+        # commits before the first UPDATE or waits for this transaction.
+        cursor.execute("UPDATE orders SET customer_id = %s WHERE customer_id = %s", (keep_id, merge_id))
+        cursor.execute("UPDATE orders_archive SET customer_id = %s WHERE customer_id = %s", (keep_id, merge_id))
+        cursor.execute("""
+            UPDATE customers k JOIN customers m ON m.customer_id = %s
+            SET k.phone = COALESCE(NULLIF(k.phone, ''), m.phone),
+                k.email = COALESCE(NULLIF(k.email, ''), m.email),
+                k.address = COALESCE(NULLIF(k.address, ''), m.address)
+            WHERE k.customer_id = %s
+        """, (merge_id, keep_id))
+        cursor.execute("DELETE FROM customers WHERE customer_id = %s", (merge_id,))
+        # Later proposals that keep the deleted customer now keep its survivor
+        cursor.execute("""
+            UPDATE IGNORE customer_merge_candidates SET keep_id = %s
+            WHERE keep_id = %s AND status IN ('proposed', 'approved')
+        """, (keep_id, merge_id))
+        cursor.execute("""
+            UPDATE customer_merge_candidates SET status = %s, reviewed_at = COALESCE(reviewed_at, NOW())
+            WHERE candidate_id = %s
+        """, (MERGED, candidate_id))
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    return True
+
+
+def run_merges(conn, cursor, batch_size=MERGE_BATCH_SIZE, progress=None, check_cancelled=None):
+    """Apply every approved merge, oldest approval first; returns merge counts"""
+    progress = progress or (lambda fraction, message: None)
+    cursor.execute("""
+        SELECT candidate_id, keep_id, merge_id FROM customer_merge_candidates
+        WHERE status = 'approved'
+        ORDER BY reviewed_at, candidate_id
+    """)
+    approved = cursor.fetchall()
+    if conn.in_transaction:
+        conn.commit()
+    merged = stale = 0
+    for i, (candidate_id, keep_id, merge_id) in enumerate(approved):
+        if check_cancelled:
+            check_cancelled()
+        # keep_id may have been re-pointed by an earlier merge in this run
+        cursor.execute("SELECT keep_id FROM customer_merge_candidates WHERE candidate_id = %s", (candidate_id,))
+        row = cursor.fetchone()
+        keep_id = row[0] if row else keep_id
+        if merge_customer(conn, cursor, candidate_id, keep_id, merge_id, batch_size):
+            merged += 1
+        else:
+            stale += 1
+        progress((i + 1) / len(approved), f"Merged {merged:,} of {len(approved):,} customers")
+    return {'merged': merged, 'stale': stale}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose (and optionally apply) duplicate customer merges")
+    parser.add_argument('--min-score', type=float, default=MIN_SCORE)
+    parser.add_argument('--max-block', type=int, default=MAX_BLOCK)
+    parser.add_argument('--merge-approved', action='store_true',
+                        help="Apply approved merges instead of searching for duplicates")
+    parser.add_argument('--batch-size', type=int, default=MERGE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    conn = None
+    cursor = None
+    try:
+        conn = connect(load_db_config())
+        cursor = conn.cursor()
+        started = time.monotonic()
+        if args.merge_approved:
+            result = run_merges(conn, cursor, args.batch_size)
+            print(f"✅ Merged {result['merged']:,} customers ({result['stale']:,} stale) "
+                  f"in {time.monotonic() - started:.1f}s")
+        else:
+            stats = run_dedup(conn, cursor, args.min_score, args.max_block)
+            print(f"✅ {stats['proposals']:,} merges proposed from {stats['pairs_compared']:,} comparisons "
+                  f"over {stats['customers']:,} customers in {time.monotonic() - started:.1f}s")
+            if stats['oversized_blocks']:
+                print(f"ℹ️ Skipped {stats['oversized_blocks']:,} blocks larger than {args.max_block}")
+        return True
+    except Error as e:
+        print(f"❌ Deduplication failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Bulk customer import from CSV or NDJSON
+Records are read in chunks and checked with the same rules as
+POST /api/customers. Each rule runs over a whole chunk at once with NumPy
+string operations instead of row by row. Valid rows of a chunk go in with
+one multi-row INSERT and a commit; invalid rows are reported by record
+number with every rule they broke.
+
+CSV files need a header row with at least a `name` column; NDJSON records
+are objects with the same keys. Optional columns are phone, email and
+address.
+
+Usage: python customer_import.py customers.csv [--format ndjson]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+from mysql.connector import Error
+
+from bulk_load import detect_format, iter_records
+
+COLUMNS = ('name', 'phone', 'email', 'address')
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+# Validation rules shared with add_customer
+NAME_MIN, NAME_MAX = 1, 100
+PHONE_MIN, PHONE_MAX = 10, 15
+EMAIL_MAX = 100
+ADDRESS_MAX = 500
+NAME_REQUIRED = "Customer name is required"
+NAME_LENGTH = f"Customer name must be between {NAME_MIN} and {NAME_MAX} characters"
+PHONE_LENGTH = f"Phone number must be between {PHONE_MIN} and {PHONE_MAX} characters"
+EMAIL_INVALID = "Invalid email format or email too long"
+ADDRESS_LENGTH = f"Address too long (max {ADDRESS_MAX} characters)"
+MALFORMED = "Malformed record"
+
+INSERT_CUSTOMER = """
+    INSERT INTO customers (name, phone, email, address)
+    VALUES (%s, %s, %s, %s)
+"""
+
+
+def validate_chunk(records):
+    """(valid rows, {index: [errors]}) for a list of records from bulk_load.iter_records
+
+    Values are stripped like add_customer does; every rule is one array
+    operation over the whole chunk.
+    """
+    readable = [record if record is not None else ('', '', '', '') for record in records]
+    columns = [np.array([value.strip() for value in column], dtype=str)
+               for column in zip(*readable)] if readable else [np.array([], dtype=str)] * 4
+    names, phones, emails, addresses = columns
+    name_len = np.char.str_len(names)
+    phone_len = np.char.str_len(phones)
+    email_len = np.char.str_len(emails)
+    address_len = np.char.str_len(addresses)
+
+    malformed = np.array([record is None for record in records], dtype=bool)
+    checks = [
+        (~malformed & (name_len == 0), NAME_REQUIRED),
+        (name_len > NAME_MAX, NAME_LENGTH),
+        ((phone_len > 0) & ((phone_len < PHONE_MIN) | (phone_len > PHONE_MAX)), PHONE_LENGTH),
+        ((email_len > 0) & ((np.char.find(emails, '@') < 0) | (email_len > EMAIL_MAX)), EMAIL_INVALID),
+        (address_len > ADDRESS_MAX, ADDRESS_LENGTH),
+    ]
+    invalid = malformed.copy()
+    for mask, _ in checks:
+        invalid |= mask
+
+    errors = {}
+    for index in np.flatnonzero(invalid).tolist():
+        if malformed[index]:
+            errors[index] = [MALFORMED]
+        else:
+            errors[index] = [message for mask, message in checks if mask[index]]
+    # tolist() hands the connector plain str values rather than numpy.str_
+    keep = ~invalid
+    valid = list(zip(*(column[keep].tolist() for column in columns)))
+    return valid, errors
+
+
+def import_customers(conn, cursor, path, fmt=None, chunk_size=CHUNK_SIZE, progress=None, check_cancelled=None):
+    """Validate and insert every record of a file; returns the import report
+
+    Each chunk is committed on its own, so a cancelled or failed import
+    keeps the chunks before it. Rows are numbered from 1 in file order.
+    """
+    fmt = detect_format(path, fmt)
+    progress = progress or (lambda fraction, message: None)
+    report = {'rows': 0, 'imported': 0, 'rejected': 0, 'errors': [], 'errors_truncated': False}
+    chunk = []
+
+    def flush():
+        valid, errors = validate_chunk(chunk)
+        if valid:
+            if not conn.in_transaction:
+                conn.start_transaction()
+            try:
+                # executemany turns this into a single multi-row INSERT
+                cursor.executemany(INSERT_CUSTOMER, valid)
+                conn.commit()
+            except Error:
+                conn.rollback()
+                raise
+        first_row = report['rows'] + 1
+        report['rows'] += len(chunk)
+        report['imported'] += len(valid)
+        report['rejected'] += len(errors)
+        for index, messages in errors.items():
+            if len(report['errors']) >= MAX_REPORTED_ERRORS:
+                report['errors_truncated'] = True
+                break
+            report['errors'].append({'row': first_row + index, 'errors': messages})
+        chunk.clear()
+        progress(None, f"Imported {report['imported']:,} of {report['rows']:,} rows")
+        if check_cancelled:
+            check_cancelled()
+
+    for record in iter_records(path, fmt, COLUMNS, required=('name',)):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import customers from a CSV or NDJSON file")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'ndjson'])
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    conn = None
+    cursor = None
+    try:
+        conn = connect(load_db_config())
+        cursor = conn.cursor()
+        started = time.monotonic()
+        report = import_customers(conn, cursor, args.path, args.format, args.chunk_size)
+        print(f"✅ Imported {report['imported']:,} of {report['rows']:,} customers "
+              f"in {time.monotonic() - started:.1f}s")
+        for error in report['errors']:
+            print(f"❌ Row {error['row']}: {'; '.join(error['errors'])}")
+        if report['errors_truncated']:
+            print(f"… {report['rejected'] - len(report['errors']):,} more rejected rows not shown")
+        return True
+    except (Error, ValueError) as e:
+        print(f"❌ Import failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
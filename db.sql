@@ -13,6 +13,16 @@ CREATE TABLE IF NOT EXISTS products (
     name VARCHAR(45) NOT NULL,
     uom_id INT NOT NULL,
     price_per_unit DOUBLE NOT NULL,
+    stock_quantity DOUBLE DEFAULT 100,
+    barcode VARCHAR(32) NULL,
+    category VARCHAR(45) NULL,
+    reorder_threshold INT NULL,
+    low_stock_since DATETIME NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE INDEX uq_products_barcode (barcode),
+    INDEX idx_products_updated_at (updated_at),
+    INDEX idx_products_category (category),
+    INDEX idx_products_low_stock (low_stock_since),
     FOREIGN KEY (uom_id) REFERENCES uom(uom_id)
 );
 
@@ -29,6 +39,9 @@ CREATE TABLE IF NOT EXISTS orders (
     customer_id INT NOT NULL,
     total DOUBLE NOT NULL,
     datetime DATETIME DEFAULT CURRENT_TIMESTAMP,
+    client_order_uuid CHAR(36) NULL,
+    INDEX idx_orders_datetime (datetime),
+    UNIQUE INDEX uq_orders_client_order_uuid (client_order_uuid),
     FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
 );
 
@@ -37,11 +50,188 @@ CREATE TABLE IF NOT EXISTS order_details (
     product_id INT NOT NULL,
     quantity DOUBLE NOT NULL,
     total_price DOUBLE NOT NULL,
+    product_name VARCHAR(45) NULL,
+    uom_name VARCHAR(45) NULL,
+    unit_price DOUBLE NULL,
+    discount DOUBLE NOT NULL DEFAULT 0,
+    promotion_id INT NULL,
     PRIMARY KEY (order_id, product_id),
     FOREIGN KEY (order_id) REFERENCES orders(order_id),
     FOREIGN KEY (product_id) REFERENCES products(product_id)
 );
 
+-- Demand forecasts, refreshed by forecast.py
+CREATE TABLE IF NOT EXISTS product_forecasts (
+    product_id INT PRIMARY KEY,
+    avg_daily_demand DOUBLE NOT NULL DEFAULT 0,
+    forecast_daily_demand DOUBLE NOT NULL DEFAULT 0,
+    demand_stddev DOUBLE NOT NULL DEFAULT 0,
+    reorder_point DOUBLE NOT NULL DEFAULT 0,
+    days_of_cover DOUBLE,
+    computed_at DATE NOT NULL,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+-- Background jobs run by the app (see jobs.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id CHAR(32) PRIMARY KEY,
+    job_type VARCHAR(45) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    progress DOUBLE NOT NULL DEFAULT 0,
+    message VARCHAR(255),
+    params TEXT,
+    result MEDIUMTEXT,
+    error TEXT,
+    created_at DATETIME NOT NULL,
+    started_at DATETIME,
+    finished_at DATETIME,
+    INDEX idx_jobs_created (created_at),
+    INDEX idx_jobs_type_status (job_type, status)
+);
+
+-- Cold order history, moved here by archive_orders.py
+CREATE TABLE IF NOT EXISTS orders_archive (
+    order_id INT PRIMARY KEY,
+    customer_id INT NOT NULL,
+    total DOUBLE NOT NULL,
+    datetime DATETIME,
+    INDEX idx_orders_archive_datetime (datetime),
+    INDEX idx_orders_archive_customer (customer_id)
+);
+
+CREATE TABLE IF NOT EXISTS order_details_archive (
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity DOUBLE NOT NULL,
+    total_price DOUBLE NOT NULL,
+    product_name VARCHAR(45) NULL,
+    uom_name VARCHAR(45) NULL,
+    unit_price DOUBLE NULL,
+    discount DOUBLE NOT NULL DEFAULT 0,
+    promotion_id INT NULL,
+    PRIMARY KEY (order_id, product_id),
+    INDEX idx_order_details_archive_product (product_id)
+);
+
+CREATE TABLE IF NOT EXISTS order_archive_log (
+    month DATE PRIMARY KEY,
+    orders INT NOT NULL DEFAULT 0,
+    order_lines INT NOT NULL DEFAULT 0,
+    revenue DOUBLE NOT NULL DEFAULT 0,
+    archived_at DATETIME NOT NULL
+);
+
+-- Versions bumped by writes that cached state in every worker depends on,
+-- e.g. product categories for the promotion index (promotions.py)
+CREATE TABLE IF NOT EXISTS change_markers (
+    name VARCHAR(45) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Effective-dated prices; ranges of one product never overlap
+CREATE TABLE IF NOT EXISTS price_history (
+    history_id INT AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NOT NULL,
+    price_per_unit DOUBLE NOT NULL,
+    effective_from DATETIME NOT NULL,
+    effective_to DATETIME NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE INDEX uq_price_history_product_from (product_id, effective_from),
+    INDEX idx_price_history_from (effective_from),
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+-- Promotions: quantity breaks, multi-buys and category discounts (promotions.py)
+CREATE TABLE IF NOT EXISTS promotions (
+    promotion_id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    product_id INT NULL,
+    category VARCHAR(45) NULL,
+    min_quantity DOUBLE NOT NULL DEFAULT 0,
+    percent_off DOUBLE NULL,
+    unit_price DOUBLE NULL,
+    buy_quantity INT NULL,
+    pay_quantity INT NULL,
+    starts_at DATETIME NULL,
+    ends_at DATETIME NULL,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_promotions_updated_at (updated_at),
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+-- Proposed duplicate customer merges awaiting review (customer_dedup.py)
+CREATE TABLE IF NOT EXISTS customer_merge_candidates (
+    candidate_id INT AUTO_INCREMENT PRIMARY KEY,
+    keep_id INT NOT NULL,
+    merge_id INT NOT NULL,
+    score DOUBLE NOT NULL,
+    reasons VARCHAR(255),
+    status VARCHAR(20) NOT NULL DEFAULT 'proposed',
+    created_at DATETIME NOT NULL,
+    reviewed_at DATETIME NULL,
+    UNIQUE INDEX uq_merge_candidates_pair (keep_id, merge_id),
+    INDEX idx_merge_candidates_status (status, score)
+);
+
+-- Opt-in request profiles (profiling.py)
+CREATE TABLE IF NOT EXISTS request_profiles (
+    profile_id INT AUTO_INCREMENT PRIMARY KEY,
+    route VARCHAR(100) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    path VARCHAR(255) NOT NULL,
+    status INT,
+    mode VARCHAR(20) NOT NULL,
+    triggered_by VARCHAR(20),
+    duration_ms DOUBLE NOT NULL,
+    sql_count INT NOT NULL DEFAULT 0,
+    sql_ms DOUBLE NOT NULL DEFAULT 0,
+    top_functions TEXT,
+    sql_statements MEDIUMTEXT,
+    collapsed MEDIUMTEXT,
+    pstats MEDIUMBLOB,
+    created_at DATETIME NOT NULL,
+    INDEX idx_request_profiles_route (route, profile_id)
+);
+
+-- Order total reconciliation runs, their checkpoints and findings (reconcile_orders.py)
+CREATE TABLE IF NOT EXISTS reconciliation_runs (
+    run_id INT AUTO_INCREMENT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL,
+    first_order_id INT NOT NULL,
+    last_order_id INT NOT NULL,
+    chunk_size INT NOT NULL,
+    tolerance DOUBLE NOT NULL,
+    started_at DATETIME NOT NULL,
+    finished_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS reconciliation_chunks (
+    run_id INT NOT NULL,
+    chunk_start INT NOT NULL,
+    orders INT NOT NULL,
+    discrepancies INT NOT NULL,
+    checked_at DATETIME NOT NULL,
+    PRIMARY KEY (run_id, chunk_start),
+    FOREIGN KEY (run_id) REFERENCES reconciliation_runs(run_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS order_discrepancies (
+    run_id INT NOT NULL,
+    order_id INT NOT NULL,
+    recorded_total DOUBLE NOT NULL,
+    lines_total DOUBLE NOT NULL,
+    priced_total DOUBLE NOT NULL,
+    line_count INT NOT NULL,
+    total_mismatch BOOLEAN NOT NULL,
+    price_mismatch BOOLEAN NOT NULL,
+    fixed_at DATETIME NULL,
+    PRIMARY KEY (run_id, order_id),
+    INDEX idx_order_discrepancies_order (order_id),
+    FOREIGN KEY (run_id) REFERENCES reconciliation_runs(run_id) ON DELETE CASCADE
+);
+
 -- Insert sample data
 -- Units of Measurement
 INSERT INTO uom (uom_name) VALUES
@@ -0,0 +1,159 @@
+"""
+In-process pub/sub bus for live dashboard updates
+Mutating routes publish small events (order created, stock changed, product
+or customer changed) and every open /api/events/stream connection gets its
+own bounded queue. A client that falls behind is not allowed to grow memory:
+its backlog is dropped and replaced by a single 'resync' event telling the
+page to reload its data once.
+
+Events live in this process only; with several gunicorn workers each worker
+streams the mutations it handled itself.
+"""
+
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+QUEUE_SIZE = 256
+REPLAY_SIZE = 1000
+RESYNC = 'resync'
+
+
+class Subscription:
+    """One subscriber's bounded event queue"""
+
+    def __init__(self, bus, maxsize, types=None):
+        self.bus = bus
+        self.maxsize = maxsize
+        self.types = set(types) if types else None
+        self.overflows = 0
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def wants(self, event):
+        return self.types is None or event['type'] in self.types or event['type'] == RESYNC
+
+    def offer(self, event):
+        """Queue an event without blocking; a full queue collapses to a resync"""
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._queue) >= self.maxsize:
+                self._queue.clear()
+                self._queue.append(self.bus.resync_event('queue overflow'))
+                self.overflows += 1
+            else:
+                self._queue.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within `timeout` or closed"""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._queue.clear()
+            self._cond.notify_all()
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBus:
+    """Fan-out of published events to all current subscribers
+
+    Event ids increase monotonically so a reconnecting EventSource can send
+    Last-Event-ID and get what it missed from a small replay buffer.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, replay_size=REPLAY_SIZE, max_subscribers=None, slots=None):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        # Optional semaphore shared by several buses to cap their streams together
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._replay = deque(maxlen=replay_size)
+        self._ids = itertools.count(1)
+        self._published = 0
+        self._overflows = 0
+
+    def publish(self, event_type, data):
+        """Send an event to every subscriber; never blocks on slow clients"""
+        with self._lock:
+            event = {'id': next(self._ids), 'type': event_type, 'data': data, 'ts': time.time()}
+            self._replay.append(event)
+            self._published += 1
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.wants(event):
+                subscription.offer(event)
+        return event
+
+    def resync_event(self, reason):
+        return {'id': None, 'type': RESYNC, 'data': {'reason': reason}, 'ts': time.time()}
+
+    def subscribe(self, types=None, last_event_id=None):
+        """New Subscription, pre-filled with missed events when resuming
+
+        Returns None when max_subscribers connections are already open, or
+        when the shared slots are all taken.
+        """
+        subscription = Subscription(self, self.queue_size, types)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            if self.slots is not None and not self.slots.acquire(blocking=False):
+                return None
+            self._subscribers.add(subscription)
+            if last_event_id is not None:
+                newest = self._replay[-1]['id'] if self._replay else 0
+                oldest = self._replay[0]['id'] if self._replay else newest + 1
+                if last_event_id > newest or last_event_id < oldest - 1:
+                    # Gap older than the replay buffer, or ids from before a restart
+                    subscription.offer(self.resync_event('replay window exceeded'))
+                else:
+                    for event in self._replay:
+                        if event['id'] > last_event_id and subscription.wants(event):
+                            subscription.offer(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.discard(subscription)
+                self._overflows += subscription.overflows
+                if self.slots is not None:
+                    self.slots.release()
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            return {
+                'subscribers': len(subscribers),
+                'max_subscribers': self.max_subscribers,
+                'published': self._published,
+                'last_event_id': self._replay[-1]['id'] if self._replay else 0,
+                'overflows': self._overflows + sum(s.overflows for s in subscribers),
+            }
+
+
+def format_sse(event):
+    """Serialise an event in text/event-stream framing"""
+    lines = []
+    if event['id'] is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], default=str, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
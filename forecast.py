@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Demand forecasting and reorder points for every product
+Daily demand per product is aggregated in MySQL, then smoothed for all SKUs
+at once with NumPy: an exponentially weighted average gives the forecast and
+a trailing moving window gives the average and volatility used for safety
+stock. Results are upserted into product_forecasts.
+
+Run from cron (e.g. nightly): python forecast.py [--history-days 730]
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from mysql.connector import Error
+
+HISTORY_DAYS = 730
+SMOOTHING_ALPHA = 0.1       # ~1 week half-life
+MOVING_WINDOW_DAYS = 28
+LEAD_TIME_DAYS = 7
+SERVICE_LEVEL_Z = 1.65      # ~95% cycle service level
+CHUNK_SIZE = 100000
+BATCH_SIZE = 5000
+
+DAILY_DEMAND_QUERY = """
+    SELECT od.product_id, DATEDIFF(o.datetime, '1970-01-01') AS day, SUM(od.quantity)
+    FROM order_details od
+    JOIN orders o ON od.order_id = o.order_id
+    WHERE o.datetime >= %s AND o.datetime < %s
+    GROUP BY od.product_id, day
+"""
+
+UPSERT_FORECAST = """
+    INSERT INTO product_forecasts
+        (product_id, avg_daily_demand, forecast_daily_demand, demand_stddev,
+         reorder_point, days_of_cover, computed_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        avg_daily_demand = VALUES(avg_daily_demand),
+        forecast_daily_demand = VALUES(forecast_daily_demand),
+        demand_stddev = VALUES(demand_stddev),
+        reorder_point = VALUES(reorder_point),
+        days_of_cover = VALUES(days_of_cover),
+        computed_at = VALUES(computed_at)
+"""
+
+EPOCH = date(1970, 1, 1)
+
+
+def compute_forecasts(product_ids, stock, sale_products, sale_days, sale_quantities, as_of_day,
+                      alpha=SMOOTHING_ALPHA, window=MOVING_WINDOW_DAYS,
+                      lead_time=LEAD_TIME_DAYS, z=SERVICE_LEVEL_Z):
+    """Forecast demand and reorder points for all products in one pass
+
+    `product_ids` must be sorted. Sales are sparse (product, day, quantity)
+    triples with one entry per product and day; days are days since
+    1970-01-01 and `as_of_day` is the most recent complete day.
+    """
+    n = len(product_ids)
+    idx = np.searchsorted(product_ids, sale_products)
+    known = (idx < n) & (product_ids[np.minimum(idx, n - 1)] == sale_products) if n else np.zeros(0, bool)
+    idx, ages, quantities = idx[known], as_of_day - sale_days[known], sale_quantities[known]
+
+    # EWMA with a zero starting level, summed directly from the sparse days:
+    # level = sum(alpha * (1 - alpha) ** age * demand), with the decay looked
+    # up per age instead of raising a power for every sale
+    decay = alpha * np.power(1.0 - alpha, np.arange(ages.max() + 1 if len(ages) else 1))
+    forecast = np.bincount(idx, weights=decay[ages] * quantities, minlength=n)
+
+    # Moving window statistics; days without sales count as zero demand
+    recent = ages < window
+    mean = np.bincount(idx[recent], weights=quantities[recent], minlength=n) / window
+    mean_sq = np.bincount(idx[recent], weights=quantities[recent] ** 2, minlength=n) / window
+    stddev = np.sqrt(np.maximum(mean_sq - mean ** 2, 0.0))
+
+    reorder_point = forecast * lead_time + z * stddev * np.sqrt(lead_time)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(forecast > 0, stock / forecast, np.nan)
+
+    return {
+        'product_id': product_ids,
+        'avg_daily_demand': mean,
+        'forecast_daily_demand': forecast,
+        'demand_stddev': stddev,
+        'reorder_point': reorder_point,
+        'days_of_cover': days_of_cover,
+    }
+
+
+def fetch_products(cursor):
+    """Sorted product ids and their current stock"""
+    cursor.execute("SELECT product_id, COALESCE(stock_quantity, 100) FROM products ORDER BY product_id")
+    rows = cursor.fetchall()
+    if not rows:
+        return np.empty(0, dtype='int64'), np.empty(0)
+    data = np.array(rows, dtype='float64')
+    return data[:, 0].astype('int64'), data[:, 1]
+
+
+def fetch_daily_demand(cursor, since, until, chunk_size=CHUNK_SIZE):
+    """(product_ids, days, quantities) arrays of daily demand in [since, until)"""
+    cursor.execute(DAILY_DEMAND_QUERY, (since, until))
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype='float64'))
+    if not chunks:
+        empty = np.empty(0, dtype='int64')
+        return empty, empty, np.empty(0)
+    data = np.concatenate(chunks)
+    return data[:, 0].astype('int64'), data[:, 1].astype('int64'), data[:, 2]
+
+
+def store_forecasts(conn, cursor, forecasts, computed_at, batch_size=BATCH_SIZE):
+    """Upsert forecast rows in large batches inside one transaction"""
+    def value(x):
+        return None if np.isnan(x) else round(float(x), 4)
+
+    rows = [
+        (int(pid), value(avg), value(fc), value(sd), value(rp), value(cover), computed_at)
+        for pid, avg, fc, sd, rp, cover in zip(
+            forecasts['product_id'], forecasts['avg_daily_demand'],
+            forecasts['forecast_daily_demand'], forecasts['demand_stddev'],
+            forecasts['reorder_point'], forecasts['days_of_cover'])
+    ]
+    if not conn.in_transaction:
+        conn.start_transaction()
+    try:
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(UPSERT_FORECAST, rows[offset:offset + batch_size])
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def run_forecast(conn, cursor, history_days=HISTORY_DAYS, as_of=None, progress=None, **params):
+    """Recompute and store forecasts for every product; returns the row count
+
+    `cursor` must be a tuple (non-dictionary) cursor. `progress(fraction,
+    message)` is called between stages when given.
+    """
+    progress = progress or (lambda fraction, message: None)
+    until = as_of or date.today()
+    since = until - timedelta(days=history_days)
+    progress(0.0, "Loading products")
+    product_ids, stock = fetch_products(cursor)
+    progress(0.1, "Loading daily demand")
+    sale_products, sale_days, sale_quantities = fetch_daily_demand(cursor, since, until)
+    progress(0.6, "Computing forecasts")
+    as_of_day = (until - EPOCH).days - 1
+    forecasts = compute_forecasts(product_ids, stock, sale_products, sale_days,
+                                  sale_quantities, as_of_day, **params)
+    progress(0.7, "Storing forecasts")
+    return store_forecasts(conn, cursor, forecasts, until)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute product demand forecasts and reorder points")
+    parser.add_argument('--history-days', type=int, default=HISTORY_DAYS)
+    parser.add_argument('--lead-time', type=int, default=LEAD_TIME_DAYS)
+    parser.add_argument('--alpha', type=float, default=SMOOTHING_ALPHA)
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    conn = None
+    cursor = None
+    try:
+        conn = connect(load_db_config())
+        cursor = conn.cursor()
+        started = time.monotonic()
+        count = run_forecast(conn, cursor, args.history_days,
+                             lead_time=args.lead_time, alpha=args.alpha)
+        print(f"✅ Forecasts updated for {count:,} products in {time.monotonic() - started:.1f}s")
+        return True
+    except Error as e:
+        print(f"❌ Forecast failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
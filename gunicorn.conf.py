@@ -7,7 +7,10 @@ backlog = 2048
 
 # Worker processes
 workers = 1
-worker_class = 'sync'
+# Threaded worker so admission control in app.py can queue and prioritise
+# concurrent requests instead of gunicorn serialising them
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
 worker_connections = 1000
 timeout = 120
 keepalive = 2
@@ -0,0 +1,214 @@
+"""
+Liveness and readiness probes
+/livez only shows the process answers and does no I/O. /readyz reports the
+state kept by a HealthChecker thread, which pings every store's database
+on an interval over a connection of its own, reads replication lag when
+the server is a replica and samples DB slot saturation. Readiness follows
+the primary store, so one shop's database outage doesn't take the instance
+out of rotation for every other store. A probe is then a
+dict read, however often the load balancer calls it, and never adds
+database load or waits on a slow database.
+
+Error details are logged, never returned to the caller.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+INTERVAL = 5.0
+# Readiness fails if the checker hasn't finished a round for this many intervals
+STALE_INTERVALS = 3
+MAX_REPLICATION_LAG = 30
+
+# Newer servers first; older ones only know the SLAVE wording
+_REPLICA_STATUS = (
+    ("SHOW REPLICA STATUS", 'Seconds_Behind_Source'),
+    ("SHOW SLAVE STATUS", 'Seconds_Behind_Master'),
+)
+
+
+def replication_lag(cursor):
+    """(is_replica, seconds behind or None) from a dictionary cursor
+
+    (None, None) when the server won't say, e.g. without the REPLICATION
+    CLIENT privilege. A replica whose SQL thread stopped reports None.
+    """
+    for statement, column in _REPLICA_STATUS:
+        try:
+            cursor.execute(statement)
+            row = cursor.fetchone()
+        except Error:
+            continue
+        if row is None:
+            return False, None
+        return True, row.get(column)
+    return None, None
+
+
+class HealthChecker:
+    """Background database checks for every store, read by the probes
+
+    `connect(store_id)` opens a connection and `saturation()` returns
+    DB slot usage ({'limit', 'in_use', 'queued'}). Readiness follows
+    `primary_store`; without one, any store that answered will do. The
+    thread starts on first use, so it also runs in workers forked after the
+    app was imported.
+    """
+
+    def __init__(self, connect, store_ids, saturation=None, interval=INTERVAL,
+                 max_lag=MAX_REPLICATION_LAG, primary_store=None):
+        self.connect = connect
+        self.store_ids = store_ids
+        self.saturation = saturation
+        self.primary_store = primary_store
+        self.interval = interval
+        self.max_lag = max_lag
+        self._state = None
+        self._connections = {}
+        self._lag_unsupported = set()
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, connect, store_ids, saturation=None, primary_store=None):
+        return cls(connect, store_ids, saturation,
+                   interval=float(os.getenv('HEALTH_INTERVAL', str(INTERVAL))),
+                   max_lag=float(os.getenv('MAX_REPLICATION_LAG', str(MAX_REPLICATION_LAG))),
+                   primary_store=primary_store)
+
+    def start(self):
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            # Connections inherited from a parent process can't be shared
+            self._connections = {}
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='health-checker', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for conn in self._connections.values():
+            self._close(conn)
+        self._connections = {}
+
+    def _run(self):
+        while True:
+            try:
+                self.check_now()
+            except Exception as e:
+                logger.error(f"Health check round failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def check_now(self):
+        """Check every store once and publish the result"""
+        stores = {store_id: self._check_store(store_id) for store_id in self.store_ids()}
+        saturation = self._saturation()
+        previous = self._state
+        self._state = {'checked_at': time.time(), 'stores': stores, 'saturation': saturation}
+        for store_id, store in stores.items():
+            was_ok = previous is None or previous['stores'].get(store_id, {}).get('ok')
+            error = self._errors.pop(store_id, None)
+            if was_ok and not store['ok']:
+                detail = f" ({error})" if error else ''
+                logger.warning(f"Store {store_id} is not ready: database {store['database']}{detail}")
+            elif not was_ok and store['ok']:
+                logger.info(f"Store {store_id} is ready again")
+        return self._state
+
+    def _check_store(self, store_id):
+        result = {'database': 'down', 'latency_ms': None, 'replica': None,
+                  'replication_lag_seconds': None, 'ok': False}
+        conn = self._connections.get(store_id)
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = self._connections[store_id] = self.connect(store_id)
+            conn.ping(reconnect=False)
+            result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            result['database'] = 'up'
+            if store_id not in self._lag_unsupported:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    replica, lag = replication_lag(cursor)
+                finally:
+                    cursor.close()
+                if replica is None:
+                    self._lag_unsupported.add(store_id)
+                result['replica'] = replica
+                result['replication_lag_seconds'] = lag
+        except Exception as e:
+            self._errors[store_id] = e
+            self._connections.pop(store_id, None)
+            if conn is not None:
+                self._close(conn)
+            return result
+        if result['replica'] and (result['replication_lag_seconds'] is None
+                                  or result['replication_lag_seconds'] > self.max_lag):
+            result['database'] = 'lagging'
+        else:
+            result['ok'] = True
+        return result
+
+    def _saturation(self):
+        if not self.saturation:
+            return None
+        slots = self.saturation()
+        return {
+            'in_use': slots['in_use'],
+            'limit': slots['limit'],
+            'queued': slots['queued'],
+            'utilization': round(slots['in_use'] / slots['limit'], 3) if slots['limit'] else None,
+            'saturated': slots['in_use'] >= slots['limit'] and slots['queued'] > 0,
+        }
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def readiness(self):
+        """(ready, report) from the latest round; never touches the database
+
+        Other stores being down only makes the status 'degraded'; their
+        state is still listed per store.
+        """
+        state = self._state
+        if state is None:
+            return False, {'status': 'starting'}
+        age = time.time() - state['checked_at']
+        stale = age > self.interval * STALE_INTERVALS
+        stores = state['stores']
+        if self.primary_store in stores:
+            ready = stores[self.primary_store]['ok']
+        else:
+            ready = any(store['ok'] for store in stores.values())
+        ready = ready and not stale
+        if ready:
+            status = 'ready' if all(store['ok'] for store in stores.values()) else 'degraded'
+        else:
+            status = 'stale' if stale else 'not_ready'
+        return ready, {
+            'status': status,
+            'checked_seconds_ago': round(age, 3),
+            'stores': state['stores'],
+            'saturation': state['saturation'],
+        }
@@ -6,7 +6,6 @@ Run this script once after database creation to set up tables and initial data
 
 import os
 import sys
-import mysql.connector
 from mysql.connector import Error
 
 # Add the parent directory to the path so we can import our config
@@ -15,6 +14,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Use the render configuration
 os.environ['CONFIG_MODULE'] = 'config_render'
 from config_render import db_config
+from bulk_load import connect, create_schema, seed_sample_data
+from order_snapshots import backfill
+from stock_alerts import rebuild as flag_low_stock
 
 def create_database_schema():
     """Create database tables and insert initial data"""
@@ -23,41 +25,27 @@ def create_database_schema():
     cursor = None
     
     try:
-        # Connect to MySQL server
-        connection = mysql.connector.connect(**db_config)
+        connection = connect(db_config)
         cursor = connection.cursor()
         
         print("Connected to MySQL database successfully")
         
-        # Read and execute the SQL file
-        sql_file_path = os.path.join(os.path.dirname(__file__), 'db.sql')
-        
-        with open(sql_file_path, 'r', encoding='utf-8') as file:
-            sql_commands = file.read()
+        create_schema(cursor)
+        connection.commit()
+        print("Database schema created successfully!")
         
-        # Split by semicolon and execute each command
-        commands = [cmd.strip() for cmd in sql_commands.split(';') if cmd.strip()]
+        if seed_sample_data(connection, cursor):
+            print("Sample data inserted successfully!")
+        else:
+            print("Skipping sample data (products table is not empty)")
         
-        for command in commands:
-            if command.upper().startswith('CREATE DATABASE'):
-                # Skip database creation as Render creates the database
-                continue
-            if command.upper().startswith('USE'):
-                # Skip USE statement as we're already connected to the right database
-                continue
-            
-            try:
-                cursor.execute(command)
-                connection.commit()
-                print(f"Executed: {command[:50]}...")
-            except Error as e:
-                if "already exists" in str(e):
-                    print(f"Skipping (already exists): {command[:50]}...")
-                else:
-                    print(f"Error executing command: {e}")
-                    print(f"Command: {command}")
+        # Order lines stored before product snapshots existed
+        filled = sum(backfill(connection, cursor).values())
+        if filled:
+            print(f"Product snapshots filled on {filled} order lines")
         
-        print("Database schema created successfully!")
+        low = flag_low_stock(connection, cursor)
+        print(f"{low} products below their reorder threshold")
         
     except Error as e:
         print(f"Error: {e}")
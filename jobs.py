@@ -0,0 +1,280 @@
+"""
+In-process background jobs
+Long-running work (database setup, forecast rebuilds, imports...) runs on a
+thread pool instead of inside a web request. Every job is persisted to the
+jobs table so its status survives the request that started it, reports
+progress while it runs, can be cancelled, and each job type has its own
+concurrency limit.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Progress updates closer together than this are kept in memory only
+PROGRESS_PERSIST_INTERVAL = 1.0
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when cancellation was requested"""
+
+
+class Job:
+    """State of one job, shared between the runner and the job function"""
+
+    def __init__(self, runner, job_type, params):
+        self.runner = runner
+        self.job_id = uuid.uuid4().hex
+        self.job_type = job_type
+        self.params = params
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._last_persist = 0.0
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Call between units of work; raises JobCancelled when asked to stop"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def update(self, progress=None, message=None):
+        """Report progress (0.0 - 1.0) and/or a status message"""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            self.message = message
+        now = time.monotonic()
+        if now - self._last_persist >= PROGRESS_PERSIST_INTERVAL:
+            self._last_persist = now
+            self.runner._persist(self)
+        self.check_cancelled()
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'message': self.message,
+            'params': self.params,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class JobRunner:
+    """Thread pool with per-type concurrency limits and a persisted job table
+
+    `cursor_factory` is a context manager factory like app.get_db_cursor; it
+    is only used to persist job state, and persistence failures never stop a
+    job (the setup job itself creates the jobs table).
+    """
+
+    def __init__(self, cursor_factory, max_workers=4, keep_finished=200):
+        self.cursor_factory = cursor_factory
+        self.max_workers = max_workers
+        self.keep_finished = keep_finished
+        self._types = {}
+        self._jobs = {}
+        self._pending = {}
+        self._running = {}
+        self._finished = deque()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def register(self, job_type, func, limit=1):
+        """Register `func(job, **params)` under `job_type`, at most `limit` at a time"""
+        self._types[job_type] = (func, limit)
+        self._pending.setdefault(job_type, deque())
+        self._running.setdefault(job_type, 0)
+
+    def submit(self, job_type, **params):
+        """Queue a job and return it; it starts as soon as its type has a free slot"""
+        if job_type not in self._types:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = Job(self, job_type, params)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._pending[job_type].append(job)
+        self._persist(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id):
+        """Job state as a dict, from memory or from the jobs table"""
+        job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        return self._load(job_id)
+
+    def list(self, job_type=None, status=None, limit=50):
+        """Most recent jobs from the jobs table plus anything not yet persisted"""
+        jobs = {j['job_id']: j for j in self._load_recent(job_type, status, limit)}
+        with self._lock:
+            live = list(self._jobs.values())
+        for job in live:
+            if (job_type is None or job.job_type == job_type) and (status is None or job.status == status):
+                jobs[job.job_id] = job.to_dict()
+        return sorted(jobs.values(), key=lambda j: j['created_at'] or '', reverse=True)[:limit]
+
+    def cancel(self, job_id):
+        """Cancel a queued job or ask a running one to stop; False if not active here"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job.status in FINISHED_STATES:
+                return False
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._pending[job.job_type].remove(job)
+                self._finish(job, CANCELLED)
+        self._persist(job)
+        return True
+
+    def stats(self):
+        """Queued and running counts per job type"""
+        with self._lock:
+            return {
+                job_type: {
+                    'queued': len(self._pending[job_type]),
+                    'running': self._running[job_type],
+                    'limit': limit,
+                }
+                for job_type, (_, limit) in self._types.items()
+            }
+
+    def _dispatch(self):
+        """Start queued jobs for every type that is below its limit"""
+        to_start = []
+        with self._lock:
+            for job_type, (_, limit) in self._types.items():
+                pending = self._pending[job_type]
+                while pending and self._running[job_type] < limit:
+                    job = pending.popleft()
+                    job.status = RUNNING
+                    job.started_at = datetime.now()
+                    self._running[job_type] += 1
+                    to_start.append(job)
+            if to_start and self._executor is None:
+                # Created lazily so no threads exist before gunicorn forks
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='job')
+        for job in to_start:
+            self._persist(job)
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        func, _ = self._types[job.job_type]
+        status = SUCCEEDED
+        try:
+            job.check_cancelled()
+            job.result = func(job, **job.params)
+            job.progress = 1.0
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            logger.error(f"Job {job.job_id} ({job.job_type}) failed: {e}")
+            job.error = str(e)
+            status = FAILED
+        with self._lock:
+            self._running[job.job_type] -= 1
+            self._finish(job, status)
+        self._persist(job)
+        self._dispatch()
+
+    def _finish(self, job, status):
+        """Mark a job finished and forget the oldest finished jobs (lock held)"""
+        job.status = status
+        job.finished_at = datetime.now()
+        self._finished.append(job.job_id)
+        while len(self._finished) > self.keep_finished:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def _persist(self, job):
+        try:
+            with self.cursor_factory() as (conn, cursor):
+                cursor.execute("""
+                    INSERT INTO jobs (job_id, job_type, status, progress, message, params,
+                                      result, error, created_at, started_at, finished_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        status = VALUES(status), progress = VALUES(progress),
+                        message = VALUES(message), result = VALUES(result),
+                        error = VALUES(error), started_at = VALUES(started_at),
+                        finished_at = VALUES(finished_at)
+                """, (job.job_id, job.job_type, job.status, job.progress, job.message[:255],
+                      json.dumps(job.params, default=str),
+                      json.dumps(job.result, default=str) if job.result is not None else None,
+                      job.error, job.created_at, job.started_at, job.finished_at))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Could not persist job {job.job_id}: {e}")
+
+    def _load(self, job_id):
+        try:
+            with self.cursor_factory() as (conn, cursor):
+                cursor.execute("SELECT * FROM jobs WHERE job_id = %s", (job_id,))
+                row = cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"Could not load job {job_id}: {e}")
+            return None
+        return _row_to_dict(row) if row else None
+
+    def _load_recent(self, job_type, status, limit):
+        conditions = []
+        params = []
+        if job_type:
+            conditions.append("job_type = %s")
+            params.append(job_type)
+        if status:
+            conditions.append("status = %s")
+            params.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        try:
+            with self.cursor_factory() as (conn, cursor):
+                cursor.execute(f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT %s",
+                               tuple(params) + (limit,))
+                rows = cursor.fetchall()
+        except Exception as e:
+            logger.warning(f"Could not list jobs: {e}")
+            return []
+        return [_row_to_dict(row) for row in rows]
+
+
+def _row_to_dict(row):
+    """Convert a jobs table row to the same shape as Job.to_dict()"""
+    job = dict(row)
+    for field in ('params', 'result'):
+        if job.get(field):
+            job[field] = json.loads(job[field])
+    for field in ('created_at', 'started_at', 'finished_at'):
+        if job.get(field):
+            job[field] = job[field].isoformat()
+    job['progress'] = float(job['progress'] or 0)
+    return job
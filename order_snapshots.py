@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Order-line snapshots
+order_details rows keep the product name, unit name and unit price as they
+were when the order was taken, so order views, receipts and exports read
+one table and stay correct after products are renamed or repriced.
+
+New lines are written with their snapshot. This module also backfills
+lines stored before the columns existed, in small order_id ranges, each
+its own short transaction. Backfilled lines get the product's current name
+and unit (the old ones were never recorded) and the unit price they were
+actually charged, total_price / quantity.
+
+Usage: python order_snapshots.py [--batch-size 5000]
+"""
+
+import argparse
+import sys
+import time
+
+from mysql.connector import Error
+
+BATCH_SIZE = 5000
+DETAILS_TABLES = ('order_details', 'order_details_archive')
+
+
+def product_snapshots(cursor, product_ids):
+    """{product_id: (name, uom_name)} for a basket in one query"""
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"""
+        SELECT p.product_id, p.name, u.uom_name
+        FROM products p
+        JOIN uom u ON p.uom_id = u.uom_id
+        WHERE p.product_id IN ({placeholders})
+    """, tuple(ids))
+    snapshots = {}
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            snapshots[row['product_id']] = (row['name'], row['uom_name'])
+        else:
+            snapshots[row[0]] = (row[1], row[2])
+    return snapshots
+
+
+def backfill_table(conn, cursor, details_table, batch_size=BATCH_SIZE, pause=0.0, progress=None):
+    """Fill missing snapshots of one details table; returns the lines filled
+
+    `cursor` must be a tuple (non-dictionary) cursor. Lines whose product
+    no longer exists keep their unit price but no name.
+    """
+    progress = progress or (lambda fraction, message: None)
+    cursor.execute(f"SELECT MIN(order_id), MAX(order_id) FROM {details_table} WHERE product_name IS NULL")
+    first, last = cursor.fetchone()
+    if conn.in_transaction:
+        conn.commit()
+    if first is None:
+        return 0
+    filled = 0
+    for start in range(first, last + 1, batch_size):
+        if not conn.in_transaction:
+            conn.start_transaction()
+        try:
+            cursor.execute(f"""
+                UPDATE {details_table} od
+                LEFT JOIN products p ON p.product_id = od.product_id
+                LEFT JOIN uom u ON u.uom_id = p.uom_id
+                SET od.product_name = p.name,
+                    od.uom_name = u.uom_name,
+                    od.unit_price = ROUND(od.total_price / NULLIF(od.quantity, 0), 4)
+                WHERE od.order_id >= %s AND od.order_id < %s
+                AND od.product_name IS NULL
+            """, (start, start + batch_size))
+            filled += cursor.rowcount
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+        progress((start - first + batch_size) / (last - first + 1),
+                 f"{details_table}: {filled:,} lines filled")
+        if pause:
+            # Give OLTP traffic room between batches
+            time.sleep(pause)
+    return filled
+
+
+def backfill(conn, cursor, batch_size=BATCH_SIZE, pause=0.0, progress=None):
+    """Backfill hot and archived order lines; returns {table: lines filled}"""
+    return {table: backfill_table(conn, cursor, table, batch_size, pause, progress)
+            for table in DETAILS_TABLES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill product snapshots of existing order lines")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Order ids per batch")
+    parser.add_argument('--pause', type=float, default=0.05,
+                        help="Seconds to sleep between batches")
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    conn = None
+    cursor = None
+    try:
+        conn = connect(load_db_config())
+        cursor = conn.cursor()
+        started = time.monotonic()
+        results = backfill(conn, cursor, args.batch_size, args.pause)
+        for table, filled in results.items():
+            print(f"✅ {table}: {filled:,} lines filled")
+        print(f"Done in {time.monotonic() - started:.1f}s")
+        return True
+    except Error as e:
+        print(f"❌ Backfill failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
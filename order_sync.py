@@ -0,0 +1,185 @@
+"""
+Batched sync of orders queued offline by the checkout page
+Each order carries a client-generated UUID. A batch is validated, orders
+already stored under their UUID are reported as duplicates (a retried sync
+never creates an order twice), and the remaining orders with all of their
+lines are inserted with multi-row INSERTs in one transaction.
+
+Orders are priced on the server like POST /api/orders: a fresh cart quote
+for the same basket is kept as quoted, anything else goes through the
+promotions engine at the prices in effect when the order was taken.
+Totals and discounts sent by the client are ignored.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from mysql.connector import Error, errorcode
+
+from order_snapshots import product_snapshots
+from promotions import InvalidBasket, parse_basket, price_basket
+from stock_alerts import apply_stock_changes, decrement_stock
+
+MAX_BATCH = 500
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+UUID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+
+
+class InvalidOrder(ValueError):
+    """A queued order that can never be stored as sent"""
+
+
+def parse_order(raw, now=None):
+    """Validated order dict from one queued order, or raise InvalidOrder"""
+    if not isinstance(raw, dict):
+        raise InvalidOrder("Order must be an object")
+    client_uuid = str(raw.get('client_order_uuid', '')).lower()
+    if not UUID_PATTERN.match(client_uuid):
+        raise InvalidOrder("client_order_uuid must be a UUID")
+    try:
+        customer_id = int(raw['customer_id'])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidOrder("customer_id is required")
+    try:
+        basket = parse_basket(raw.get('items'))
+    except InvalidBasket as e:
+        raise InvalidOrder(str(e))
+
+    # Offline orders keep the time they were taken at the till and are
+    # priced as of then; clocks that run ahead are clamped to the server time
+    now = now or datetime.now()
+    created_at = now
+    priced_at = None
+    if raw.get('created_at'):
+        try:
+            created_at = datetime.fromisoformat(str(raw['created_at']).replace('Z', '+00:00'))
+        except ValueError:
+            raise InvalidOrder("created_at must be an ISO 8601 timestamp")
+        if created_at.tzinfo:
+            created_at = created_at.astimezone().replace(tzinfo=None)
+        if created_at > now + MAX_CLOCK_SKEW:
+            created_at = now
+        priced_at = min(created_at, now)
+    return {
+        'client_order_uuid': client_uuid,
+        'customer_id': customer_id,
+        'created_at': created_at,
+        'priced_at': priced_at,
+        'basket': basket,
+        'quote_id': str(raw['quote_id']) if raw.get('quote_id') else None,
+        # The quote the order is stored with: a matching cart quote, or
+        # priced during the sync
+        'quote': None,
+    }
+
+
+def _in_clause(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _existing_ids(cursor, query, values):
+    if not values:
+        return {}
+    cursor.execute(query.format(placeholders=_in_clause(values)), tuple(values))
+    return dict(cursor.fetchall())
+
+
+def _sync_once(conn, cursor, orders, index):
+    results = {}
+    uuids = [o['client_order_uuid'] for o in orders]
+    if not conn.in_transaction:
+        conn.start_transaction()
+    try:
+        existing = _existing_ids(cursor, """
+            SELECT client_order_uuid, order_id FROM orders
+            WHERE client_order_uuid IN ({placeholders})
+        """, uuids)
+        for uuid in existing:
+            results[uuid] = (DUPLICATE, existing[uuid], None)
+
+        pending = [o for o in orders if o['client_order_uuid'] not in existing]
+        customers = _existing_ids(cursor, """
+            SELECT customer_id, 1 FROM customers WHERE customer_id IN ({placeholders})
+        """, sorted({o['customer_id'] for o in pending}))
+        # {product_id: (name, uom_name)}, stored on the lines as sold
+        products = product_snapshots(cursor, {pid for o in pending for pid, _ in o['basket']})
+
+        new_orders = []
+        for order in pending:
+            if order['customer_id'] not in customers:
+                results[order['client_order_uuid']] = (REJECTED, None, "Customer no longer exists")
+            elif any(pid not in products for pid, _ in order['basket']):
+                results[order['client_order_uuid']] = (REJECTED, None, "Order contains a deleted product")
+            else:
+                try:
+                    if order['quote'] is None:
+                        order['quote'] = price_basket(cursor, index, order['basket'], order['priced_at'])
+                except InvalidBasket as e:
+                    results[order['client_order_uuid']] = (REJECTED, None, str(e))
+                    continue
+                new_orders.append(order)
+
+        if new_orders:
+            # executemany turns these into single multi-row INSERTs
+            cursor.executemany("""
+                INSERT INTO orders (customer_id, total, datetime, client_order_uuid)
+                VALUES (%s, %s, %s, %s)
+            """, [(o['customer_id'], o['quote']['total'], o['created_at'], o['client_order_uuid'])
+                  for o in new_orders])
+            order_ids = _existing_ids(cursor, """
+                SELECT client_order_uuid, order_id FROM orders
+                WHERE client_order_uuid IN ({placeholders})
+            """, [o['client_order_uuid'] for o in new_orders])
+            cursor.executemany("""
+                INSERT INTO order_details (order_id, product_id, quantity, total_price,
+                                           product_name, uom_name, unit_price, discount, promotion_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [(order_ids[o['client_order_uuid']], line['product_id'], line['quantity'], line['total_price'],
+                   line['product_name'], line['uom_name'], line['unit_price'], line['discount'],
+                   line['promotion']['promotion_id'] if line['promotion'] else None)
+                  for o in new_orders for line in o['quote']['lines']])
+            for order in new_orders:
+                results[order['client_order_uuid']] = (CREATED, order_ids[order['client_order_uuid']], None)
+
+        sold = {}
+        for order in new_orders:
+            for pid, quantity in order['basket']:
+                sold[pid] = sold.get(pid, 0.0) + quantity
+        decrement_stock(cursor, sold)
+        stock_changes = apply_stock_changes(cursor, sold)
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    return results, stock_changes
+
+
+def sync_orders(conn, cursor, orders, index, retries=1, on_stock_change=None):
+    """Store a batch of parsed orders; returns {uuid: (status, order_id, error)}
+
+    Orders whose 'quote' is not set from a matching cart quote are priced
+    with the promotions.PromotionIndex `index`; each stored order keeps the
+    quote it was stored with. `cursor` must be a tuple (non-dictionary)
+    cursor. If a concurrent sync of the same orders wins the race for a
+    UUID, the whole batch is retried and those orders come back as
+    duplicates. Sold quantities are taken off
+    stock; after the commit, on_stock_change(levels, alerts) gets the new
+    stock levels and low-stock crossings (see stock_alerts).
+    """
+    unique = {}
+    for order in orders:
+        unique.setdefault(order['client_order_uuid'], order)
+    unique = list(unique.values())
+    for attempt in range(retries + 1):
+        try:
+            results, (levels, alerts) = _sync_once(conn, cursor, unique, index)
+            if on_stock_change:
+                on_stock_change(levels, alerts)
+            return results
+        except Error as e:
+            if e.errno != errorcode.ER_DUP_ENTRY or attempt == retries:
+                raise
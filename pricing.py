@@ -0,0 +1,170 @@
+"""
+Effective-dated product prices
+Every price a product has had, or is scheduled to have, is a price_history
+row covering [effective_from, effective_to). The ranges of one product never
+overlap, so "price as of T" is a single probe of the
+(product_id, effective_from) index. A scheduled change is simply a row whose
+range starts in the future; readers pick it up when its time comes, so no
+job has to rewrite products when prices change.
+
+products.price_per_unit keeps the last price that took effect immediately
+and is the fallback for products without any history yet.
+"""
+
+from datetime import datetime
+
+# Start of the baseline range recorded for a product's first price change,
+# so lookups before that change still see the old price
+HISTORY_START = datetime(2000, 1, 1)
+
+# Join and column for the price in effect now; table alias p is products
+CURRENT_PRICE_JOIN = """
+    LEFT JOIN price_history ph ON ph.product_id = p.product_id
+        AND ph.effective_from <= NOW()
+        AND (ph.effective_to IS NULL OR ph.effective_to > NOW())
+"""
+CURRENT_PRICE = "COALESCE(ph.price_per_unit, p.price_per_unit)"
+
+_PRICES_AS_OF = """
+    SELECT p.product_id, COALESCE(ph.price_per_unit, p.price_per_unit) AS price_per_unit
+    FROM products p
+    LEFT JOIN price_history ph ON ph.product_id = p.product_id
+        AND ph.effective_from <= {at}
+        AND (ph.effective_to IS NULL OR ph.effective_to > {at})
+    WHERE p.product_id IN ({placeholders})
+"""
+
+
+def _scalar(row):
+    """First column of a row from a tuple or dictionary cursor"""
+    if row is None:
+        return None
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def prices_as_of(cursor, product_ids, at=None):
+    """{product_id: price} for a whole basket in one query
+
+    Prices are those in effect at `at`, or now (database time) by default.
+    Products that don't exist are left out.
+    """
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    query = _PRICES_AS_OF.format(at='%s' if at else 'NOW()', placeholders=', '.join(['%s'] * len(ids)))
+    params = (at, at) + tuple(ids) if at else tuple(ids)
+    cursor.execute(query, params)
+    prices = {}
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            prices[row['product_id']] = float(row['price_per_unit'])
+        else:
+            prices[row[0]] = float(row[1])
+    return prices
+
+
+def set_price(cursor, product_id, price, effective_from=None):
+    """Record `price` for a product from `effective_from` (now by default)
+
+    Runs in the caller's transaction and locks the product row, so changes
+    to one product are serialized. The new range ends where the next
+    scheduled change starts, and the range it interrupts is closed. An
+    immediate change to the price already in effect records nothing.
+    Returns False if the product does not exist.
+    """
+    cursor.execute("SELECT price_per_unit FROM products WHERE product_id = %s FOR UPDATE", (product_id,))
+    if cursor.fetchone() is None:
+        return False
+    cursor.execute("SELECT NOW()")
+    now = _scalar(cursor.fetchone())
+    immediate = effective_from is None or effective_from <= now
+    effective_from = effective_from or now
+
+    if immediate and prices_as_of(cursor, [product_id]).get(product_id) == float(price):
+        return True
+
+    # First change of a product: keep its old price for lookups before it
+    cursor.execute("""
+        INSERT INTO price_history (product_id, price_per_unit, effective_from, effective_to)
+        SELECT product_id, price_per_unit, %s, NULL FROM products
+        WHERE product_id = %s
+        AND NOT EXISTS (SELECT 1 FROM price_history WHERE product_id = %s)
+    """, (min(HISTORY_START, effective_from), product_id, product_id))
+
+    cursor.execute("""
+        SELECT MIN(effective_from) FROM price_history
+        WHERE product_id = %s AND effective_from > %s
+    """, (product_id, effective_from))
+    next_from = _scalar(cursor.fetchone())
+    cursor.execute("""
+        INSERT INTO price_history (product_id, price_per_unit, effective_from, effective_to)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE price_per_unit = VALUES(price_per_unit)
+    """, (product_id, price, effective_from, next_from))
+    cursor.execute("""
+        UPDATE price_history SET effective_to = %s
+        WHERE product_id = %s AND effective_from < %s
+        AND (effective_to IS NULL OR effective_to > %s)
+    """, (effective_from, product_id, effective_from, effective_from))
+
+    if immediate and (next_from is None or next_from > now):
+        cursor.execute("UPDATE products SET price_per_unit = %s WHERE product_id = %s", (price, product_id))
+    return True
+
+
+def set_prices(cursor, prices, batch_size=5000):
+    """Record immediate price changes for many products at once
+
+    The set-based version of set_price for catalog syncs: `prices` is
+    {product_id: new price} for products whose price actually changed.
+    Runs in the caller's transaction before products.price_per_unit is
+    rewritten; a statement handles each step for a whole batch.
+    """
+    if not prices:
+        return 0
+    cursor.execute("SELECT NOW()")
+    now = _scalar(cursor.fetchone())
+    ids = sorted(prices)
+    for offset in range(0, len(ids), batch_size):
+        batch = ids[offset:offset + batch_size]
+        placeholders = ', '.join(['%s'] * len(batch))
+        # Baselines for products changing price for the first time
+        cursor.execute(f"""
+            INSERT INTO price_history (product_id, price_per_unit, effective_from, effective_to)
+            SELECT p.product_id, p.price_per_unit, %s, NULL FROM products p
+            WHERE p.product_id IN ({placeholders})
+            AND NOT EXISTS (SELECT 1 FROM price_history h WHERE h.product_id = p.product_id)
+        """, (HISTORY_START,) + tuple(batch))
+        cursor.execute(f"""
+            UPDATE price_history SET effective_to = %s
+            WHERE product_id IN ({placeholders})
+            AND effective_from < %s AND (effective_to IS NULL OR effective_to > %s)
+        """, (now,) + tuple(batch) + (now, now))
+        cursor.executemany("""
+            INSERT INTO price_history (product_id, price_per_unit, effective_from, effective_to)
+            VALUES (%s, %s, %s, NULL)
+            ON DUPLICATE KEY UPDATE price_per_unit = VALUES(price_per_unit)
+        """, [(product_id, prices[product_id], now) for product_id in batch])
+        # New ranges end where an already scheduled change begins
+        cursor.execute(f"""
+            UPDATE price_history h
+            JOIN (
+                SELECT product_id, MIN(effective_from) AS next_from FROM price_history
+                WHERE product_id IN ({placeholders}) AND effective_from > %s
+                GROUP BY product_id
+            ) scheduled ON scheduled.product_id = h.product_id
+            SET h.effective_to = scheduled.next_from
+            WHERE h.effective_from = %s
+        """, tuple(batch) + (now, now))
+    return len(ids)
+
+
+def price_history(cursor, product_id):
+    """All price ranges of a product, oldest first (dictionary cursor)"""
+    cursor.execute("""
+        SELECT price_per_unit, effective_from, effective_to, created_at
+        FROM price_history
+        WHERE product_id = %s
+        ORDER BY effective_from
+    """, (product_id,))
+    return cursor.fetchall()
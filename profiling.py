@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiling of single requests
+A request is profiled when it carries a valid signed token (X-Profile
+header or ?profile= query flag) or is picked by PROFILE_SAMPLE_RATE. The
+default mode samples the request thread's stack every few milliseconds,
+which yields collapsed stacks for flamegraphs. mode=cprofile runs cProfile
+instead, for exact call counts. SQL run through the app's cursors is timed
+per statement in both modes.
+
+When no request is being profiled, the hooks are one context variable
+lookup per cursor.
+
+Tokens are "<expires>.<hmac>" signed with PROFILE_SECRET, so they can be
+handed out for a limited time without exposing the secret:
+
+    python profiling.py token --minutes 15
+"""
+
+import argparse
+import contextvars
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+HEADER = 'X-Profile'
+QUERY_FLAG = 'profile'
+MODE_HEADER = 'X-Profile-Mode'
+SAMPLE = 'sample'
+CPROFILE = 'cprofile'
+MODES = (SAMPLE, CPROFILE)
+SAMPLE_INTERVAL = 0.005
+MAX_SQL_STATEMENTS = 500
+KEEP_PROFILES = 200
+TOP_FUNCTIONS = 30
+
+_current = contextvars.ContextVar('request_profile', default=None)
+# cProfile replaces the interpreter's profile hook, so one at a time
+_cprofile_lock = threading.Lock()
+
+
+def sign(secret, expires):
+    return hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+
+
+def make_token(secret, ttl=900, now=None):
+    expires = int((now or time.time()) + ttl)
+    return f"{expires}.{sign(secret, expires)}"
+
+
+def verify_token(secret, token, now=None):
+    """True for an unexpired token signed with `secret`"""
+    if not secret or not token:
+        return False
+    expires, _, signature = token.partition('.')
+    if not expires.isdigit() or int(expires) < (now or time.time()):
+        return False
+    return hmac.compare_digest(signature, sign(secret, expires))
+
+
+class Profiler:
+    """Decides which requests are profiled (PROFILE_SECRET, PROFILE_SAMPLE_RATE %)"""
+
+    def __init__(self, secret=None, sample_rate=0.0):
+        self.secret = secret
+        self.sample_rate = sample_rate / 100.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv('PROFILE_SECRET') or None, float(os.getenv('PROFILE_SAMPLE_RATE', '0')))
+
+    @property
+    def enabled(self):
+        return bool(self.secret) or self.sample_rate > 0
+
+    def wanted(self, request):
+        """(mode, trigger) if this Flask request should be profiled, else None"""
+        token = request.headers.get(HEADER) or request.args.get(QUERY_FLAG)
+        if token:
+            if not verify_token(self.secret, token):
+                return None
+            mode = request.headers.get(MODE_HEADER) or request.args.get('profile_mode') or SAMPLE
+            return (mode if mode in MODES else SAMPLE), 'token'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return SAMPLE, 'sampled'
+        return None
+
+
+class RequestProfile:
+    """Stack samples or cProfile stats, plus SQL timings, of one request"""
+
+    def __init__(self, mode=SAMPLE, interval=SAMPLE_INTERVAL):
+        self.mode = mode
+        self.interval = interval
+        self.samples = Counter()
+        self.sql = []
+        self.sql_seconds = 0.0
+        self.sql_count = 0
+        self.stats = None
+        self.started = None
+        self.duration = None
+        self._profile = None
+        self._stop = threading.Event()
+        self._sampler = None
+        self._token = None
+
+    def start(self):
+        self._token = _current.set(self)
+        self.started = time.perf_counter()
+        if self.mode == CPROFILE and _cprofile_lock.acquire(blocking=False):
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            # Also the fallback while another request holds cProfile
+            self.mode = SAMPLE
+            thread_id = threading.get_ident()
+            self._sampler = threading.Thread(target=self._sample, args=(thread_id,),
+                                             name='request-profiler', daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._profile:
+            self._profile.disable()
+            _cprofile_lock.release()
+            self.stats = pstats.Stats(self._profile)
+            self._profile = None
+        if self._sampler:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if self._token:
+            _current.reset(self._token)
+            self._token = None
+        self.duration = time.perf_counter() - self.started
+
+    def _sample(self, thread_id):
+        own_file = __file__
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if self._stop.is_set():
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != own_file:
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def add_sql(self, statement, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        if len(self.sql) < MAX_SQL_STATEMENTS:
+            self.sql.append({'sql': ' '.join(str(statement).split())[:1000], 'ms': round(seconds * 1000, 3)})
+
+    def collapsed(self):
+        """Collapsed stacks ("frame;frame;frame count" lines) for flamegraph tools"""
+        if self.stats is not None:
+            return _collapsed_from_stats(self.stats)
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def top_functions(self, limit=TOP_FUNCTIONS):
+        """Functions with the most own time (cProfile) or samples (sampling)"""
+        if self.stats is not None:
+            rows = sorted(self.stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+            return [{'function': _label(func), 'calls': calls, 'own_ms': round(own * 1000, 3),
+                     'total_ms': round(total * 1000, 3)}
+                    for func, (_, calls, own, total, _) in rows]
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return [{'function': function, 'samples': count} for function, count in leaves.most_common(limit)]
+
+    def pstats_dump(self):
+        """marshal dump loadable with pstats.Stats(path), or None in sampling mode"""
+        return marshal.dumps(self.stats.stats) if self.stats is not None else None
+
+
+def _label(func):
+    filename, line, name = func
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def _collapsed_from_stats(stats):
+    # cProfile keeps caller -> callee edges rather than stacks; each function's
+    # own time is attributed along its heaviest caller chain
+    lines = Counter()
+    for func, (_, _, own, _, callers) in stats.stats.items():
+        chain = [func]
+        seen = {func}
+        current = func
+        while True:
+            parents = stats.stats[current][4] if current in stats.stats else {}
+            parents = [caller for caller in parents if caller not in seen]
+            if not parents:
+                break
+            current = max(parents, key=lambda caller: stats.stats[current][4][caller][3])
+            seen.add(current)
+            chain.append(current)
+        micros = int(own * 1_000_000)
+        if micros:
+            lines[';'.join(_label(f) for f in reversed(chain))] += micros
+    return ''.join(f"{stack} {count}\n" for stack, count in lines.most_common())
+
+
+def current():
+    """The profile of the running request, or None"""
+    return _current.get()
+
+
+@contextmanager
+def _timer(profile, statement):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_sql(statement, time.perf_counter() - started)
+
+
+def sql_timer(statement):
+    """Context manager timing one statement of a profiled request"""
+    profile = _current.get()
+    return _timer(profile, statement) if profile else nullcontext()
+
+
+class TimedCursor:
+    """Cursor wrapper that reports execute() timings to a profile"""
+
+    def __init__(self, cursor, profile):
+        self._cursor = cursor
+        self._profile = profile
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        with _timer(self._profile, operation):
+            return self._cursor.execute(operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        with _timer(self._profile, operation):
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Connection wrapper whose cursors are TimedCursors"""
+
+    def __init__(self, conn, profile):
+        self._conn = conn
+        self._profile = profile
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs), self._profile)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def timed_cursor(cursor):
+    profile = _current.get()
+    return TimedCursor(cursor, profile) if profile else cursor
+
+
+def timed_connection(conn):
+    profile = _current.get()
+    return TimedConnection(conn, profile) if profile else conn
+
+
+def save_profile(conn, cursor, profile, route, method, path, status, trigger, keep=KEEP_PROFILES):
+    """Store a finished profile and drop the oldest beyond `keep`; returns its id"""
+    cursor.execute("""
+        INSERT INTO request_profiles
+            (route, method, path, status, mode, triggered_by, duration_ms, sql_count, sql_ms,
+             top_functions, sql_statements, collapsed, pstats, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+    """, (route, method, path[:255], status, profile.mode, trigger,
+          round(profile.duration * 1000, 3), profile.sql_count, round(profile.sql_seconds * 1000, 3),
+          json.dumps(profile.top_functions()), json.dumps(profile.sql), profile.collapsed(),
+          profile.pstats_dump()))
+    profile_id = cursor.lastrowid
+    cursor.execute("""
+        DELETE FROM request_profiles WHERE profile_id < (
+            SELECT oldest FROM (
+                SELECT profile_id AS oldest FROM request_profiles
+                ORDER BY profile_id DESC LIMIT 1 OFFSET %s
+            ) kept
+        )
+    """, (keep - 1,))
+    conn.commit()
+    return profile_id
+
+
+def format_pstats(data, limit=TOP_FUNCTIONS):
+    """Text report of a stored pstats dump, sorted by cumulative time"""
+    stats = pstats.Stats(_StatsSource(marshal.loads(data)), stream=io.StringIO())
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stats.stream.getvalue()
+
+
+class _StatsSource:
+    # pstats.Stats accepts any object with create_stats() and a stats dict
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request profiling helpers")
+    commands = parser.add_subparsers(dest='command', required=True)
+    token = commands.add_parser('token', help="Print a signed X-Profile header value")
+    token.add_argument('--minutes', type=float, default=15)
+    args = parser.parse_args()
+
+    secret = os.getenv('PROFILE_SECRET')
+    if not secret:
+        print("❌ PROFILE_SECRET is not set")
+        return False
+    value = make_token(secret, args.minutes * 60)
+    print(f"{HEADER}: {value}")
+    print(f"or append ?{QUERY_FLAG}={value} (add {MODE_HEADER}: {CPROFILE} for cProfile)")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,366 @@
+"""
+Promotions engine for basket quotes
+A basket is priced at the prices in effect now, then each line gets the
+best promotion that applies to it (promotions don't stack):
+
+- quantity_break: from min_quantity units the line is charged unit_price,
+  or percent_off the list price; the highest break reached applies
+- multi_buy: every buy_quantity units are charged as pay_quantity ("3 for 2")
+- category: percent_off every product of a category, from min_quantity units
+
+Active rules are compiled into a dict of product_id -> rules, with
+category rules copied onto each product of their category and quantity
+breaks sorted for a bisect, so pricing a basket looks at its own lines
+only, however many promotions exist. The compiled index is rebuilt when
+the promotions or product categories change, and when a promotion starts
+or ends. Category changes are noticed through a version in change_markers
+that only category writes bump, since products.updated_at also moves on
+every sale.
+"""
+
+import threading
+import time
+from bisect import bisect_right
+
+from order_snapshots import product_snapshots
+from pricing import prices_as_of
+
+QUANTITY_BREAK = 'quantity_break'
+MULTI_BUY = 'multi_buy'
+CATEGORY = 'category'
+KINDS = (QUANTITY_BREAK, MULTI_BUY, CATEGORY)
+
+REFRESH_SECONDS = 5.0
+MAX_LINES = 500
+
+RULE_COLUMNS = """
+    promotion_id, name, kind, product_id, category, min_quantity, percent_off, unit_price,
+    buy_quantity, pay_quantity, starts_at, ends_at
+"""
+CATEGORIES_MARKER = 'product_categories'
+# Changes to promotions, and to product categories, trigger a rebuild
+FINGERPRINT_QUERY = f"""
+    SELECT COUNT(*) AS rules, MAX(updated_at) AS changed_at, NOW() AS db_now,
+           (SELECT version FROM change_markers WHERE name = '{CATEGORIES_MARKER}') AS categories_version
+    FROM promotions
+"""
+ACTIVE_RULES_QUERY = f"""
+    SELECT {RULE_COLUMNS} FROM promotions
+    WHERE active AND (ends_at IS NULL OR ends_at > NOW())
+"""
+
+
+def mark_categories_changed(cursor):
+    """Bump the category version every worker's index watches
+
+    Call it in the transaction that sets, changes or clears a product's
+    category.
+    """
+    cursor.execute("""
+        INSERT INTO change_markers (name, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, (CATEGORIES_MARKER,))
+
+
+class InvalidBasket(ValueError):
+    """A basket that can't be priced as sent"""
+
+
+class InvalidPromotion(ValueError):
+    """A promotion definition that is incomplete or inconsistent"""
+
+
+def _number(data, field, cast=float, required=False):
+    value = data.get(field)
+    if value is None or value == '':
+        if required:
+            raise InvalidPromotion(f"{field} is required")
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise InvalidPromotion(f"{field} must be a number")
+
+
+def parse_promotion(data, parse_datetime):
+    """Validated promotion dict from an API payload, or raise InvalidPromotion
+
+    `parse_datetime(value, field)` turns the optional starts_at / ends_at
+    values into datetimes, raising ValueError for bad input.
+    """
+    if not isinstance(data, dict):
+        raise InvalidPromotion("Promotion must be an object")
+    name = str(data.get('name') or '').strip()
+    if not 1 <= len(name) <= 100:
+        raise InvalidPromotion("Promotion name must be between 1 and 100 characters")
+    kind = data.get('kind')
+    if kind not in KINDS:
+        raise InvalidPromotion(f"kind must be one of: {', '.join(KINDS)}")
+
+    rule = {
+        'name': name,
+        'kind': kind,
+        'product_id': _number(data, 'product_id', int, required=kind != CATEGORY),
+        'category': None,
+        'min_quantity': _number(data, 'min_quantity') or 0.0,
+        'percent_off': _number(data, 'percent_off'),
+        'unit_price': _number(data, 'unit_price'),
+        'buy_quantity': None,
+        'pay_quantity': None,
+    }
+    if rule['min_quantity'] < 0:
+        raise InvalidPromotion("min_quantity must not be negative")
+    if rule['percent_off'] is not None and not 0 < rule['percent_off'] <= 100:
+        raise InvalidPromotion("percent_off must be between 0 and 100")
+
+    if kind == QUANTITY_BREAK:
+        if (rule['percent_off'] is None) == (rule['unit_price'] is None):
+            raise InvalidPromotion("A quantity break needs either percent_off or unit_price")
+        if rule['unit_price'] is not None and rule['unit_price'] < 0:
+            raise InvalidPromotion("unit_price must not be negative")
+    elif kind == MULTI_BUY:
+        rule['buy_quantity'] = _number(data, 'buy_quantity', int, required=True)
+        rule['pay_quantity'] = _number(data, 'pay_quantity', int, required=True)
+        if not 0 <= rule['pay_quantity'] < rule['buy_quantity']:
+            raise InvalidPromotion("pay_quantity must be less than buy_quantity")
+        rule['percent_off'] = rule['unit_price'] = None
+    else:
+        rule['category'] = str(data.get('category') or '').strip() or None
+        if rule['category'] is None or len(rule['category']) > 45:
+            raise InvalidPromotion("A category promotion needs a category (max 45 characters)")
+        if rule['percent_off'] is None:
+            raise InvalidPromotion("A category promotion needs percent_off")
+        rule['unit_price'] = None
+
+    try:
+        rule['starts_at'] = parse_datetime(data['starts_at'], 'starts_at') if data.get('starts_at') else None
+        rule['ends_at'] = parse_datetime(data['ends_at'], 'ends_at') if data.get('ends_at') else None
+    except ValueError as e:
+        raise InvalidPromotion(str(e))
+    if rule['starts_at'] and rule['ends_at'] and rule['ends_at'] <= rule['starts_at']:
+        raise InvalidPromotion("ends_at must be after starts_at")
+    return rule
+
+
+def parse_basket(items):
+    """[(product_id, quantity)] with repeated products merged, or raise InvalidBasket"""
+    if not isinstance(items, list) or not items:
+        raise InvalidBasket("items must be a non-empty list")
+    if len(items) > MAX_LINES:
+        raise InvalidBasket(f"At most {MAX_LINES} lines per basket")
+    quantities = {}
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = float(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidBasket("Each item needs a product_id and a quantity")
+        if quantity <= 0:
+            raise InvalidBasket("Quantities must be positive")
+        quantities[product_id] = quantities.get(product_id, 0.0) + quantity
+    return list(quantities.items())
+
+
+class ProductRules:
+    """The active promotions of one product, ready for evaluation"""
+
+    __slots__ = ('break_quantities', 'breaks', 'others')
+
+    def __init__(self):
+        self.break_quantities = []
+        self.breaks = []
+        self.others = []
+
+    def add(self, rule):
+        if rule['kind'] == QUANTITY_BREAK:
+            at = bisect_right(self.break_quantities, rule['min_quantity'])
+            self.break_quantities.insert(at, rule['min_quantity'])
+            self.breaks.insert(at, rule)
+        else:
+            self.others.append(rule)
+
+    def best(self, quantity, price, subtotal):
+        """(discount, rule) of the best promotion for a line, or (0.0, None)"""
+        best_discount, best_rule = 0.0, None
+        candidates = list(self.others)
+        reached = bisect_right(self.break_quantities, quantity)
+        if reached:
+            candidates.append(self.breaks[reached - 1])
+        for rule in candidates:
+            discount = _discount(rule, quantity, price, subtotal)
+            if discount > best_discount or (
+                    discount == best_discount and best_rule is not None
+                    and rule['promotion_id'] < best_rule['promotion_id']):
+                best_discount, best_rule = discount, rule
+        return best_discount, best_rule
+
+
+def _discount(rule, quantity, price, subtotal):
+    if quantity < rule['min_quantity']:
+        return 0.0
+    if rule['kind'] == QUANTITY_BREAK:
+        if rule['unit_price'] is not None:
+            charged = round(rule['unit_price'] * quantity, 2)
+        else:
+            charged = round(price * (1 - rule['percent_off'] / 100) * quantity, 2)
+        discount = subtotal - charged
+    elif rule['kind'] == MULTI_BUY:
+        free_units = int(quantity // rule['buy_quantity']) * (rule['buy_quantity'] - rule['pay_quantity'])
+        discount = round(free_units * price, 2)
+    else:
+        discount = round(subtotal * rule['percent_off'] / 100, 2)
+    return round(min(max(discount, 0.0), subtotal), 2)
+
+
+def compile_rules(rules, categories, now):
+    """({product_id: ProductRules}, next change) from active promotion rows
+
+    `categories` is {category: [product_id, ...]}. Rules that start after
+    `now` are left out; the returned datetime is the earliest start or end
+    after `now` (None if there is none), when the index must be rebuilt.
+    """
+    index = {}
+    boundaries = []
+    for row in rules:
+        if row['ends_at'] is not None and row['ends_at'] > now:
+            boundaries.append(row['ends_at'])
+        if row['starts_at'] is not None and row['starts_at'] > now:
+            boundaries.append(row['starts_at'])
+            continue
+        rule = {
+            'promotion_id': row['promotion_id'],
+            'name': row['name'],
+            'kind': row['kind'],
+            'min_quantity': float(row['min_quantity'] or 0),
+            'percent_off': float(row['percent_off']) if row['percent_off'] is not None else None,
+            'unit_price': float(row['unit_price']) if row['unit_price'] is not None else None,
+            'buy_quantity': row['buy_quantity'],
+            'pay_quantity': row['pay_quantity'],
+        }
+        if row['kind'] == CATEGORY:
+            product_ids = categories.get(row['category'], ())
+        elif row['product_id'] is not None:
+            product_ids = (row['product_id'],)
+        else:
+            product_ids = ()
+        for product_id in product_ids:
+            index.setdefault(product_id, ProductRules()).add(rule)
+    return index, min(boundaries, default=None)
+
+
+class PromotionIndex:
+    """Compiled active promotions of one store's database
+
+    Quotes read the current dict without locking; a rebuild swaps in a new
+    one. Other workers' promotion writes are noticed by a cheap fingerprint
+    check every few seconds.
+    """
+
+    def __init__(self, refresh_seconds=REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._rules = {}
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._refreshed_at = 0.0
+        self._rebuild_at = None
+        self._compiled_at = None
+
+    @property
+    def loaded(self):
+        return self._fingerprint is not None
+
+    def needs_refresh(self):
+        now = time.monotonic()
+        return (not self.loaded or now - self._refreshed_at >= self.refresh_seconds
+                or (self._rebuild_at is not None and now >= self._rebuild_at))
+
+    def invalidate(self):
+        """Rebuild on next use, after a promotion or category write by this worker"""
+        with self._lock:
+            self._fingerprint = None
+
+    def refresh(self, cursor):
+        """Rebuild the index if promotions changed or one started or ended
+
+        `cursor` must be a dictionary cursor. Only one thread rebuilds at a
+        time; the others keep quoting from the current index.
+        """
+        if not self._lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            now = time.monotonic()
+            if not self.needs_refresh():
+                return
+            cursor.execute(FINGERPRINT_QUERY)
+            marks = cursor.fetchone()
+            fingerprint = (marks['rules'], marks['changed_at'], marks['categories_version'])
+            due = self._rebuild_at is not None and now >= self._rebuild_at
+            if fingerprint != self._fingerprint or due:
+                cursor.execute(ACTIVE_RULES_QUERY)
+                rules = cursor.fetchall()
+                wanted = sorted({row['category'] for row in rules if row['kind'] == CATEGORY})
+                categories = {}
+                if wanted:
+                    cursor.execute(f"""
+                        SELECT product_id, category FROM products
+                        WHERE category IN ({', '.join(['%s'] * len(wanted))})
+                    """, tuple(wanted))
+                    for row in cursor.fetchall():
+                        categories.setdefault(row['category'], []).append(row['product_id'])
+                self._rules, next_change = compile_rules(rules, categories, marks['db_now'])
+                self._rebuild_at = (now + (next_change - marks['db_now']).total_seconds()
+                                    if next_change else None)
+                self._fingerprint = fingerprint
+                self._compiled_at = now
+            self._refreshed_at = now
+        finally:
+            self._lock.release()
+
+    def rules_for(self, product_id):
+        return self._rules.get(product_id)
+
+    def stats(self):
+        return {
+            'products': len(self._rules),
+            'loaded': self.loaded,
+            'seconds_since_compile': round(time.monotonic() - self._compiled_at, 1) if self._compiled_at else None,
+        }
+
+
+def price_basket(cursor, index, basket, at=None):
+    """Quote for a parsed basket: lines with list price, discount and total
+
+    Prices and product snapshots are read in one query each; promotions
+    come from the compiled index. List prices are those in effect at `at`
+    (now by default), for orders taken offline. Raises InvalidBasket for
+    products that don't exist.
+    """
+    product_ids = [product_id for product_id, _ in basket]
+    prices = prices_as_of(cursor, product_ids, at)
+    snapshots = product_snapshots(cursor, product_ids)
+    lines = []
+    for product_id, quantity in basket:
+        if product_id not in prices or product_id not in snapshots:
+            raise InvalidBasket(f"Unknown product: {product_id}")
+        price = prices[product_id]
+        subtotal = round(price * quantity, 2)
+        rules = index.rules_for(product_id)
+        discount, rule = rules.best(quantity, price, subtotal) if rules else (0.0, None)
+        product_name, uom_name = snapshots[product_id]
+        lines.append({
+            'product_id': product_id,
+            'product_name': product_name,
+            'uom_name': uom_name,
+            'quantity': quantity,
+            'unit_price': price,
+            'subtotal': subtotal,
+            'discount': discount,
+            'total_price': round(subtotal - discount, 2),
+            'promotion': {'promotion_id': rule['promotion_id'], 'name': rule['name']} if rule else None,
+        })
+    return {
+        'lines': lines,
+        'subtotal': round(sum(line['subtotal'] for line in lines), 2),
+        'discount': round(sum(line['discount'] for line in lines), 2),
+        'total': round(sum(line['total_price'] for line in lines), 2),
+    }
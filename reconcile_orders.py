@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Reconcile order totals against their lines
+orders.total is what the client sent. A run scans orders in order_id ranges
+on a pool of worker threads, each with its own connection, and compares
+every total with SUM(order_details.total_price) and with quantity x the
+price in effect when the order was placed, less the promotion discount
+recorded on each line. Mismatches go to order_discrepancies.
+
+Each chunk's findings are committed together with its checkpoint row in
+reconciliation_chunks, so an interrupted run resumes where it stopped
+without checking or recording any order twice. Only one chunk per worker
+is held in memory. Fixing sets orders.total to the sum of its lines, in
+batches, for orders not changed since they were checked.
+
+Archived orders are history and are not reconciled.
+
+Usage: python reconcile_orders.py [--workers 4] [--resume] [--fix]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from mysql.connector import Error
+
+CHUNK_SIZE = 10000
+WORKERS = 4
+FIX_BATCH_SIZE = 1000
+TOLERANCE = 0.01
+
+RUNNING = 'running'
+INTERRUPTED = 'interrupted'
+DONE = 'done'
+
+CHUNK_QUERY = """
+    SELECT o.order_id, o.total, COUNT(od.product_id),
+           COALESCE(SUM(od.total_price), 0),
+           COALESCE(SUM(od.quantity * COALESCE(ph.price_per_unit, p.price_per_unit) - od.discount), 0)
+    FROM orders o
+    LEFT JOIN order_details od ON od.order_id = o.order_id
+    LEFT JOIN products p ON p.product_id = od.product_id
+    LEFT JOIN price_history ph ON ph.product_id = od.product_id
+        AND ph.effective_from <= o.datetime
+        AND (ph.effective_to IS NULL OR ph.effective_to > o.datetime)
+    WHERE o.order_id >= %s AND o.order_id < %s
+    GROUP BY o.order_id, o.total
+"""
+
+INSERT_DISCREPANCY = """
+    INSERT INTO order_discrepancies
+        (run_id, order_id, recorded_total, lines_total, priced_total, line_count,
+         total_mismatch, price_mismatch)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        recorded_total = VALUES(recorded_total),
+        lines_total = VALUES(lines_total),
+        priced_total = VALUES(priced_total),
+        line_count = VALUES(line_count),
+        total_mismatch = VALUES(total_mismatch),
+        price_mismatch = VALUES(price_mismatch)
+"""
+
+
+def compare(rows, tolerance=TOLERANCE):
+    """Discrepancy tuples (order_id, total, lines, priced, count, total_bad, price_bad)
+
+    `rows` are CHUNK_QUERY results. An order without lines only counts as
+    a total mismatch when its total isn't zero.
+    """
+    found = []
+    for order_id, total, line_count, lines_total, priced_total in rows:
+        total, lines_total, priced_total = float(total), float(lines_total), float(priced_total)
+        total_mismatch = abs(total - lines_total) > tolerance
+        price_mismatch = abs(lines_total - priced_total) > tolerance
+        if total_mismatch or price_mismatch:
+            found.append((order_id, total, round(lines_total, 2), round(priced_total, 2),
+                          line_count, total_mismatch, price_mismatch))
+    return found
+
+
+def check_chunk(conn, cursor, run, chunk_start):
+    """Check orders [chunk_start, chunk_start + chunk_size) and checkpoint them
+
+    Returns (orders, discrepancies). Functions in this module expect tuple
+    (non-dictionary) cursors.
+    """
+    chunk_end = chunk_start + run['chunk_size']
+    cursor.execute(CHUNK_QUERY, (chunk_start, chunk_end))
+    rows = cursor.fetchall()
+    found = compare(rows, run['tolerance'])
+    if conn.in_transaction:
+        conn.commit()
+    conn.start_transaction()
+    try:
+        if found:
+            cursor.executemany(INSERT_DISCREPANCY, [(run['run_id'],) + row for row in found])
+        cursor.execute("""
+            INSERT INTO reconciliation_chunks (run_id, chunk_start, orders, discrepancies, checked_at)
+            VALUES (%s, %s, %s, %s, NOW())
+        """, (run['run_id'], chunk_start, len(rows), len(found)))
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    return len(rows), len(found)
+
+
+def start_run(conn, cursor, chunk_size=CHUNK_SIZE, tolerance=TOLERANCE):
+    """New run over every order that exists now"""
+    cursor.execute("SELECT COALESCE(MIN(order_id), 0), COALESCE(MAX(order_id), -1) FROM orders")
+    first, last = cursor.fetchone()
+    cursor.execute("""
+        INSERT INTO reconciliation_runs
+            (status, first_order_id, last_order_id, chunk_size, tolerance, started_at)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+    """, (RUNNING, first, last, chunk_size, tolerance))
+    run_id = cursor.lastrowid
+    conn.commit()
+    return {'run_id': run_id, 'first_order_id': first, 'last_order_id': last,
+            'chunk_size': chunk_size, 'tolerance': tolerance}
+
+
+def resumable_run(cursor, run_id=None):
+    """The given run, or the newest one that didn't finish; None if there is none"""
+    query = """
+        SELECT run_id, first_order_id, last_order_id, chunk_size, tolerance, status
+        FROM reconciliation_runs
+    """
+    if run_id:
+        cursor.execute(query + " WHERE run_id = %s", (run_id,))
+    else:
+        cursor.execute(query + " WHERE status <> %s ORDER BY run_id DESC LIMIT 1", (DONE,))
+    row = cursor.fetchone()
+    if row is None or row[5] == DONE:
+        return None
+    return {'run_id': row[0], 'first_order_id': row[1], 'last_order_id': row[2],
+            'chunk_size': row[3], 'tolerance': row[4]}
+
+
+def pending_chunks(cursor, run):
+    """Chunk starts of a run that have no checkpoint yet, in order"""
+    cursor.execute("SELECT chunk_start FROM reconciliation_chunks WHERE run_id = %s", (run['run_id'],))
+    done = {row[0] for row in cursor.fetchall()}
+    starts = range(run['first_order_id'], run['last_order_id'] + 1, run['chunk_size'])
+    return [start for start in starts if start not in done]
+
+
+def set_status(conn, cursor, run_id, status):
+    cursor.execute("""
+        UPDATE reconciliation_runs
+        SET status = %s, finished_at = IF(%s = %s, NOW(), finished_at)
+        WHERE run_id = %s
+    """, (status, status, DONE, run_id))
+    conn.commit()
+
+
+def run_summary(cursor, run_id):
+    """Totals of a run from its checkpoints and findings"""
+    cursor.execute("""
+        SELECT r.status, r.first_order_id, r.last_order_id, r.started_at, r.finished_at,
+               COALESCE(c.chunks, 0), COALESCE(c.orders, 0)
+        FROM reconciliation_runs r
+        LEFT JOIN (
+            SELECT run_id, COUNT(*) AS chunks, SUM(orders) AS orders
+            FROM reconciliation_chunks WHERE run_id = %s GROUP BY run_id
+        ) c ON c.run_id = r.run_id
+        WHERE r.run_id = %s
+    """, (run_id, run_id))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    status, first, last, started_at, finished_at, chunks, orders = row
+    cursor.execute("""
+        SELECT COUNT(*), COALESCE(SUM(total_mismatch), 0), COALESCE(SUM(price_mismatch), 0),
+               COUNT(fixed_at)
+        FROM order_discrepancies WHERE run_id = %s
+    """, (run_id,))
+    discrepancies, total_mismatches, price_mismatches, fixed = cursor.fetchone()
+    return {
+        'run_id': run_id,
+        'status': status,
+        'first_order_id': first,
+        'last_order_id': last,
+        'started_at': started_at.isoformat() if started_at else None,
+        'finished_at': finished_at.isoformat() if finished_at else None,
+        'chunks_checked': int(chunks),
+        'orders_checked': int(orders),
+        'discrepancies': int(discrepancies),
+        'total_mismatches': int(total_mismatches),
+        'price_mismatches': int(price_mismatches),
+        'fixed': int(fixed),
+    }
+
+
+def reconcile(connect, resume=False, run_id=None, chunk_size=CHUNK_SIZE, workers=WORKERS,
+              tolerance=TOLERANCE, progress=None, check_cancelled=None):
+    """Check every order of a new or resumed run; returns the run summary
+
+    `connect` opens a new connection and is called once for the
+    coordinator and once per worker thread. A failed or cancelled run is
+    left 'interrupted' and can be resumed with resume=True (or its run_id).
+    """
+    progress = progress or (lambda fraction, message: None)
+    conn = connect()
+    cursor = conn.cursor()
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+
+    def worker_check(chunk_start):
+        if not hasattr(local, 'conn'):
+            local.conn = connect()
+            local.cursor = local.conn.cursor()
+            with opened_lock:
+                opened.append(local.conn)
+        return check_chunk(local.conn, local.cursor, run, chunk_start)
+
+    try:
+        run = resumable_run(cursor, run_id) if resume or run_id else None
+        if run_id and run is None:
+            raise ValueError(f"Run {run_id} does not exist or has already finished")
+        if run is None:
+            run = start_run(conn, cursor, chunk_size, tolerance)
+        else:
+            set_status(conn, cursor, run['run_id'], RUNNING)
+        chunks = pending_chunks(cursor, run)
+        if conn.in_transaction:
+            conn.commit()
+        total_chunks = len(range(run['first_order_id'], run['last_order_id'] + 1, run['chunk_size']))
+        finished = total_chunks - len(chunks)
+        found = 0
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='reconcile') as pool:
+                # A small window of submitted chunks keeps memory flat however
+                # many orders there are
+                queue = iter(chunks)
+                in_flight = set()
+                try:
+                    while True:
+                        for chunk_start in queue:
+                            in_flight.add(pool.submit(worker_check, chunk_start))
+                            if len(in_flight) >= workers * 2:
+                                break
+                        if not in_flight:
+                            break
+                        completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in completed:
+                            _, discrepancies = future.result()
+                            found += discrepancies
+                            finished += 1
+                        progress(finished / total_chunks if total_chunks else 1.0,
+                                 f"Checked {finished:,} of {total_chunks:,} chunks, {found:,} new discrepancies")
+                        if check_cancelled:
+                            check_cancelled()
+                except BaseException:
+                    # Chunks already running finish and keep their checkpoints
+                    for future in in_flight:
+                        future.cancel()
+                    raise
+        except BaseException:
+            set_status(conn, cursor, run['run_id'], INTERRUPTED)
+            raise
+        set_status(conn, cursor, run['run_id'], DONE)
+        return run_summary(cursor, run['run_id'])
+    finally:
+        for worker_conn in opened:
+            if worker_conn.is_connected():
+                worker_conn.close()
+        cursor.close()
+        conn.close()
+
+
+def fix_discrepancies(conn, cursor, run_id, batch_size=FIX_BATCH_SIZE, progress=None, check_cancelled=None):
+    """Set orders.total to the sum of its lines for a run's total mismatches
+
+    Each batch is one short transaction. Orders whose total changed after
+    the run checked them, and orders without lines, are left alone.
+    Returns the number of orders fixed.
+    """
+    progress = progress or (lambda fraction, message: None)
+    fixed = 0
+    last_id = -1
+    while True:
+        cursor.execute("""
+            SELECT order_id FROM order_discrepancies
+            WHERE run_id = %s AND order_id > %s AND total_mismatch AND fixed_at IS NULL AND line_count > 0
+            ORDER BY order_id
+            LIMIT %s
+        """, (run_id, last_id, batch_size))
+        order_ids = [row[0] for row in cursor.fetchall()]
+        if conn.in_transaction:
+            conn.commit()
+        if not order_ids:
+            return fixed
+        last_id = order_ids[-1]
+        placeholders = ', '.join(['%s'] * len(order_ids))
+        conn.start_transaction()
+        try:
+            cursor.execute(f"""
+                UPDATE orders o
+                JOIN order_discrepancies d ON d.order_id = o.order_id AND d.run_id = %s
+                SET o.total = d.lines_total, d.fixed_at = NOW()
+                WHERE d.order_id IN ({placeholders}) AND o.total = d.recorded_total
+            """, (run_id,) + tuple(order_ids))
+            # Multi-table UPDATE counts both tables' rows
+            fixed += cursor.rowcount // 2
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+        progress(None, f"Fixed {fixed:,} order totals")
+        if check_cancelled:
+            check_cancelled()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile order totals against their order lines")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Order ids per chunk")
+    parser.add_argument('--resume', action='store_true', help="Continue the newest unfinished run")
+    parser.add_argument('--run-id', type=int, help="Continue this run")
+    parser.add_argument('--fix', action='store_true', help="Correct mismatched totals after checking")
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    db_config = load_db_config()
+    try:
+        started = time.monotonic()
+        summary = reconcile(lambda: connect(db_config), args.resume, args.run_id, args.chunk_size,
+                            args.workers, progress=lambda fraction, message: print(message))
+        print(f"✅ Run {summary['run_id']}: {summary['orders_checked']:,} orders checked, "
+              f"{summary['total_mismatches']:,} total mismatches, "
+              f"{summary['price_mismatches']:,} line price mismatches "
+              f"in {time.monotonic() - started:.1f}s")
+        if args.fix:
+            conn = connect(db_config)
+            cursor = conn.cursor()
+            try:
+                fixed = fix_discrepancies(conn, cursor, summary['run_id'])
+            finally:
+                cursor.close()
+                conn.close()
+            print(f"✅ Fixed {fixed:,} order totals")
+        return True
+    except (Error, ValueError) as e:
+        print(f"❌ Reconciliation failed: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,163 @@
+"""
+Riding out database hiccups
+Errors are either transient (the server can't be reached, is overloaded
+or dropped the connection) or fatal (the server answered, e.g. a bad
+statement or a duplicate key). Deadlocks and lock wait timeouts are the
+caller's business: they say nothing about the server being down. Opening a
+connection is retried on transient errors with jittered exponential
+backoff. A circuit breaker per store opens after repeated transient
+failures, so requests fail at once instead of each waiting out the
+connect timeout. After a cool-down one trial call is let through, and its
+outcome closes the breaker or opens it again.
+
+Only connecting is retried: a statement that failed halfway through a
+transaction can't safely be replayed from here.
+"""
+
+import os
+import random
+import socket
+import threading
+import time
+
+from mysql.connector import errors
+
+# Server and client error numbers worth retrying or counting against the breaker
+TRANSIENT_ERRNOS = {
+    1040,  # too many connections
+    1053,  # server shutdown in progress
+    1927,  # connection was killed
+    2002,  # can't connect through socket
+    2003,  # can't connect to server
+    2006,  # server has gone away
+    2013,  # lost connection during query
+    2055,  # lost connection (system error)
+}
+
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 1.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 10.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """The breaker is open; the database is not being tried"""
+
+    def __init__(self, retry_after):
+        super().__init__("Database unavailable, circuit breaker is open")
+        self.retry_after = retry_after
+
+
+def is_transient(error):
+    """True if `error` (or the error it was raised from) is worth retrying"""
+    while error is not None:
+        if isinstance(error, errors.Error):
+            if error.errno in TRANSIENT_ERRNOS:
+                return True
+            # Connector errors raised before any server reply carry no errno
+            if error.errno in (None, -1) and isinstance(error, (errors.InterfaceError, errors.OperationalError)):
+                return True
+            return False
+        if isinstance(error, (socket.timeout, ConnectionError, TimeoutError)):
+            return True
+        error = error.__cause__
+    return False
+
+
+def backoff_delays(attempts=RETRY_ATTEMPTS, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Sleep before each retry: "full jitter", uniform up to an exponential cap
+
+    Jitter keeps many workers that failed together from retrying in step.
+    """
+    return [random.uniform(0, min(cap, base * 2 ** attempt)) for attempt in range(attempts - 1)]
+
+
+def retry(func, attempts=RETRY_ATTEMPTS, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY, sleep=time.sleep):
+    """func() retried on transient errors; the last error is raised"""
+    for delay in backoff_delays(attempts, base, cap):
+        try:
+            return func()
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            sleep(delay)
+    return func()
+
+
+class CircuitBreaker:
+    """Fails calls fast after `failure_threshold` transient failures in a row
+
+    Callers run before_call() (raises CircuitOpen), then report the outcome
+    with record_success() or record_failure().
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._trips = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(int(os.getenv('DB_BREAKER_THRESHOLD', str(FAILURE_THRESHOLD))),
+                   float(os.getenv('DB_BREAKER_RESET', str(RESET_TIMEOUT))))
+
+    def _retry_after(self):
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def is_open(self):
+        """True while calls would be rejected; doesn't claim the trial call"""
+        with self._lock:
+            if self._state == OPEN:
+                return self._retry_after() > 0
+            return self._state == HALF_OPEN and self._trial_running
+
+    def before_call(self):
+        with self._lock:
+            if self._state == OPEN:
+                if self._retry_after() > 0:
+                    self._rejected += 1
+                    raise CircuitOpen(self._retry_after())
+                self._state = HALF_OPEN
+                self._trial_running = False
+            if self._state == HALF_OPEN:
+                if self._trial_running:
+                    self._rejected += 1
+                    raise CircuitOpen(self.reset_timeout)
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._trips += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'trips': self._trips,
+                'rejected': self._rejected,
+                'retry_after_seconds': round(self._retry_after(), 3) if self._state == OPEN else 0,
+            }
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshots of order history
+Orders and their lines, with the product and UOM attributes reports group
+by, are exported to one directory per store and month holding one NumPy
+.npy file per column. Reports memory-map those files and aggregate them
+with array operations, so heavy analytical reads never reach MySQL.
+
+Rows are sorted by order day, so a date range is a contiguous slice of
+every column and is read without copying. Each export of a month goes to
+a new version directory that is published by atomically replacing the
+month's CURRENT file; readers keep using the version they opened.
+
+An incremental export appends orders with ids above the newest exported
+one to their months. The nightly full export rewrites every month from
+both the hot and the archive tables, which also picks up what an
+incremental run cannot see: orders committed out of id order, merged
+customers and reconciled totals.
+
+Usage: python sales_snapshots.py [--full] [--dir snapshots] [--store default]
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+from mysql.connector import Error
+
+import analytics
+from archive_orders import ARCHIVE_TABLES, HOT_TABLES
+
+CHUNK_SIZE = 50000
+# Versions of a month kept on disk: the current one and the one before, for
+# readers that opened it just before it was replaced
+KEEP_VERSIONS = 2
+
+ORDER_COLUMNS = (
+    ('day', 'datetime64[D]'),
+    ('order_id', 'int64'),
+    ('customer_id', 'int64'),
+    ('total', 'float64'),
+)
+LINE_COLUMNS = (
+    ('day', 'datetime64[D]'),
+    ('order_id', 'int64'),
+    ('product_id', 'int64'),
+    ('uom_id', 'int64'),
+    ('quantity', 'float64'),
+    ('total_price', 'float64'),
+    ('discount', 'float64'),
+    # Index into the month's categories list, -1 when the product has none
+    ('category', 'int32'),
+)
+
+# Order dates come back as days since 1970-01-01 so each chunk converts to
+# one float array, as in analytics.SALES_LINES_QUERY
+ORDERS_QUERY = """
+    SELECT DATEDIFF(o.datetime, '1970-01-01'), o.order_id, o.customer_id, o.total
+    FROM {orders_table} o
+    WHERE {condition}
+"""
+LINES_QUERY = """
+    SELECT DATEDIFF(o.datetime, '1970-01-01'), od.order_id, od.product_id,
+           COALESCE(p.uom_id, 0), od.quantity, od.total_price, COALESCE(od.discount, 0),
+           p.category, COALESCE(od.product_name, p.name), u.uom_name
+    FROM {details_table} od
+    JOIN {orders_table} o ON od.order_id = o.order_id
+    LEFT JOIN products p ON od.product_id = p.product_id
+    LEFT JOIN uom u ON p.uom_id = u.uom_id
+    WHERE {condition}
+"""
+MONTH_RANGE = "o.datetime >= %s AND o.datetime < %s"
+AFTER_ORDER = "o.order_id > %s"
+
+
+def store_path(root, store_id):
+    """Snapshot directory of one store"""
+    return os.path.join(root, store_id)
+
+
+def month_key(day):
+    """'YYYY-MM' of a date or datetime64 day"""
+    return str(np.datetime64(day, 'M'))
+
+
+def _write_json(path, data):
+    """Replace a JSON file atomically"""
+    _write_text(path, json.dumps(data))
+
+
+def _write_text(path, text):
+    """Replace a small text file atomically"""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+@contextmanager
+def _export_lock(store_dir):
+    """One exporter per store at a time (cron and the API job may overlap)"""
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Reading
+
+def read_state(store_dir):
+    """{high_water, exported_at, full_export_at} of a store, or None if never exported"""
+    return _read_json(os.path.join(store_dir, 'state.json'))
+
+
+def exported_months(store_dir):
+    """'YYYY-MM' of every published month, oldest first"""
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(name for name in os.listdir(store_dir)
+                  if os.path.isfile(os.path.join(store_dir, name, 'CURRENT')))
+
+
+def open_month(store_dir, month):
+    """Memory-mapped columns of a month's current version
+
+    Returns {'manifest': {...}, 'orders': {column: array},
+    'lines': {column: array}}; the arrays are read-only maps of the files.
+    """
+    month_dir = os.path.join(store_dir, month)
+    with open(os.path.join(month_dir, 'CURRENT'), encoding='utf-8') as f:
+        version_dir = os.path.join(month_dir, f.read().strip())
+    snapshot = {'manifest': _read_json(os.path.join(version_dir, 'manifest.json'))}
+    for table, columns in (('orders', ORDER_COLUMNS), ('lines', LINE_COLUMNS)):
+        snapshot[table] = {
+            name: np.load(os.path.join(version_dir, f"{table}.{name}.npy"), mmap_mode='r')
+            for name, _ in columns
+        }
+    return snapshot
+
+
+def open_months(store_dir, start=None, end=None):
+    """Yield (month, snapshot) for exported months overlapping [start, end)"""
+    first = month_key(start) if start else None
+    last = month_key(np.datetime64(end, 'D') - np.timedelta64(1, 'D')) if end else None
+    for month in exported_months(store_dir):
+        if (first is None or month >= first) and (last is None or month <= last):
+            yield month, open_month(store_dir, month)
+
+
+def day_window(days, start=None, end=None):
+    """Slice of a day-sorted column covering [start, end)"""
+    lo = np.searchsorted(days, np.datetime64(start, 'D')) if start else 0
+    hi = np.searchsorted(days, np.datetime64(end, 'D')) if end else len(days)
+    return slice(int(lo), int(hi))
+
+
+# Exporting
+
+class _Batch:
+    """Rows of one export, collected into typed column arrays"""
+
+    def __init__(self):
+        self.orders = {name: [] for name, _ in ORDER_COLUMNS}
+        self.lines = {name: [] for name, _ in LINE_COLUMNS}
+        self.products = {}
+        self.uoms = {}
+        self.categories = []
+        self._category_codes = {}
+
+    def add_orders(self, rows):
+        data = np.array(rows, dtype='float64')
+        for i, (name, dtype) in enumerate(ORDER_COLUMNS):
+            self.orders[name].append(_column(data[:, i], dtype))
+
+    def add_lines(self, rows):
+        data = np.array([row[:7] for row in rows], dtype='float64')
+        for i, (name, dtype) in enumerate(LINE_COLUMNS[:7]):
+            self.lines[name].append(_column(data[:, i], dtype))
+        self.lines['category'].append(np.array([self._category(row[7]) for row in rows], dtype='int32'))
+        for row in rows:
+            self.products[int(row[2])] = row[8]
+            if row[9] is not None:
+                self.uoms[int(row[3])] = row[9]
+
+    def _category(self, name):
+        if name is None:
+            return -1
+        if name not in self._category_codes:
+            self._category_codes[name] = len(self.categories)
+            self.categories.append(name)
+        return self._category_codes[name]
+
+    def arrays(self):
+        """({column: array} for orders, {column: array} for lines)"""
+        return (_concatenate(self.orders, ORDER_COLUMNS), _concatenate(self.lines, LINE_COLUMNS))
+
+
+def _column(values, dtype):
+    if dtype == 'datetime64[D]':
+        return values.astype('int64').astype(dtype)
+    return values.astype(dtype)
+
+
+def _concatenate(chunks, columns):
+    return {name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=dtype)
+            for name, dtype in columns}
+
+
+def _take(columns, selector):
+    return {name: values[selector] for name, values in columns.items()}
+
+
+def _fetch(cursor, batch, condition, params, sources, chunk_size=CHUNK_SIZE):
+    """Stream the orders and lines matching `condition` from every source into `batch`"""
+    for orders_table, details_table in sources:
+        for query, add in ((ORDERS_QUERY, batch.add_orders), (LINES_QUERY, batch.add_lines)):
+            cursor.execute(query.format(orders_table=orders_table, details_table=details_table,
+                                        condition=condition), params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                add(rows)
+
+
+def write_month(store_dir, month, orders, lines, products, uoms, categories):
+    """Publish a new version of one month; returns its manifest
+
+    Columns are sorted by (day, order_id) before they are written. The
+    version becomes visible when CURRENT is replaced, and all but the
+    newest KEEP_VERSIONS versions are removed.
+    """
+    month_dir = os.path.join(store_dir, month)
+    version = f"v{time.time_ns()}"
+    version_dir = os.path.join(month_dir, version)
+    os.makedirs(version_dir)
+    for table, columns, data in (('orders', ORDER_COLUMNS, orders), ('lines', LINE_COLUMNS, lines)):
+        order = np.lexsort((data['order_id'], data['day']))
+        for name, dtype in columns:
+            np.save(os.path.join(version_dir, f"{table}.{name}.npy"),
+                    np.ascontiguousarray(data[name][order], dtype=dtype))
+    manifest = {
+        'month': month,
+        'orders': int(len(orders['order_id'])),
+        'lines': int(len(lines['order_id'])),
+        'products': {str(product_id): name for product_id, name in sorted(products.items())},
+        'uoms': {str(uom_id): name for uom_id, name in sorted(uoms.items())},
+        'categories': list(categories),
+        'exported_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    _write_json(os.path.join(version_dir, 'manifest.json'), manifest)
+    _write_text(os.path.join(month_dir, 'CURRENT'), version)
+    versions = sorted(name for name in os.listdir(month_dir) if name.startswith('v'))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(month_dir, old), ignore_errors=True)
+    return manifest
+
+
+def _append_month(store_dir, month, orders, lines, batch):
+    """Merge newly exported rows into an existing month (or start it)"""
+    if not os.path.isfile(os.path.join(store_dir, month, 'CURRENT')):
+        return write_month(store_dir, month, orders, lines, batch.products, batch.uoms, batch.categories)
+    existing = open_month(store_dir, month)
+    manifest = existing['manifest']
+    categories = list(manifest['categories'])
+    # Re-encode the batch's category codes against the month's list; the
+    # trailing -1 keeps code -1 (no category) as it is
+    lookup = []
+    for name in batch.categories:
+        if name not in categories:
+            categories.append(name)
+        lookup.append(categories.index(name))
+    lines = dict(lines, category=np.array(lookup + [-1], dtype='int32')[lines['category']])
+    products = {int(k): v for k, v in manifest['products'].items()}
+    products.update(batch.products)
+    uoms = {int(k): v for k, v in manifest['uoms'].items()}
+    uoms.update(batch.uoms)
+    return write_month(
+        store_dir, month,
+        {name: np.concatenate([existing['orders'][name], orders[name]]) for name, _ in ORDER_COLUMNS},
+        {name: np.concatenate([existing['lines'][name], lines[name]]) for name, _ in LINE_COLUMNS},
+        products, uoms, categories)
+
+
+def _months(cursor, sources):
+    """'YYYY-MM' of every month with orders in any source"""
+    months = set()
+    for orders_table, _ in sources:
+        cursor.execute(f"SELECT DISTINCT DATE_FORMAT(datetime, '%Y-%m') FROM {orders_table}")
+        months.update(row[0] for row in cursor.fetchall())
+    return sorted(months)
+
+
+def _high_water(cursor, sources):
+    newest = 0
+    for orders_table, _ in sources:
+        cursor.execute(f"SELECT COALESCE(MAX(order_id), 0) FROM {orders_table}")
+        newest = max(newest, int(cursor.fetchone()[0]))
+    return newest
+
+
+def export_full(cursor, store_dir, progress=None):
+    """Rewrite every month from the hot and archive tables; {month: (orders, lines)}"""
+    sources = (HOT_TABLES, ARCHIVE_TABLES)
+    high_water = _high_water(cursor, sources)
+    months = _months(cursor, sources)
+    results = {}
+    for i, month in enumerate(months):
+        start = np.datetime64(month, 'M')
+        batch = _Batch()
+        _fetch(cursor, batch, MONTH_RANGE,
+               (str(start.astype('datetime64[D]')), str((start + 1).astype('datetime64[D]'))), sources)
+        orders, lines = batch.arrays()
+        manifest = write_month(store_dir, month, orders, lines, batch.products, batch.uoms, batch.categories)
+        results[month] = (manifest['orders'], manifest['lines'])
+        if progress:
+            progress((i + 1) / len(months), f"Exported {month}")
+    for month in set(exported_months(store_dir)) - set(months):
+        shutil.rmtree(os.path.join(store_dir, month), ignore_errors=True)
+    return high_water, results
+
+
+def export_new_orders(cursor, store_dir, after, progress=None):
+    """Append orders with ids above `after` to their months; {month: (orders, lines)}
+
+    New orders are only ever inserted into the hot tables.
+    """
+    high_water = _high_water(cursor, (HOT_TABLES,))
+    batch = _Batch()
+    _fetch(cursor, batch, AFTER_ORDER, (after,), (HOT_TABLES,))
+    orders, lines = batch.arrays()
+    order_months = orders['day'].astype('datetime64[M]')
+    line_months = lines['day'].astype('datetime64[M]')
+    months = [str(month) for month in np.unique(order_months)]
+    results = {}
+    for i, month in enumerate(months):
+        key = np.datetime64(month, 'M')
+        manifest = _append_month(store_dir, month, _take(orders, order_months == key),
+                                 _take(lines, line_months == key), batch)
+        results[month] = (manifest['orders'], manifest['lines'])
+        if progress:
+            progress((i + 1) / len(months), f"Exported {month}")
+    return max(high_water, after), results
+
+
+def export(conn, cursor, store_dir, full=False, progress=None):
+    """Bring a store's snapshot up to date
+
+    Incremental unless `full` or the store was never exported. Every read
+    comes from one consistent, read-only snapshot of the database.
+    `cursor` must be a tuple (non-dictionary) cursor.
+    """
+    with _export_lock(store_dir):
+        state = read_state(store_dir)
+        full = full or state is None
+        if not conn.in_transaction:
+            conn.start_transaction(consistent_snapshot=True, readonly=True)
+        try:
+            if full:
+                high_water, results = export_full(cursor, store_dir, progress)
+            else:
+                high_water, results = export_new_orders(cursor, store_dir, state['high_water'], progress)
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+        now = datetime.now().isoformat(timespec='seconds')
+        state = {
+            'high_water': high_water,
+            'exported_at': now,
+            'full_export_at': now if full else state['full_export_at'],
+        }
+        _write_json(os.path.join(store_dir, 'state.json'), state)
+    return {
+        'mode': 'full' if full else 'incremental',
+        'high_water': high_water,
+        'months': {month: {'orders': orders, 'lines': lines} for month, (orders, lines) in results.items()},
+    }
+
+
+# Reports
+
+def sales_timeseries(store_dir, start, end, granularity='day', top=20):
+    """analytics.sales_timeseries for orders placed in [start, end), from the snapshot"""
+    if granularity not in analytics.GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    accumulator = analytics.SalesAccumulator(start, end, granularity)
+    products = {}
+    uoms = {}
+    for _, snapshot in open_months(store_dir, start, end):
+        lines = snapshot['lines']
+        window = day_window(lines['day'], start, end)
+        accumulator.add_chunk(lines['day'][window], lines['product_id'][window], lines['uom_id'][window],
+                              lines['quantity'][window], lines['total_price'][window])
+        products.update(snapshot['manifest']['products'])
+        uoms.update(snapshot['manifest']['uoms'])
+
+    result = accumulator.result(top=top)
+    analytics.label_breakdowns(result, {int(k): v for k, v in products.items()},
+                               {int(k): v for k, v in uoms.items()})
+    result.update({
+        'granularity': granularity,
+        'start': start.isoformat() if isinstance(start, date) else str(start),
+        'end': end.isoformat() if isinstance(end, date) else str(end),
+        'as_of': read_state(store_dir)['exported_at'],
+    })
+    return result
+
+
+def store_summary(store_dir, start=None, end=None, top=10):
+    """Order count, revenue and top products by revenue for [start, end)"""
+    order_count = 0
+    revenue = 0.0
+    product_codes = []
+    product_quantity = []
+    product_revenue = []
+    names = {}
+    for _, snapshot in open_months(store_dir, start, end):
+        orders = snapshot['orders']
+        window = day_window(orders['day'], start, end)
+        order_count += window.stop - window.start
+        revenue += float(orders['total'][window].sum())
+
+        lines = snapshot['lines']
+        window = day_window(lines['day'], start, end)
+        product_codes.append(lines['product_id'][window])
+        product_quantity.append(lines['quantity'][window])
+        product_revenue.append(lines['total_price'][window])
+        names.update(snapshot['manifest']['products'])
+
+    top_products = []
+    if product_codes:
+        product_ids, inverse = np.unique(np.concatenate(product_codes), return_inverse=True)
+        quantity = np.bincount(inverse, weights=np.concatenate(product_quantity), minlength=len(product_ids))
+        sales = np.bincount(inverse, weights=np.concatenate(product_revenue), minlength=len(product_ids))
+        for i in np.argsort(-sales, kind='stable')[:top]:
+            top_products.append({"name": names.get(str(product_ids[i])),
+                                 "quantity": float(quantity[i]), "revenue": float(sales[i])})
+    return {"orders": int(order_count), "revenue": revenue, "top_products": top_products}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export order history to columnar snapshots")
+    parser.add_argument('--full', action='store_true',
+                        help="Rewrite every month (nightly) instead of appending new orders")
+    parser.add_argument('--dir', default=os.getenv('SNAPSHOT_DIR', 'snapshots'),
+                        help="Snapshot root directory (SNAPSHOT_DIR)")
+    parser.add_argument('--store', default='default', help="Store to export (see STORES)")
+    args = parser.parse_args()
+
+    from bulk_load import connect, load_db_config
+    from stores import load_stores
+    conn = None
+    cursor = None
+    try:
+        configs = load_stores(load_db_config())
+        if args.store not in configs:
+            print(f"❌ Unknown store: {args.store}")
+            return False
+        conn = connect(configs[args.store])
+        cursor = conn.cursor()
+        started = time.monotonic()
+        summary = export(conn, cursor, store_path(args.dir, args.store), full=args.full)
+        for month, counts in summary['months'].items():
+            print(f"✅ {month}: {counts['orders']:,} orders, {counts['lines']:,} lines")
+        print(f"{summary['mode'].capitalize()} export up to order {summary['high_water']} "
+              f"in {time.monotonic() - started:.1f}s")
+        return True
+    except Error as e:
+        print(f"❌ Export failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
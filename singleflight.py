@@ -0,0 +1,86 @@
+"""
+Single-flight coalescing of identical concurrent calls
+The first caller for a key becomes the leader and does the work. Callers
+arriving with the same key while it runs wait for the leader's result
+instead of repeating the work. The key is forgotten as soon as the leader
+finishes, so nothing is cached: a call that starts after that runs again.
+
+If the leader fails, or a follower gives up waiting, followers get None
+and do the work themselves.
+"""
+
+import threading
+from collections import Counter
+
+WAIT_TIMEOUT = 30.0
+
+
+class Flight:
+    """One in-progress call and the followers waiting on it"""
+
+    def __init__(self, label):
+        self.label = label
+        self.followers = 0
+        self.result = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=WAIT_TIMEOUT):
+        """The leader's result, or None if it failed or took too long"""
+        if not self._done.wait(timeout):
+            return None
+        return self.result
+
+
+class SingleFlight:
+    """In-flight calls by key, plus counts of how many were collapsed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._leaders = Counter()
+        self._coalesced = Counter()
+        self._failed = Counter()
+
+    def begin(self, label, key):
+        """(flight, True) for the leader of `key`, (flight, False) for a follower
+
+        `label` groups keys in stats (e.g. the route). The leader must call
+        finish() whatever happens.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self._coalesced[label] += 1
+                return flight, False
+            flight = self._flights[key] = Flight(label)
+            self._leaders[label] += 1
+            return flight, True
+
+    def finish(self, key, flight, result=None):
+        """Hand the leader's result (None on failure) to the followers"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if result is None and flight.followers:
+                self._failed[flight.label] += 1
+        flight.result = result
+        flight._done.set()
+
+    def stats(self):
+        with self._lock:
+            labels = set(self._leaders) | set(self._coalesced)
+            routes = {label: {'executed': self._leaders[label],
+                              'coalesced': self._coalesced[label],
+                              'leader_failures': self._failed[label]}
+                      for label in sorted(labels)}
+            in_flight = len(self._flights)
+        executed = sum(route['executed'] for route in routes.values())
+        coalesced = sum(route['coalesced'] for route in routes.values())
+        return {
+            'requests': executed + coalesced,
+            'executed': executed,
+            'coalesced': coalesced,
+            'in_flight': in_flight,
+            'routes': routes,
+        }
@@ -0,0 +1,232 @@
+"""
+Named SQL statements, per-connection prepared statement caches and a small
+pool of long-lived connections to keep them on
+The hot read queries are defined once here instead of being pasted into
+every route. A statement is prepared the first time a connection runs it
+and the prepared cursor is kept for the life of the connection, so MySQL
+parses and plans it once per connection rather than on every request.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from mysql.connector import Error
+
+from pricing import CURRENT_PRICE, CURRENT_PRICE_JOIN
+from stock_alerts import DEFAULT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Catalog reads show the price in effect now, including scheduled changes
+_PRODUCT_WITH_UOM = f"""
+    SELECT p.product_id, p.name, p.uom_id, {CURRENT_PRICE} as price_per_unit, u.uom_name,
+           COALESCE(p.stock_quantity, 100) as stock_quantity, p.barcode, p.category,
+           COALESCE(p.reorder_threshold, {DEFAULT_THRESHOLD}) as reorder_threshold
+    FROM products p
+    JOIN uom u ON p.uom_id = u.uom_id
+    {CURRENT_PRICE_JOIN}
+"""
+
+STATEMENTS = {
+    'products.list': _PRODUCT_WITH_UOM + "ORDER BY p.name",
+    'products.get': _PRODUCT_WITH_UOM + "WHERE p.product_id = %s",
+    'products.popular': _PRODUCT_WITH_UOM + "ORDER BY p.name LIMIT 20",
+    'products.low_stock': _PRODUCT_WITH_UOM + """
+        WHERE COALESCE(p.stock_quantity, 100) < %s
+        ORDER BY COALESCE(p.stock_quantity, 100) ASC
+    """,
+    # Cover is computed from the live stock so stock updates made since the
+    # last forecast run are taken into account
+    'products.low_stock_by_cover': f"""
+        SELECT p.product_id, p.name, {CURRENT_PRICE} as price_per_unit,
+               COALESCE(p.stock_quantity, 100) as stock_quantity, u.uom_name,
+               f.forecast_daily_demand, f.reorder_point,
+               COALESCE(p.stock_quantity, 100) / NULLIF(f.forecast_daily_demand, 0) as days_of_cover,
+               f.computed_at as forecast_date
+        FROM products p
+        JOIN uom u ON p.uom_id = u.uom_id
+        JOIN product_forecasts f ON f.product_id = p.product_id
+        {CURRENT_PRICE_JOIN}
+        WHERE f.forecast_daily_demand > 0
+        AND (COALESCE(p.stock_quantity, 100) <= f.reorder_point
+             OR COALESCE(p.stock_quantity, 100) / f.forecast_daily_demand < %s)
+        ORDER BY days_of_cover ASC
+        LIMIT %s
+    """,
+    # Only products flagged by stock_alerts, through idx_products_low_stock
+    'products.low_stock_flagged': f"""
+        SELECT p.product_id, p.name, p.uom_id, {CURRENT_PRICE} as price_per_unit, u.uom_name,
+               COALESCE(p.stock_quantity, 100) as stock_quantity, p.barcode, p.category,
+               COALESCE(p.reorder_threshold, {DEFAULT_THRESHOLD}) as reorder_threshold, p.low_stock_since
+        FROM products p
+        JOIN uom u ON p.uom_id = u.uom_id
+        {CURRENT_PRICE_JOIN}
+        WHERE p.low_stock_since IS NOT NULL
+        ORDER BY COALESCE(p.stock_quantity, 100) ASC
+    """,
+    'uom.list': "SELECT uom_id, uom_name FROM uom ORDER BY uom_name",
+    'customers.list': "SELECT * FROM customers ORDER BY name",
+    'customers.get': "SELECT * FROM customers WHERE customer_id = %s",
+}
+
+STATEMENT_CACHE_SIZE = 32
+PING_AFTER_IDLE = 30.0
+
+
+class StatementCache:
+    """Prepared cursors of one connection, keyed by SQL text (LRU)
+
+    Each statement gets its own prepared cursor; the cursor re-executes
+    its server-side statement as long as it is handed the same SQL object.
+    """
+
+    def __init__(self, conn, maxsize=STATEMENT_CACHE_SIZE):
+        self.conn = conn
+        self.maxsize = maxsize
+        self.hits = 0
+        self.prepares = 0
+        self._cursors = OrderedDict()
+
+    def execute(self, name_or_sql, params=()):
+        """Run a named statement (or raw SQL) and return its prepared cursor"""
+        sql = STATEMENTS.get(name_or_sql, name_or_sql)
+        entry = self._cursors.get(sql)
+        if entry:
+            self._cursors.move_to_end(sql)
+            self.hits += 1
+        else:
+            entry = (self.conn.cursor(prepared=True), sql)
+            self._cursors[sql] = entry
+            self.prepares += 1
+            if len(self._cursors) > self.maxsize:
+                _, (evicted, _) = self._cursors.popitem(last=False)
+                evicted.close()
+        cursor, sql = entry
+        try:
+            cursor.execute(sql, params)
+        except Error:
+            # The statement may be gone server-side; prepare it again next time
+            self._cursors.pop(sql, None)
+            cursor.close()
+            raise
+        return cursor
+
+    def fetchall(self, name_or_sql, params=()):
+        """All rows of a statement as dictionaries"""
+        cursor = self.execute(name_or_sql, params)
+        columns = cursor.column_names
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def fetchone(self, name_or_sql, params=()):
+        """First row of a statement as a dictionary, or None"""
+        rows = self.fetchall(name_or_sql, params)
+        return rows[0] if rows else None
+
+    def close(self):
+        for cursor, _ in self._cursors.values():
+            try:
+                cursor.close()
+            except Error:
+                pass
+        self._cursors.clear()
+
+    def __len__(self):
+        return len(self._cursors)
+
+
+class ConnectionPool:
+    """Idle connections kept between requests, each with a StatementCache
+
+    Never blocks: when no idle connection is available a new one is opened
+    (admission control already bounds concurrent database users), and at
+    most `size` connections are kept idle.
+    """
+
+    def __init__(self, connect, size=8, cache_size=STATEMENT_CACHE_SIZE):
+        self.connect = connect
+        self.size = size
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._caches = {}
+        self._opened = 0
+        self._reused = 0
+        self._discarded = 0
+
+    def acquire(self):
+        """An idle connection (checked if it sat unused for a while) or a new one"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, released_at = self._idle.pop()
+            if time.monotonic() - released_at >= PING_AFTER_IDLE:
+                try:
+                    conn.ping(reconnect=False)
+                except Error:
+                    self.discard(conn)
+                    continue
+            with self._lock:
+                self._reused += 1
+            return conn
+        conn = self.connect()
+        with self._lock:
+            self._caches[id(conn)] = StatementCache(conn, self.cache_size)
+            self._opened += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection for reuse; it is closed if the pool is full"""
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            if conn.in_transaction:
+                conn.rollback()
+        except Error:
+            self.discard(conn)
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self.discard(conn)
+
+    def discard(self, conn):
+        """Close a connection that is broken or not needed any more"""
+        with self._lock:
+            cache = self._caches.pop(id(conn), None)
+            self._discarded += 1
+        try:
+            if cache:
+                cache.close()
+            conn.close()
+        except Error as e:
+            logger.debug(f"Error closing pooled connection: {e}")
+
+    def statements(self, conn):
+        """Prepared statement cache of a connection from this pool"""
+        return self._caches[id(conn)]
+
+    def close(self):
+        with self._lock:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self.discard(conn)
+
+    def stats(self):
+        with self._lock:
+            caches = list(self._caches.values())
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'open': len(caches),
+                'opened': self._opened,
+                'reused': self._reused,
+                'discarded': self._discarded,
+                'prepared_statements': sum(len(c) for c in caches),
+                'statement_hits': sum(c.hits for c in caches),
+                'statement_prepares': sum(c.prepares for c in caches),
+            }
@@ -211,9 +211,12 @@ async function handleFormSubmit(event, url, method, redirectUrl) {
     const formData = new FormData(form);
     const data = {};
     
+    // Fields marked data-type="text" (e.g. barcodes) stay strings even when numeric
+    const textFields = new Set(Array.from(form.querySelectorAll('[data-type="text"]')).map(el => el.name));
+    
     formData.forEach((value, key) => {
         // Convert numeric values
-        if (!isNaN(value) && value !== '' && value !== null) {
+        if (!textFields.has(key) && !isNaN(value) && value !== '' && value !== null) {
             data[key] = Number(value);
         } else {
             data[key] = value;
@@ -350,4 +353,27 @@ function debounce(func, wait) {
         clearTimeout(timeout);
         timeout = setTimeout(later, wait);
     };
-}
\ No newline at end of file
+}
+// Live updates over server-sent events, one handler per event type.
+// A 'resync' event means updates were dropped and the page should reload
+// its data once.
+function subscribeToEvents(handlers, types = []) {
+    if (!window.EventSource) {
+        return null;
+    }
+    const query = types.length ? '?types=' + types.join(',') : '';
+    const source = new EventSource('/api/events/stream' + query);
+    Object.entries(handlers).forEach(([type, handler]) => {
+        source.addEventListener(type, event => handler(JSON.parse(event.data)));
+    });
+    return source;
+}
+
+// Service worker for offline checkout (see static/js/sw.js)
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            console.error('Service worker registration failed:', error);
+        });
+    });
+}
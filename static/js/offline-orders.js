@@ -0,0 +1,138 @@
+// Offline order queue
+// Checkout stores each order in IndexedDB first, so it completes without a
+// network round trip, and queued orders are sent to /api/orders/sync in
+// batches whenever the browser is online. Every order carries a
+// client-generated UUID, so resending a batch never creates duplicates.
+
+const OFFLINE_DB_NAME = 'grocery-offline';
+const OFFLINE_ORDER_STORE = 'orders';
+const SYNC_BATCH_SIZE = 100;
+const SYNC_INTERVAL_MS = 30000;
+let syncInProgress = null;
+
+function openOfflineDb() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(OFFLINE_DB_NAME, 1);
+        request.onupgradeneeded = () => {
+            request.result.createObjectStore(OFFLINE_ORDER_STORE, { keyPath: 'client_order_uuid' });
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+// Run `work(store)` in one transaction; resolves with its result on commit
+async function withOrderStore(mode, work) {
+    const db = await openOfflineDb();
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(OFFLINE_ORDER_STORE, mode);
+        const request = work(transaction.objectStore(OFFLINE_ORDER_STORE));
+        transaction.oncomplete = () => {
+            db.close();
+            resolve(request ? request.result : undefined);
+        };
+        transaction.onerror = () => {
+            db.close();
+            reject(transaction.error);
+        };
+    });
+}
+
+function newOrderUuid() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    // RFC 4122 version 4 from getRandomValues for older browsers
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    bytes[6] = (bytes[6] & 0x0f) | 0x40;
+    bytes[8] = (bytes[8] & 0x3f) | 0x80;
+    const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+// Store an order locally; it is synced later by syncQueuedOrders()
+async function queueOrder(order) {
+    const queued = Object.assign({
+        client_order_uuid: newOrderUuid(),
+        created_at: new Date().toISOString()
+    }, order);
+    await withOrderStore('readwrite', store => store.put(queued));
+    updatePendingOrdersBadge();
+    return queued;
+}
+
+function queuedOrders() {
+    return withOrderStore('readonly', store => store.getAll());
+}
+
+function removeQueuedOrders(uuids) {
+    return withOrderStore('readwrite', store => {
+        uuids.forEach(uuid => store.delete(uuid));
+        return null;
+    });
+}
+
+// Send queued orders in batches; resolves with the server's per-order results
+function syncQueuedOrders() {
+    if (syncInProgress) {
+        return syncInProgress;
+    }
+    syncInProgress = (async () => {
+        const summary = { created: 0, duplicate: 0, rejected: 0, results: [] };
+        while (navigator.onLine) {
+            const batch = (await queuedOrders()).slice(0, SYNC_BATCH_SIZE);
+            if (batch.length === 0) {
+                break;
+            }
+            let response;
+            try {
+                response = await fetch('/api/orders/sync', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ orders: batch })
+                });
+            } catch (error) {
+                break; // Still offline in practice; keep the queue
+            }
+            if (!response.ok) {
+                break;
+            }
+            const result = await response.json();
+            // Created and duplicate orders are stored; rejected ones never will be.
+            // Results are matched by position, since a malformed order may lack its UUID
+            await removeQueuedOrders(result.results.map(r => batch[r.index].client_order_uuid));
+            result.results.filter(r => r.status === 'rejected').forEach(r => {
+                showAlert(`A queued order could not be saved: ${r.error}`, 'error');
+            });
+            summary.created += result.created;
+            summary.duplicate += result.duplicate;
+            summary.rejected += result.rejected;
+            summary.results = summary.results.concat(result.results);
+        }
+        updatePendingOrdersBadge();
+        return summary;
+    })().finally(() => {
+        syncInProgress = null;
+    });
+    return syncInProgress;
+}
+
+async function updatePendingOrdersBadge() {
+    const badge = document.getElementById('pendingOrders');
+    if (!badge) {
+        return;
+    }
+    const pending = (await queuedOrders()).length;
+    badge.textContent = `${pending} order${pending === 1 ? '' : 's'} waiting to sync`;
+    badge.classList.toggle('d-none', pending === 0);
+}
+
+function initOfflineOrders() {
+    if (!window.indexedDB) {
+        return;
+    }
+    updatePendingOrdersBadge();
+    syncQueuedOrders();
+    window.addEventListener('online', syncQueuedOrders);
+    setInterval(syncQueuedOrders, SYNC_INTERVAL_MS);
+}
@@ -209,6 +209,8 @@ function renderOrderDetails(order) {
 // Create Order functionality
 let orderItems = [];
 let products = [];
+let currentQuote = null;
+let quoteSequence = 0;
 
 // Load data for order creation
 async function initOrderCreation() {
@@ -238,6 +240,13 @@ async function initOrderCreation() {
         // Set up event listeners
         document.getElementById('productId').addEventListener('change', updateProductDetails);
         document.getElementById('addItemBtn').addEventListener('click', addItemToOrder);
+        document.getElementById('barcodeScan').addEventListener('keydown', event => {
+            if (event.key === 'Enter') {
+                event.preventDefault();
+                scanBarcode(event.target.value.trim());
+                event.target.value = '';
+            }
+        });
         document.getElementById('createOrderForm').addEventListener('submit', submitOrder);
         
         updateProductDetails();
@@ -284,6 +293,8 @@ function addItemToOrder() {
         // Update existing item
         orderItems[existingItemIndex].quantity = quantity;
         orderItems[existingItemIndex].total_price = totalPrice;
+        orderItems[existingItemIndex].discount = 0;
+        orderItems[existingItemIndex].promotion = null;
     } else {
         // Add new item
         orderItems.push({
@@ -300,8 +311,83 @@ function addItemToOrder() {
     resetItemForm();
 }
 
-// Update order summary
+// Add one unit of a scanned product; the loaded catalog answers most scans,
+// the server's barcode index covers barcodes assigned since the page loaded
+async function scanBarcode(barcode) {
+    if (!barcode) {
+        return;
+    }
+    let product = products.find(p => p.barcode === barcode);
+    if (!product && navigator.onLine) {
+        try {
+            product = await apiRequest(`/api/products/barcode/${encodeURIComponent(barcode)}`);
+        } catch (error) {
+            product = null;
+        }
+    }
+    if (!product) {
+        showAlert(`Unknown barcode: ${barcode}`, 'warning');
+        return;
+    }
+    
+    const price = parseFloat(product.price_per_unit);
+    const item = orderItems.find(item => item.product_id === product.product_id);
+    if (item) {
+        item.quantity += 1;
+        item.total_price = item.quantity * price;
+        item.discount = 0;
+        item.promotion = null;
+    } else {
+        orderItems.push({
+            product_id: product.product_id,
+            product_name: product.name,
+            uom_name: product.uom_name,
+            quantity: 1,
+            unit_price: price,
+            total_price: price
+        });
+    }
+    updateOrderSummary();
+}
+
+// Update order summary, then price the basket on the server
 function updateOrderSummary() {
+    renderOrderSummary();
+    refreshQuote();
+}
+
+// Server quote: prices in effect now plus promotions. Offline, or if the
+// quote fails, the totals computed here stand
+async function refreshQuote() {
+    currentQuote = null;
+    const sequence = ++quoteSequence;
+    if (orderItems.length === 0 || !navigator.onLine) {
+        return;
+    }
+    try {
+        const quote = await apiRequest('/api/cart/quote', 'POST', {
+            items: orderItems.map(item => ({product_id: item.product_id, quantity: item.quantity}))
+        });
+        if (sequence !== quoteSequence) {
+            return;
+        }
+        quote.lines.forEach(line => {
+            const item = orderItems.find(item => item.product_id === line.product_id);
+            if (item) {
+                item.unit_price = line.unit_price;
+                item.discount = line.discount;
+                item.total_price = line.total_price;
+                item.promotion = line.promotion;
+            }
+        });
+        currentQuote = quote;
+        renderOrderSummary();
+    } catch (error) {
+        console.warn('Cart quote failed:', error);
+    }
+}
+
+function renderOrderSummary() {
     const orderTotal = calculateOrderTotal(orderItems);
     document.getElementById('orderTotal').textContent = formatCurrency(orderTotal);
     
@@ -329,7 +415,10 @@ function updateOrderSummary() {
                 <tr>
                     <td>${item.product_name}</td>
                     <td>${item.quantity} ${item.uom_name}</td>
-                    <td>${formatCurrency(item.total_price)}</td>
+                    <td>
+                        ${formatCurrency(item.total_price)}
+                        ${item.promotion ? `<br><small class="text-success">${item.promotion.name} (-${formatCurrency(item.discount)})</small>` : ''}
+                    </td>
                     <td>
                         <button type="button" class="btn btn-sm btn-outline-danger" onclick="removeOrderItem(${index})">
                             Remove
@@ -380,24 +469,42 @@ async function submitOrder(event) {
     }
     
     const customerId = parseInt(document.getElementById('customerId').value);
-    const orderTotal = calculateOrderTotal(orderItems);
     
+    // The server prices the order (as quoted, if the quote is still fresh)
     const orderData = {
         customer_id: customerId,
-        total: orderTotal,
+        quote_id: currentQuote ? currentQuote.quote_id : null,
         items: orderItems.map(item => ({
             product_id: item.product_id,
-            quantity: item.quantity,
-            total_price: item.total_price
+            quantity: item.quantity
         }))
     };
     
+    if (!window.indexedDB) {
+        try {
+            const result = await apiRequest('/api/orders', 'POST', orderData);
+            showAlert('Order created successfully!');
+            window.location.href = `/orders/${result.order_id}`;
+        } catch (error) {
+            showAlert(error.message, 'danger');
+        }
+        return;
+    }
+    
+    // Checkout completes locally; the order is synced in the background
     try {
-        const result = await apiRequest('/api/orders', 'POST', orderData);
-        showAlert('Order created successfully!');
-        window.location.href = `/orders/${result.order_id}`;
+        const queued = await queueOrder(orderData);
+        orderItems = [];
+        updateOrderSummary();
+        showAlert('Order saved');
+        syncQueuedOrders().then(summary => {
+            const result = summary.results.find(r => r.client_order_uuid === queued.client_order_uuid);
+            if (result && result.order_id) {
+                showAlert(`Order #${result.order_id} synced`, 'info');
+            }
+        });
     } catch (error) {
-        showAlert(error.message, 'danger');
+        showAlert(`Could not save order: ${error.message}`, 'error');
     }
 }
 
@@ -298,6 +298,7 @@ async function loadProductForEdit(productId) {
         document.getElementById('productName').value = product.name;
         document.getElementById('uomId').value = product.uom_id;
         document.getElementById('pricePerUnit').value = product.price_per_unit;
+        document.getElementById('barcode').value = product.barcode || '';
     } catch (error) {
         showAlert(error.message, 'error');
     }
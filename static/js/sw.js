@@ -0,0 +1,87 @@
+// Service worker: keeps the checkout page and the catalog usable offline.
+// Catalog reads (products, uom, customers) go to the network first and fall
+// back to the last cached copy; pages fall back to the cache when offline;
+// static files and CDN assets are served from the cache and refreshed in
+// the background. Orders themselves are queued in IndexedDB by
+// offline-orders.js, never here.
+
+const CACHE_NAME = 'grocery-offline-v1';
+const SHELL_URLS = [
+    '/orders/create',
+    '/static/css/style.css',
+    '/static/js/app.js',
+    '/static/js/orders.js',
+    '/static/js/offline-orders.js'
+];
+const CATALOG_URLS = ['/api/products', '/api/uom', '/api/customers'];
+
+self.addEventListener('install', event => {
+    // Cache what we can; one failing URL must not stop the worker installing
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => Promise.all(
+                SHELL_URLS.concat(CATALOG_URLS).map(url => cache.add(url).catch(() => null))
+            ))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(key => key !== CACHE_NAME).map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    const sameOrigin = url.origin === self.location.origin;
+
+    if (sameOrigin && CATALOG_URLS.includes(url.pathname) && !url.search) {
+        event.respondWith(networkFirst(request));
+    } else if (sameOrigin && url.pathname.startsWith('/api/')) {
+        // Everything else under /api/ (including the event stream) is live data
+        return;
+    } else if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request));
+    } else {
+        event.respondWith(staleWhileRevalidate(request));
+    }
+});
+
+async function networkFirst(request) {
+    const cache = await caches.open(CACHE_NAME);
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request);
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+async function staleWhileRevalidate(request) {
+    const cache = await caches.open(CACHE_NAME);
+    const cached = await cache.match(request);
+    const refresh = fetch(request)
+        .then(response => {
+            // Opaque (cross-origin CDN) responses can be cached but not inspected
+            if (response.ok || response.type === 'opaque') {
+                cache.put(request, response.clone());
+            }
+            return response;
+        })
+        .catch(() => cached);
+    return cached || refresh;
+}
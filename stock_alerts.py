@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Incremental low-stock flags
+A product is low on stock when its stock is below its reorder threshold
+(products.reorder_threshold, DEFAULT_THRESHOLD when not set). Low products
+carry products.low_stock_since, and that column is indexed, so the
+low-stock view reads the flagged set instead of scanning and sorting the
+catalog.
+
+Every stock or threshold write re-evaluates the products it touched, in
+the writer's transaction and under the product row locks the write already
+holds. A product that becomes low is flagged and reported as an alert;
+concurrent writers of the same product wait on its row lock, so each
+crossing is reported exactly once. A product that recovers loses its flag,
+and a later crossing alerts again.
+
+Stock written outside the app (bulk loads, imports) is picked up by a full
+rebuild, which flags without alerting.
+
+Usage: python stock_alerts.py
+"""
+
+import sys
+
+from mysql.connector import Error
+
+DEFAULT_THRESHOLD = 10
+
+# Column expressions; table alias p is products
+STOCK = "COALESCE(p.stock_quantity, 100)"
+THRESHOLD = f"COALESCE(p.reorder_threshold, {DEFAULT_THRESHOLD})"
+
+_PRODUCT_STATE = f"""
+    SELECT p.product_id, p.name, {STOCK}, {THRESHOLD}, p.low_stock_since IS NOT NULL
+    FROM products p
+    WHERE p.product_id IN ({{placeholders}})
+    FOR UPDATE
+"""
+
+
+def _values(row):
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def _in_clause(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def apply_stock_changes(cursor, product_ids):
+    """Update the flags of products whose stock or threshold just changed
+
+    Runs in the caller's transaction, after its stock writes. Returns
+    ({product_id: stock}, alerts), the alerts being [{product_id, name,
+    stock_quantity, threshold}] for products that became low; publish
+    them once the caller commits.
+    """
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}, []
+    cursor.execute(_PRODUCT_STATE.format(placeholders=_in_clause(ids)), tuple(ids))
+    levels = {}
+    alerts = []
+    recovered = []
+    for product_id, name, stock, threshold, flagged in map(_values, cursor.fetchall()):
+        stock, threshold = float(stock), int(threshold)
+        levels[product_id] = stock
+        if stock < threshold and not flagged:
+            alerts.append({'product_id': product_id, 'name': name,
+                           'stock_quantity': stock, 'threshold': threshold})
+        elif stock >= threshold and flagged:
+            recovered.append(product_id)
+    if alerts:
+        crossed = [alert['product_id'] for alert in alerts]
+        cursor.execute(f"UPDATE products SET low_stock_since = NOW() WHERE product_id IN ({_in_clause(crossed)})",
+                       tuple(crossed))
+    if recovered:
+        cursor.execute(f"UPDATE products SET low_stock_since = NULL WHERE product_id IN ({_in_clause(recovered)})",
+                       tuple(recovered))
+    return levels, alerts
+
+
+def decrement_stock(cursor, quantities):
+    """Take sold quantities, {product_id: quantity}, off the shelf
+
+    Stock never goes below zero and keeps fractional quantities of weighed
+    products, rounded to grams / millilitres so repeated sales don't drift.
+    Runs in the caller's transaction; follow it with apply_stock_changes
+    for the same products.
+    """
+    if not quantities:
+        return
+    cursor.executemany("""
+        UPDATE products SET stock_quantity = GREATEST(ROUND(COALESCE(stock_quantity, 100) - %s, 3), 0)
+        WHERE product_id = %s
+    """, [(quantity, product_id) for product_id, quantity in sorted(quantities.items())])
+
+
+def rebuild(conn, cursor):
+    """Recompute every flag from products; returns the number of low products
+
+    For stock written behind the app's back. Flags set here raise no alerts.
+    """
+    if not conn.in_transaction:
+        conn.start_transaction()
+    try:
+        cursor.execute(f"""
+            UPDATE products p SET p.low_stock_since = NOW()
+            WHERE p.low_stock_since IS NULL AND {STOCK} < {THRESHOLD}
+        """)
+        cursor.execute(f"""
+            UPDATE products p SET p.low_stock_since = NULL
+            WHERE p.low_stock_since IS NOT NULL AND {STOCK} >= {THRESHOLD}
+        """)
+        cursor.execute("SELECT COUNT(*) FROM products WHERE low_stock_since IS NOT NULL")
+        count = _values(cursor.fetchone())[0]
+        conn.commit()
+        return count
+    except Error:
+        conn.rollback()
+        raise
+
+
+def main():
+    from bulk_load import connect, load_db_config
+    conn = None
+    cursor = None
+    try:
+        conn = connect(load_db_config())
+        cursor = conn.cursor()
+        count = rebuild(conn, cursor)
+        print(f"✅ {count:,} products below their reorder threshold")
+        return True
+    except Error as e:
+        print(f"❌ Rebuild failed: {e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
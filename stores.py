@@ -0,0 +1,166 @@
+"""
+Multi-store tenancy
+Each request belongs to one store. The store is taken from a /stores/<id>/
+path prefix, then an X-Store-ID header, then the subdomain, and falls back
+to the default store. Every store has its own database settings (merged
+over the base db_config), its own connection pool and its own cache
+partitions, so one deployment can serve several shops.
+
+Stores are configured with the STORES environment variable, either inline
+JSON or the path to a JSON file:
+
+    {"downtown": {"database": "grocery_downtown"},
+     "uptown": {"host": "db2.internal", "database": "grocery"}}
+
+The default store always uses the base db_config unless STORES overrides it.
+Pages use absolute /api/ URLs, so browsers should reach a store through its
+subdomain; the path prefix is meant for API clients.
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+DEFAULT_STORE = 'default'
+STORE_HEADER = 'X-Store-ID'
+PATH_PREFIX = '/stores/'
+ENVIRON_KEY = 'grocery.store_id'
+STORE_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+
+
+class UnknownStore(Exception):
+    """A request named a store that is not configured"""
+
+    def __init__(self, store_id):
+        super().__init__(f"Unknown store: {store_id}")
+        self.store_id = store_id
+
+
+def load_stores(base_config, spec=None):
+    """{store_id: db config} from STORES (JSON or a JSON file path)"""
+    spec = os.getenv('STORES', '') if spec is None else spec
+    stores = {}
+    if spec.strip():
+        if spec.lstrip().startswith('{'):
+            overrides_by_store = json.loads(spec)
+        else:
+            with open(spec, encoding='utf-8') as f:
+                overrides_by_store = json.load(f)
+        for store_id, overrides in overrides_by_store.items():
+            if not STORE_ID_PATTERN.match(store_id):
+                raise ValueError(f"Invalid store id {store_id!r} in STORES")
+            config = dict(base_config)
+            config.update(overrides or {})
+            stores[store_id] = config
+    stores.setdefault(DEFAULT_STORE, dict(base_config))
+    return stores
+
+
+class StoreRegistry:
+    """Store configs plus one lazily created connection pool per store
+
+    `pool_factory(store_id, config)` builds a pool. Outside a request the
+    current store is a context variable set with use(), which is how
+    background jobs and fan-out threads pick their database.
+    """
+
+    def __init__(self, configs, pool_factory):
+        self.configs = configs
+        self.pool_factory = pool_factory
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._current = contextvars.ContextVar('store_id', default=DEFAULT_STORE)
+
+    def __contains__(self, store_id):
+        return store_id in self.configs
+
+    def ids(self):
+        return sorted(self.configs)
+
+    def config(self, store_id):
+        try:
+            return self.configs[store_id]
+        except KeyError:
+            raise UnknownStore(store_id) from None
+
+    def pool(self, store_id):
+        with self._lock:
+            pool = self._pools.get(store_id)
+            if pool is None:
+                pool = self._pools[store_id] = self.pool_factory(store_id, self.config(store_id))
+            return pool
+
+    def current(self):
+        return self._current.get()
+
+    @contextmanager
+    def use(self, store_id):
+        """Make `store_id` the current store for code outside a request"""
+        self.config(store_id)
+        token = self._current.set(store_id)
+        try:
+            yield
+        finally:
+            self._current.reset(token)
+
+    def stats(self):
+        with self._lock:
+            pools = dict(self._pools)
+        return {store_id: pool.stats() for store_id, pool in pools.items()}
+
+
+def resolve_store(request, registry):
+    """Store id of a Flask request; raises UnknownStore for unknown explicit ids"""
+    store_id = request.environ.get(ENVIRON_KEY) or request.headers.get(STORE_HEADER)
+    if store_id:
+        if store_id not in registry:
+            raise UnknownStore(store_id)
+        return store_id
+    host = request.host.split(':')[0]
+    subdomain = host.split('.')[0]
+    if host.count('.') >= 2 and subdomain in registry:
+        return subdomain
+    return DEFAULT_STORE
+
+
+class StorePathMiddleware:
+    """WSGI middleware that moves a /stores/<id> prefix into SCRIPT_NAME
+
+    Routes stay unchanged and url_for() keeps generating prefixed URLs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(PATH_PREFIX):
+            store_id, _, rest = path[len(PATH_PREFIX):].partition('/')
+            if STORE_ID_PATTERN.match(store_id):
+                environ[ENVIRON_KEY] = store_id
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + PATH_PREFIX + store_id
+                environ['PATH_INFO'] = '/' + rest
+        return self.app(environ, start_response)
+
+
+class StoreLocal:
+    """One object per store (event bus, index...), created on first use"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, store_id):
+        with self._lock:
+            item = self._items.get(store_id)
+            if item is None:
+                item = self._items[store_id] = self.factory()
+            return item
+
+    def items(self):
+        with self._lock:
+            return list(self._items.items())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Event bus load test
+Opens hundreds of concurrent subscribers on events.EventBus, publishes a
+burst of events and checks that every subscriber got all of them in order,
+that a stalled subscriber is collapsed to a single 'resync' instead of
+growing without bound, and that the SSE endpoint streams an event.
+No database needed.
+
+Usage: python test_events.py [--subscribers 500] [--events 2000]
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+import events
+
+
+def run_subscribers(subscribers=500, count=2000, queue_size=4096):
+    """Every subscriber reads on its own thread while one thread publishes"""
+    bus = events.EventBus(queue_size=queue_size)
+    received = [[] for _ in range(subscribers)]
+    ready = threading.Barrier(subscribers + 1)
+
+    def consume(index):
+        with bus.subscribe() as subscription:
+            ready.wait()
+            while len(received[index]) < count:
+                event = subscription.get(timeout=5)
+                if event is None:
+                    return
+                received[index].append(event['id'])
+
+    threads = [threading.Thread(target=consume, args=(i,), daemon=True) for i in range(subscribers)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+
+    started = time.perf_counter()
+    for i in range(count):
+        bus.publish('stock_changed', {'product_id': i % 50, 'stock_quantity': i})
+    publish_seconds = time.perf_counter() - started
+    for thread in threads:
+        thread.join(timeout=30)
+    total_seconds = time.perf_counter() - started
+
+    expected = list(range(1, count + 1))
+    complete = sum(1 for ids in received if ids == expected)
+    return complete, publish_seconds, total_seconds, bus.stats()
+
+
+def test_hundreds_of_subscribers():
+    complete, _, _, stats = run_subscribers(subscribers=300, count=500)
+    assert complete == 300
+    assert stats['subscribers'] == 0
+    assert stats['overflows'] == 0
+
+
+def test_slow_subscriber_gets_resync():
+    bus = events.EventBus(queue_size=10)
+    with bus.subscribe() as stalled, bus.subscribe(types=['order_created']) as filtered:
+        for i in range(25):
+            bus.publish('stock_changed', {'product_id': 1, 'stock_quantity': i})
+        bus.publish('order_created', {'order_id': 1})
+        # The full queue was replaced by one resync, then kept filling
+        first = stalled.get(timeout=0)
+        assert first['type'] == events.RESYNC
+        assert stalled.overflows >= 1
+        pending = []
+        while True:
+            event = stalled.get(timeout=0)
+            if event is None:
+                break
+            pending.append(event)
+        assert len(pending) < 10
+        # Filtered subscribers only see their types
+        assert filtered.get(timeout=0)['type'] == 'order_created'
+        assert filtered.get(timeout=0) is None
+
+
+def test_last_event_id_replay():
+    bus = events.EventBus(replay_size=5)
+    for i in range(8):
+        bus.publish('order_created', {'order_id': i})
+    with bus.subscribe(last_event_id=6) as resumed:
+        assert [resumed.get(timeout=0)['id'] for _ in range(2)] == [7, 8]
+    with bus.subscribe(last_event_id=1) as too_old:
+        assert too_old.get(timeout=0)['type'] == events.RESYNC
+
+
+def test_subscriber_cap():
+    bus = events.EventBus(max_subscribers=2)
+    first, second = bus.subscribe(), bus.subscribe()
+    assert bus.subscribe() is None
+    first.close()
+    third = bus.subscribe()
+    assert third is not None
+    second.close()
+    third.close()
+
+
+def test_sse_endpoint_streams_events():
+    from app import app, store_event_bus
+
+    client = app.test_client()
+    response = client.get('/api/events/stream?types=stock_changed', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.response
+    assert next(chunks).startswith(b'retry:')
+
+    threading.Timer(0.1, store_event_bus().publish, ('stock_changed', {'product_id': 7, 'stock_quantity': 3})).start()
+    chunk = next(chunks).decode()
+    assert 'event: stock_changed' in chunk
+    assert '"product_id":7' in chunk
+    response.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event bus load test")
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--events', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"Fanning out {args.events:,} events to {args.subscribers} concurrent subscribers...")
+    complete, publish_seconds, total_seconds, stats = run_subscribers(args.subscribers, args.events)
+    deliveries = args.subscribers * args.events
+    print(f"Published in {publish_seconds:.2f}s, delivered in {total_seconds:.2f}s "
+          f"({deliveries / total_seconds:,.0f} deliveries/sec)")
+    if complete != args.subscribers:
+        print(f"❌ Only {complete}/{args.subscribers} subscribers received every event in order")
+        return False
+    print(f"✅ All {complete} subscribers received every event in order")
+
+    checks = [test_slow_subscriber_gets_resync, test_last_event_id_replay,
+              test_subscriber_cap, test_sse_endpoint_streams_events]
+    for check in checks:
+        try:
+            check()
+            print(f"✅ {check.__name__}")
+        except AssertionError as e:
+            print(f"❌ {check.__name__} {e}")
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Database fault-injection test
+Runs the app against a stand-in database that can refuse connections,
+drop them mid-query or reject statements. Checks that transient failures
+are retried with backoff, that the circuit breaker opens after repeated
+failures and then fails requests fast, that read endpoints serve their
+last good response marked stale meanwhile, that a trial request closes
+the breaker once the database is back, that a call shed before it
+reached the database leaves that trial free, and that errors the server
+answered (bad SQL) never trip it.
+No database needed.
+
+Usage: python test_resilience.py
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors
+
+import admission
+import resilience
+import stores
+
+UOM_ROWS = [(1, 'Kg'), (2, 'Each')]
+
+
+class StandInDB:
+    """Just enough of a MySQL server for the pooled read paths
+
+    mode is 'up', 'down' (connections refused), 'drop' (connections lost
+    mid-query) or 'bad_sql' (statements rejected by the server).
+    """
+
+    def __init__(self):
+        self.mode = 'up'
+        self.fail_connects = 0
+        self.connects = 0
+        self.queries = 0
+
+    def connect(self, **config):
+        self.connects += 1
+        if self.mode == 'down' or self.fail_connects:
+            self.fail_connects = max(0, self.fail_connects - 1)
+            raise errors.InterfaceError("Can't connect to MySQL server on 'stand-in' (111)", errno=2003)
+        return StandInConnection(self)
+
+    def run(self, sql):
+        self.queries += 1
+        if self.mode in ('down', 'drop'):
+            raise errors.OperationalError("Lost connection to MySQL server during query", errno=2013)
+        if self.mode == 'bad_sql':
+            raise errors.ProgrammingError("You have an error in your SQL syntax", errno=1064)
+        if 'FROM uom' in sql:
+            return ['uom_id', 'uom_name'], list(UOM_ROWS)
+        return ['customer_id', 'name'], [(1, 'Asha')]
+
+
+class StandInConnection:
+    unread_result = False
+    in_transaction = False
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, prepared=False, dictionary=False):
+        return StandInCursor(self.db, dictionary)
+
+    def ping(self, reconnect=False):
+        if self.db.mode in ('down', 'drop'):
+            raise errors.InterfaceError("Lost connection", errno=2013)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StandInCursor:
+    def __init__(self, db, dictionary):
+        self.db = db
+        self.dictionary = dictionary
+        self.column_names = []
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.column_names, self.rows = self.db.run(sql)
+
+    def fetchall(self):
+        if self.dictionary:
+            return [dict(zip(self.column_names, row)) for row in self.rows]
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def stand_in(threshold=3, reset_timeout=0.3):
+    """The app wired to a fresh StandInDB, breakers and stale copies"""
+    import app as app_module
+
+    db = StandInDB()
+    original = (mysql.connector.connect, app_module.db_breakers, app_module.store_registry._pools)
+    mysql.connector.connect = db.connect
+    app_module.store_registry._pools = {}
+    app_module.db_breakers = stores.StoreLocal(lambda: resilience.CircuitBreaker(threshold, reset_timeout))
+    app_module.stale_responses.clear()
+    try:
+        yield app_module.app.test_client(), db, app_module.db_breakers
+    finally:
+        mysql.connector.connect, app_module.db_breakers, app_module.store_registry._pools = original
+        app_module.stale_responses.clear()
+
+
+def test_transient_connect_errors_are_retried():
+    with stand_in() as (client, db, breakers):
+        db.fail_connects = 2
+        response = client.get('/api/uom')
+        assert response.status_code == 200, response.status_code
+        assert 'X-Stale' not in response.headers
+        assert db.connects == 3
+        assert breakers.get('default').stats()['state'] == resilience.CLOSED
+
+
+def test_breaker_opens_and_serves_stale_reads():
+    with stand_in(threshold=3) as (client, db, breakers):
+        fresh = client.get('/api/uom')
+        assert fresh.status_code == 200
+
+        db.mode = 'down'
+        for _ in range(3):
+            response = client.get('/api/uom')
+            assert response.status_code == 200
+            assert response.headers['X-Stale'] == 'true'
+            assert response.get_json() == fresh.get_json()
+        assert breakers.get('default').stats()['state'] == resilience.OPEN
+
+        # Open: the database isn't tried at all and non-cached calls fail fast
+        connects = db.connects
+        started = time.perf_counter()
+        stale = client.get('/api/uom')
+        failed = client.get('/api/customers/1')
+        elapsed = time.perf_counter() - started
+        assert stale.status_code == 200 and stale.headers['X-Stale'] == 'true'
+        assert failed.status_code == 503
+        assert int(failed.headers['Retry-After']) >= 1
+        assert db.connects == connects
+        assert elapsed < 0.5, elapsed
+
+
+def test_reads_without_a_stale_copy_get_503():
+    with stand_in(threshold=1) as (client, db, breakers):
+        db.mode = 'down'
+        first = client.get('/api/uom')
+        assert first.status_code == 503
+        assert client.get('/api/uom').status_code == 503
+
+
+def test_trial_request_closes_the_breaker():
+    with stand_in(threshold=1, reset_timeout=0.2) as (client, db, breakers):
+        client.get('/api/uom')
+        db.mode = 'drop'
+        assert client.get('/api/uom').headers.get('X-Stale') == 'true'
+        assert breakers.get('default').stats()['state'] == resilience.OPEN
+
+        db.mode = 'up'
+        time.sleep(0.25)
+        response = client.get('/api/uom')
+        assert response.status_code == 200
+        assert 'X-Stale' not in response.headers
+        assert breakers.get('default').stats()['state'] == resilience.CLOSED
+
+
+def test_failed_trial_reopens_the_breaker():
+    with stand_in(threshold=1, reset_timeout=0.2) as (client, db, breakers):
+        db.mode = 'down'
+        client.get('/api/customers/1')
+        time.sleep(0.25)
+        assert client.get('/api/customers/1').status_code == 500
+        stats = breakers.get('default').stats()
+        assert stats['state'] == resilience.OPEN
+        assert stats['trips'] == 2
+
+
+def test_shed_background_call_leaves_the_trial_free():
+    import app as app_module
+
+    @contextmanager
+    def overloaded(priority_class='background'):
+        raise admission.Overloaded('queue_full')
+        yield
+
+    with stand_in(threshold=1, reset_timeout=0.2) as (client, db, breakers):
+        db.mode = 'down'
+        client.get('/api/customers/1')
+        time.sleep(0.25)
+        db_slot = app_module.admission_control.db_slot
+        app_module.admission_control.db_slot = overloaded
+        try:
+            with app_module.get_db_cursor():
+                raise AssertionError("cursor handed out without a DB slot")
+        except admission.Overloaded:
+            pass
+        finally:
+            app_module.admission_control.db_slot = db_slot
+
+        db.mode = 'up'
+        assert client.get('/api/customers/1').status_code == 200
+        assert breakers.get('default').stats()['state'] == resilience.CLOSED
+
+
+def test_server_errors_do_not_trip_the_breaker():
+    with stand_in(threshold=2) as (client, db, breakers):
+        db.mode = 'bad_sql'
+        for _ in range(5):
+            assert client.get('/api/customers/1').status_code == 500
+        assert breakers.get('default').stats()['state'] == resilience.CLOSED
+
+
+def test_backoff_is_jittered_and_capped():
+    delays = [resilience.backoff_delays(6, base=0.1, cap=0.5) for _ in range(200)]
+    assert all(len(d) == 5 for d in delays)
+    assert all(0 <= delay <= min(0.5, 0.1 * 2 ** i) for d in delays for i, delay in enumerate(d))
+    assert len({d[0] for d in delays}) > 100
+
+
+def test_error_classification():
+    assert resilience.is_transient(errors.InterfaceError("gone", errno=2006))
+    assert resilience.is_transient(errors.OperationalError("lost", errno=2013))
+    assert not resilience.is_transient(errors.IntegrityError("dup", errno=1062))
+    assert not resilience.is_transient(errors.DatabaseError("deadlock", errno=1213))
+    try:
+        try:
+            raise errors.InterfaceError("refused", errno=2003)
+        except errors.Error as e:
+            raise Exception("Unable to connect to database") from e
+    except Exception as wrapped:
+        assert resilience.is_transient(wrapped)
+    assert not resilience.is_transient(ValueError("bad input"))
+
+
+def main():
+    checks = [test_error_classification, test_backoff_is_jittered_and_capped,
+              test_transient_connect_errors_are_retried, test_breaker_opens_and_serves_stale_reads,
+              test_reads_without_a_stale_copy_get_503, test_trial_request_closes_the_breaker,
+              test_failed_trial_reopens_the_breaker, test_shed_background_call_leaves_the_trial_free,
+              test_server_errors_do_not_trip_the_breaker]
+    for check in checks:
+        try:
+            check()
+            print(f"✅ {check.__name__}")
+        except AssertionError as e:
+            print(f"❌ {check.__name__} {e}")
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)